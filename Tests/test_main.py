@@ -4,8 +4,16 @@ from unittest.mock import patch
 import io
 import sys
 import contextlib
+import math
+import struct
 
-from src.main import Product, Category, Smartphone, LawnGrass, BaseProduct, CreateLogMixin
+from src.main import Product, Category, Smartphone, LawnGrass, BaseProduct, CreateLogMixin, ProductTable, CategoryStats, CategoryTotals, RepriceReport, ReconcileReport, BulkValidationError
+from src.main import StdoutCreationSink, SamplingCreationSink, QueueCreationSink, set_creation_sink
+from src.main import CompactProduct, CompactSmartphone, CompactLawnGrass, StockValue, stock_value
+from src.main import LRUCache, CacheStats, price_cache, text_cache, parse_kopecks, set_price_mode
+from src.importer import import_csv, import_jsonl, parallel_import, reconcile_feed
+from src.async_catalog import AsyncCatalog
+from src import instrumentation
 from io import StringIO
 from abc import ABC, abstractmethod
 
@@ -35,6 +43,20 @@ class TestProduct(unittest.TestCase):
         )
         self.assertEqual(product.price, 100.0)
 
+    def test_non_finite_price_rejected(self):
+        """Бесконечная цена и NaN не принимаются и не попадают в статистику категории"""
+        for price in (float('inf'), float('nan'), "nan", "inf"):
+            with self.subTest(price=price), contextlib.redirect_stdout(StringIO()):
+                with self.assertRaises(ValueError):
+                    Product("Лампа", "Настольная", price, 2)
+        with contextlib.redirect_stdout(StringIO()) as output:
+            product = Product("Лампа", "Настольная", 10.0, 2)
+            category = Category("Свет", "Лампы", [product])
+            product.price = float('inf')
+        self.assertIn("Цена должна быть конечным числом", output.getvalue())
+        self.assertEqual(product.price, 10.0)
+        self.assertEqual(category.average_price(), 10.0)
+
     def test_product_creation_logs(self):
         with contextlib.redirect_stdout(StringIO()) as captured_output:
             test_product = Product("Тестовый продукт", "Описание для теста", 100.0, 5)
@@ -183,6 +205,15 @@ class TestCategory(unittest.TestCase):
             15
         )
 
+    def test_failed_creation_keeps_counters(self):
+        """Если товар не удалось добавить, категория не учитывается в счётчиках"""
+        with self.assertRaises(ValueError):
+            Category("Дубли", "Описание", [self.product1, self.product2, self.product1])
+        self.assertEqual((Category.category_count, Category.product_count), (1, 0))
+        self.assertEqual(self.product1._observers, [])
+        Category("Нормальная", "Описание", [self.product1, self.product2])
+        self.assertEqual((Category.category_count, Category.product_count), (2, 2))
+
     def test_category_product_getter(self):
         category = Category("Тестовая категория", "Тестовое описание", products=[])
         product1 = Product("Тест продукт1", "Описание1", 100, 5)
@@ -411,6 +442,1611 @@ class TestInheritedClasses(unittest.TestCase):
         self.assertIn("Iphone 15, 210000.0 руб. Остаток: 8 шт.", output)
 
 
+class TestProductTable(unittest.TestCase):
+    def setUp(self):
+        with contextlib.redirect_stdout(StringIO()):
+            self.product = Product("Iphone 15", "512GB, Gray space", 210000.0, 8)
+            self.phone = Smartphone("Test Phone", "A test smartphone", 500.0, 5,
+                                    "High", "TestModel", "64GB", "Black")
+
+    def test_columns_and_interning(self):
+        table = ProductTable([self.product, self.phone])
+        self.assertEqual(len(table), 2)
+        self.assertEqual(list(table.prices), [210000.0, 500.0])
+        self.assertEqual(list(table.quantities), [8, 5])
+        with contextlib.redirect_stdout(StringIO()):
+            twin = Product("Iphone 15", "512GB, Gray space", 1.0, 1)
+        table.append(twin)
+        self.assertEqual(table._names[0], table._names[2])
+
+    def test_changes_are_synchronized(self):
+        table = ProductTable([self.product])
+        self.product.price = 100.0
+        self.product.quantity = 3
+        self.product.name = "Iphone 16"
+        self.assertEqual(table.prices[0], 100.0)
+        self.assertEqual(table.quantities[0], 3)
+        self.assertEqual(str(table[0]), "Iphone 16, 100.0 руб. Остаток: 3 шт.")
+
+    def test_view_materialized_lazily(self):
+        table = ProductTable([self.phone])
+        del self.phone
+        view = table[0]
+        self.assertIsInstance(view, Smartphone)
+        self.assertEqual(view.memory, "64GB")
+        self.assertIs(table[0], view)
+        view.color = "White"
+        del view
+        self.assertEqual(table[0].color, "White")
+
+    def test_remove(self):
+        table = ProductTable([self.product, self.phone])
+        table.remove(self.product)
+        self.assertNotIn(self.product, table)
+        self.assertEqual(list(table.prices), [500.0])
+        with self.assertRaises(ValueError):
+            table.remove(self.product)
+
+    def test_bad_quantity_leaves_table_intact(self):
+        """Количество, которое не помещается в колонку, не оставляет недописанной строки"""
+        with self.assertRaises(TypeError):
+            Product("Лампа", "Настольная", 10, 2.5)
+        category = Category("Тест", "Тест", [self.product])
+        for bad in (2.5, 2 ** 63):
+            with contextlib.redirect_stdout(StringIO()):
+                broken = Product("Лампа", "Настольная", 10, 2)
+            broken.__dict__['quantity'] = bad
+            with self.assertRaises((TypeError, ValueError)):
+                category.add_product(broken)
+        self.assertEqual(len(category.products.splitlines()), 1)
+        self.assertEqual(len(list(category.iter_products())), 1)
+        with self.assertRaises(TypeError):
+            self.product.quantity = 1.5
+        self.assertEqual(self.product.quantity, 8)
+        self.assertEqual(category.quantity_sum, 8)
+
+    def test_shared_rows_synchronized_without_live_objects(self):
+        """Строка в нескольких категориях меняется во всех, даже если исходного объекта уже нет"""
+        import gc
+        with contextlib.redirect_stdout(StringIO()):
+            product = Product("Общий", "Описание", 9.0, 2)
+        first = Category("Первая", "Тест", [product])
+        second = Category("Вторая", "Тест", [product])
+        uid = product.id
+        del product
+        gc.collect()
+        view = first.get_product(uid)
+        view.price = 11.0
+        self.assertEqual(first.total_value, 22.0)
+        self.assertEqual(second.total_value, 22.0)
+        del view
+        gc.collect()
+        first.reprice({uid: 12.0})
+        self.assertEqual(second.total_value, 24.0)
+        second.verify_stats()
+
+        table = Product.from_records([("Пачка", "Описание", 5.0, 1), ("Вторая", "Описание", 6.0, 1)])
+        live = table[1]
+        third = Category("Третья", "Тест", [])
+        fourth = Category("Четвёртая", "Тест", [])
+        third.extend(table)
+        fourth.extend(table)
+        uid = table._uids[0]
+        third.reprice({uid: 7.0})
+        self.assertEqual(fourth.total_value, 13.0)
+        self.assertEqual(table.prices[0], 7.0)
+        fourth.get_product(uid).quantity = 3
+        gc.collect()
+        self.assertEqual(third.total_value, 27.0)
+        # Объект, созданный до extend, тоже знает о новых хранилищах строки
+        live.quantity = 2
+        self.assertEqual(third.total_value, 33.0)
+        self.assertEqual(fourth.total_value, 33.0)
+        third.verify_stats()
+        fourth.verify_stats()
+
+
+class TestCategoryStats(unittest.TestCase):
+    def test_stats_match_per_object_loops(self):
+        with contextlib.redirect_stdout(StringIO()):
+            products = [Product(f"Товар{i}", "Описание", price, quantity)
+                        for i, (price, quantity) in enumerate([(100, 5), (200, 10), (300.5, 1), (50, 2)])]
+        category = Category("Тест", "Описание", products)
+        stats = category.stats()
+        self.assertEqual(stats.count, 4)
+        self.assertEqual(stats.quantity_sum, 18)
+        self.assertEqual(stats.total_value, sum(p.calculate_total_value() for p in products))
+        self.assertEqual(stats.mean_price, category.average_price())
+        self.assertEqual((stats.min_price, stats.max_price), (50.0, 300.5))
+        self.assertEqual(stats.price_quantiles, (87.5, 150.0, 225.125))
+
+    def test_stats_empty_and_single(self):
+        self.assertEqual(Category("Пусто", "Описание", []).stats(),
+                         CategoryStats(0, 0, 0.0, 0.0, 0.0, 0.0, ()))
+        with contextlib.redirect_stdout(StringIO()):
+            product = Product("Товар", "Описание", 10.0, 3)
+        self.assertEqual(Category("Один", "Описание", [product]).stats().price_quantiles, (10.0, 10.0, 10.0))
+
+    def test_stats_sum_exactly_with_and_without_numpy(self):
+        """Общая стоимость и средняя цена в stats() совпадают с точными накопленными суммами"""
+        import random
+        rnd = random.Random(3)
+        category = Category("Тест", "Описание", [])
+        category.extend_records([(f"Товар{i}", "Описание", rnd.uniform(0.01, 1e6), rnd.randrange(1, 1000))
+                                 for i in range(5000)])
+        stats = category.stats()
+        self.assertEqual(stats.total_value, category.total_value)
+        self.assertEqual(stats.mean_price, category.average_price())
+
+    def test_numpy_import_attempted_once(self):
+        """Результат поиска numpy запоминается после первого вызова"""
+        import builtins
+        from src import main
+        real_import = builtins.__import__
+        attempts = []
+
+        def tracking_import(name, *args, **kwargs):
+            if name == 'numpy':
+                attempts.append(name)
+            return real_import(name, *args, **kwargs)
+
+        with patch.object(main, '_numpy_module', main._NOT_CACHED), patch('builtins.__import__', tracking_import):
+            first = main._numpy()
+            for _ in range(3):
+                self.assertIs(main._numpy(), first)
+        self.assertEqual(attempts, ['numpy'])
+
+
+class TestProductIndex(unittest.TestCase):
+    def setUp(self):
+        with contextlib.redirect_stdout(StringIO()):
+            self.products = [Product(f"Товар{i}", "Описание", 10.0 + i, 1) for i in range(6)]
+        self.category = Category("Тест", "Описание", list(self.products))
+
+    def test_ids_are_unique_and_stable(self):
+        ids = [product.id for product in self.products]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertIs(self.category.get_product(ids[2]), self.products[2])
+
+    def test_membership_and_lookup_after_removal(self):
+        removed = self.products[1]
+        self.category.remove_product(removed)
+        self.assertNotIn(removed, self.category)
+        self.assertIn(self.products[2], self.category)
+        with self.assertRaises(ValueError):
+            self.category.get_product(removed.id)
+        with self.assertRaises(ValueError):
+            self.category.remove_product(removed)
+
+    def test_tombstones_keep_order_and_compact(self):
+        table = self.category._Category__products
+        for product in self.products[:3]:
+            self.category.remove_product(product)
+        self.assertEqual(table._dead, 3)
+        self.assertEqual([p.name for p in table], ["Товар3", "Товар4", "Товар5"])
+        self.category.remove_product(self.products[3])
+        self.assertEqual(table._dead, 0)
+        self.assertEqual(list(table.prices), [14.0, 15.0])
+        self.assertIs(self.category.get_product(self.products[5].id), self.products[5])
+
+    def test_duplicate_add_rejected(self):
+        with self.assertRaises(ValueError):
+            self.category.add_product(self.products[0])
+
+
+class TestRunningStatistics(unittest.TestCase):
+    def setUp(self):
+        Category.verify_statistics = True
+        with contextlib.redirect_stdout(StringIO()):
+            self.products = [Product(f"Товар{i}", "Описание", 0.1 * (i + 1), i + 1) for i in range(10)]
+        self.category = Category("Тест", "Описание", list(self.products))
+
+    def tearDown(self):
+        Category.verify_statistics = False
+
+    def test_statistics_follow_mutations(self):
+        self.products[0].price = 1e16
+        self.products[1].quantity = 100
+        self.category.remove_product(self.products[2])
+        with contextlib.redirect_stdout(StringIO()):
+            self.category.add_product(Product("Новый", "Описание", 0.3, 7))
+        self.products[0].price = 0.7
+        alive = [p for p in self.products if p is not self.products[2]]
+        prices = [p.price for p in alive] + [0.3]
+        quantities = [p.quantity for p in alive] + [7]
+        self.assertEqual(self.category.quantity_sum, sum(quantities))
+        self.assertEqual(self.category.price_sum, math.fsum(prices))
+        self.assertEqual(self.category.total_value,
+                         math.fsum(p * q for p, q in zip(prices, quantities)))
+        self.assertEqual(self.category.average_price(), math.fsum(prices) / len(prices))
+
+    def test_overflowing_value_rejected_before_changes(self):
+        """Товар, чья стоимость остатка не помещается в float, не меняет ни таблицу, ни статистику"""
+        before = self.category.totals()
+        with contextlib.redirect_stdout(StringIO()):
+            huge = Product("Огромный", "Описание", 1e300, 10 ** 10)
+        with self.assertRaises(ValueError):
+            self.category.add_product(huge)
+        self.assertNotIn(huge, self.category)
+        errors = []
+        added = self.category.extend_records([("Огромный", "Описание", 1e300, 10 ** 10),
+                                              ("Обычный", "Описание", 1.0, 1)], errors=errors)
+        self.assertEqual(added, 1)
+        self.assertEqual(errors, [(0, "Стоимость остатка слишком велика")])
+        with self.assertRaises(BulkValidationError):
+            self.category.extend_records([("Огромный", "Описание", 1e300, 10 ** 10)])
+        product = self.products[9]
+        with contextlib.redirect_stdout(StringIO()) as output:
+            product.price = 1e308
+        self.assertIn("Стоимость остатка слишком велика", output.getvalue())
+        self.assertEqual(product.price, 1.0)
+        product.price = 1e300
+        with self.assertRaises(ValueError):
+            product.quantity = 10 ** 10
+        self.assertEqual(product.quantity, 10)
+        report = self.category.reprice({self.products[8].id: 1e308})
+        self.assertEqual(report.updated, 0)
+        self.assertEqual(report.rejected[0][2], "Стоимость остатка слишком велика")
+        self.assertEqual(self.category.totals().count, before.count + 1)
+        self.assertEqual(self.category.total_value, math.fsum(p.price * p.quantity for p in self.products) + 1.0)
+
+    def test_sums_beyond_float_range_saturate(self):
+        """Суммы, вышедшие за пределы float, читаются как inf, а среднее остаётся точным"""
+        with contextlib.redirect_stdout(StringIO()):
+            products = [Product(f"Дорогой{i}", "Описание", 1e308, 1) for i in range(2)]
+        category = Category("Дорогие", "Описание", products)
+        self.assertEqual(category.price_sum, math.inf)
+        self.assertEqual(category.total_value, math.inf)
+        self.assertEqual(category.average_price(), 1e308)
+        self.assertEqual(category.stats().mean_price, 1e308)
+        self.assertEqual(category.stock_value().total_value, math.inf)
+        category.remove_product(products[0])
+        self.assertEqual(category.price_sum, 1e308)
+        self.assertEqual(category.total_value, 1e308)
+
+    def test_verification_detects_drift(self):
+        self.category._Category__products._prices[0] = 999.0
+        with self.assertRaises(AssertionError):
+            self.category.average_price()
+
+
+class TestCreationSinks(unittest.TestCase):
+    def tearDown(self):
+        set_creation_sink(StdoutCreationSink())
+
+    def test_disabled_sink_prints_nothing(self):
+        set_creation_sink(None)
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            Product("Test", "Desc", 100, 5)
+        self.assertEqual(fake_out.getvalue(), "")
+
+    def test_sampling_sink(self):
+        events = []
+        collector = type("Collector", (), {"emit": lambda self, *event: events.append(event)})()
+        values = iter([0.1, 0.9, 0.2])
+        set_creation_sink(SamplingCreationSink(collector, 0.5, random_=lambda: next(values)))
+        for i in range(3):
+            Product(f"Test{i}", "Desc", 100, 5)
+        self.assertEqual([args[0] for _, args, _ in events], ["Test0", "Test2"])
+
+    def test_queue_sink_batches_structured_records(self):
+        batches = []
+        sink = QueueCreationSink(batches.append, batch_size=2)
+        set_creation_sink(sink)
+        for i in range(5):
+            Smartphone(f"Phone{i}", "Desc", 100, 1, "High", "M", "64GB", "Black")
+        sink.close()
+        records = [record for batch in batches for record in batch]
+        self.assertTrue(all(len(batch) <= 2 for batch in batches))
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[0], {'class': 'Smartphone',
+                                      'args': ('Phone0', 'Desc', 100, 1), 'kwargs': {}})
+
+    def test_queue_sink_survives_writer_errors(self):
+        """Ошибка writer передаётся в on_error, а фоновый поток продолжает работу"""
+        written = []
+        failures = []
+
+        def writer(records):
+            if not failures:
+                failures.append(None)
+                raise OSError("диск недоступен")
+            written.extend(records)
+
+        errors = []
+        sink = QueueCreationSink(writer, batch_size=1, on_error=lambda e, records: errors.append((e, records)))
+        sink.emit('Product', ('A',), {})
+        sink.flush()
+        sink.emit('Product', ('B',), {})
+        sink.flush()
+        sink.close()
+        self.assertEqual(sink.errors, 1)
+        self.assertIsInstance(errors[0][0], OSError)
+        self.assertEqual(written, [{'class': 'Product', 'args': ('B',), 'kwargs': {}}])
+        # После остановки потока flush и close не ждут
+        sink.emit('Product', ('C',), {})
+        sink.flush()
+        sink.close()
+
+
+class TestBulkIngestion(unittest.TestCase):
+    def test_from_records_reports_all_bad_rows(self):
+        records = [
+            {'name': 'Товар1', 'description': 'Описание', 'price': '10.5', 'quantity': 3},
+            {'name': '', 'description': 'Описание', 'price': 10, 'quantity': 3},
+            ('Товар2', 'Описание', 20.0, 4),
+            ('Товар3', 'Описание', 'abc', 1),
+            ('Товар4', 'Описание', -1, 1),
+        ]
+        with self.assertRaises(BulkValidationError) as context:
+            Product.from_records(records)
+        self.assertEqual(context.exception.errors, [
+            (1, "Имя товара не может быть пустым"),
+            (3, "Не удалось преобразовать строку в float: 'abc'"),
+            (4, "Цена должна быть положительной"),
+        ])
+        errors = []
+        table = Product.from_records(records, errors=errors)
+        self.assertEqual(len(errors), 3)
+        self.assertEqual([str(p) for p in table],
+                         ["Товар1, 10.5 руб. Остаток: 3 шт.", "Товар2, 20.0 руб. Остаток: 4 шт."])
+
+    def test_non_finite_and_non_str_rows_reported(self):
+        """NaN, бесконечность и нестроковые поля попадают в список ошибок, а не в таблицу"""
+        Category.product_count = 0
+        category = Category("Разное", "Описание", [])
+        records = [
+            {'name': 'Товар1', 'description': 'Описание', 'price': '10', 'quantity': 3},
+            {'name': 'Товар2', 'description': 'Описание', 'price': 'nan', 'quantity': 1},
+            {'name': 'Товар3', 'description': 'Описание', 'price': float('inf'), 'quantity': 1},
+            {'name': 5, 'description': 'Описание', 'price': '10', 'quantity': 1},
+        ]
+        errors = []
+        category.extend_records(records, errors=errors)
+        self.assertEqual([row for row, _ in errors], [1, 2, 3])
+        self.assertEqual(category.totals(), CategoryTotals(1, 3, 10.0, 30.0))
+        self.assertEqual(Category.product_count, 1)
+
+    def test_integer_price_beyond_float_range_reported(self):
+        """Целая цена, которую нельзя перевести в float, — ошибка строки, а не OverflowError"""
+        errors = []
+        table = Product.from_records([("a", "b", 10 ** 400, 1), ("c", "d", 1.0, 1)], errors=errors)
+        self.assertEqual(errors, [(0, "Цена должна быть конечным числом")])
+        self.assertEqual(len(table), 1)
+        with self.assertRaisesRegex(ValueError, "Цена должна быть конечным числом"):
+            with contextlib.redirect_stdout(StringIO()):
+                Product("a", "b", 10 ** 400, 1)
+        category = Category("Разное", "Описание", [])
+        category.extend(table)
+        uid = table._uids[0]
+        self.assertEqual(category.reprice({uid: 10 ** 400}).rejected, [(uid, 10 ** 400, "Цена должна быть конечным числом")])
+        product = category.get_product(uid)
+        with contextlib.redirect_stdout(StringIO()) as output:
+            product.price = 10 ** 400
+        self.assertIn("Цена должна быть конечным числом", output.getvalue())
+        self.assertEqual(product.price, 1.0)
+
+    def test_category_extend_with_subclasses(self):
+        Category.product_count = 0
+        phones = Smartphone.from_records([('Phone', 'Desc', 500, 2, 'High', 'M1', '256GB', 'Black')])
+        grass = LawnGrass.from_columns(['Grass'], ['Desc'], [100], [5], ['Россия'], [14], ['Зеленый'])
+        category = Category("Разное", "Описание", [])
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            category.extend(phones)
+            category.extend(grass)
+        self.assertEqual(fake_out.getvalue(), "")
+        self.assertEqual(Category.product_count, 2)
+        self.assertEqual(category.total_value, 500.0 * 2 + 100.0 * 5)
+        phone, lawn = category._Category__products
+        self.assertIsInstance(phone, Smartphone)
+        self.assertEqual(phone.memory, '256GB')
+        self.assertEqual(lawn.country, 'Россия')
+        self.assertIs(category.get_product(phone.id), phone)
+
+
+class TestExtendRecords(unittest.TestCase):
+    def test_extend_records_inserts_into_category(self):
+        Category.product_count = 0
+        category = Category("Трава", "Описание", [])
+        errors = []
+        added = category.extend_records(
+            [{'name': 'Газон', 'description': 'Описание', 'price': 100, 'quantity': 2,
+              'country': 'Россия', 'germination_period': 14, 'color': 'Зеленый'},
+             {'name': 'Газон', 'description': 'Описание', 'price': 100, 'quantity': '2'}],
+            product_class=LawnGrass, errors=errors)
+        self.assertEqual(added, 1)
+        self.assertEqual(errors, [(1, "Количество должно быть целым числом")])
+        self.assertEqual(Category.product_count, 1)
+        self.assertEqual(category.quantity_sum, 2)
+        self.assertEqual(category._Category__products[0].germination_period, 14)
+
+
+class TestStreamingImport(unittest.TestCase):
+    def setUp(self):
+        Category.product_count = 0
+        self.category = Category("Фид", "Описание", [])
+
+    def test_import_csv_maps_types_and_reports_errors(self):
+        feed = StringIO(
+            "type,name,description,price,quantity,efficiency,model,memory,color,country,germination_period\n"
+            "product,Товар,Описание,100.0,5,,,,,,\n"
+            "smartphone,Phone,Desc,500,2,High,M1,256GB,Black,,\n"
+            "smartphone,Phone2,Desc,abc,2,High,M1,256GB,Black,,\n"
+            "lawn_grass,Газон,Описание,50,10,,,,Зеленый,Россия,14\n"
+            "tv,Телевизор,Описание,10,1,,,,,,\n"
+        )
+        progress = []
+        report = import_csv(feed, self.category, chunk_size=2, on_progress=lambda r: progress.append(r.rows))
+        self.assertEqual((report.rows, report.imported, report.failed), (5, 3, 2))
+        self.assertEqual(report.errors, [(3, "Не удалось преобразовать строку в float: 'abc'"),
+                                         (5, "Неизвестный тип товара: 'tv'")])
+        self.assertEqual(progress, [2, 4, 5])
+        product, phone, grass = self.category._Category__products
+        self.assertEqual((type(product), type(phone), type(grass)), (Product, Smartphone, LawnGrass))
+        self.assertEqual(grass.germination_period, 14)
+        self.assertEqual(Category.product_count, 3)
+
+    def test_import_jsonl_error_channel(self):
+        feed = StringIO(
+            '{"name": "Товар", "description": "Описание", "price": 10, "quantity": 1}\n'
+            '{"name": "Сломанный", \n'
+            '\n'
+            '{"name": "Товар2", "description": "Описание", "price": -1, "quantity": 1}\n'
+        )
+        errors = []
+        report = import_jsonl(feed, self.category, on_error=lambda number, message: errors.append(number))
+        self.assertEqual(errors, [2, 3])
+        self.assertEqual(report.errors, [])
+        self.assertEqual(report.imported, 1)
+
+    def test_malformed_rows_do_not_abort_import(self):
+        """Строки не того типа, нестроковые поля и NaN отклоняются по одной"""
+        feed = StringIO(
+            '123\n'
+            '[1, 2]\n'
+            'null\n'
+            '{"type": 5, "name": "Товар", "description": "Описание", "price": 10, "quantity": 1}\n'
+            '{"type": ["product"], "name": "Товар", "description": "Описание", "price": 10, "quantity": 1}\n'
+            '{"name": 7, "description": "Описание", "price": 10, "quantity": 1}\n'
+            '{"name": "Товар", "description": "Описание", "price": "nan", "quantity": 1}\n'
+            '{"name": "Товар", "description": "Описание", "price": 10, "quantity": 1}\n'
+        )
+        report = import_jsonl(feed, self.category)
+        self.assertEqual([number for number, _ in report.errors], [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual((report.rows, report.imported, report.failed), (8, 1, 7))
+        self.assertEqual(self.category.totals(), CategoryTotals(1, 1, 10.0, 10.0))
+
+
+class TestParallelImport(unittest.TestCase):
+    def make_rows(self):
+        rows = [{'type': 'product', 'name': f'Товар{i}', 'description': 'Описание',
+                 'price': str(10 + i), 'quantity': '1'} for i in range(20)]
+        rows[7]['price'] = '-5'
+        rows[12] = {'type': 'smartphone', 'name': 'Phone', 'description': 'Desc', 'price': '500',
+                    'quantity': '2', 'efficiency': 'High', 'model': 'M1', 'memory': '256GB', 'color': 'Black'}
+        return rows
+
+    def check(self, executor):
+        category = Category("Параллельно", "Описание", [])
+        report = parallel_import(self.make_rows(), category, workers=2, executor=executor, chunk_size=3)
+        self.assertEqual((report.rows, report.imported, report.failed), (20, 19, 1))
+        self.assertEqual(report.errors, [(8, "Цена должна быть положительной")])
+        names = [product.name for product in category._Category__products]
+        self.assertEqual(names[:8], [f'Товар{i}' for i in (0, 1, 2, 3, 4, 5, 6, 8)])
+        self.assertIsInstance(category._Category__products[11], Smartphone)
+        self.assertEqual(category.quantity_sum, 20)
+        ids = [product.id for product in category._Category__products]
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_thread_pool(self):
+        self.check('thread')
+
+    def test_process_pool(self):
+        self.check('process')
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = f"{self.directory.name}/catalog.snap"
+        with contextlib.redirect_stdout(StringIO()):
+            self.category = Category("Смартфоны", "Мобильные устройства", [
+                Product("Iphone 15", "512GB, Gray space", 210000.0, 8),
+                Smartphone("Phone", "Desc", 500.0, 2, "High", "M1", "256GB", "Black"),
+                LawnGrass("Газон", "Описание", 50.0, 10, "Россия", 14, "Зеленый"),
+            ])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_roundtrip_is_zero_copy(self):
+        self.category.save(self.path)
+        loaded = Category.load(self.path)
+        table = loaded._Category__products
+        self.assertIsInstance(table.prices, memoryview)
+        self.assertEqual(loaded.products, self.category.products)
+        self.assertEqual(loaded.total_value, self.category.total_value)
+        self.assertEqual(table[1].memory, "256GB")
+        self.assertEqual(table[2].germination_period, 14)
+        table[0].price = 1.0
+        self.assertEqual(table.prices[0], 1.0)
+        self.assertEqual(loaded.price_sum, 1.0 + 500.0 + 50.0)
+
+    def test_corrupted_snapshot_is_revalidated(self):
+        from src.snapshot import SnapshotError
+        self.category.save(self.path)
+        with open(self.path, 'r+b') as file:
+            data = file.read()
+            file.seek(data.rindex(struct.pack('<d', 500.0)))
+            file.write(struct.pack('<d', -1.0))
+        with self.assertRaises(BulkValidationError):
+            Category.load(self.path)
+        with open(self.path, 'r+b') as file:
+            file.write(b'garbage!')
+        with self.assertRaises(SnapshotError):
+            Category.load(self.path)
+
+
+class TestImportTime(unittest.TestCase):
+    def test_main_imports_only_light_modules(self):
+        """Регрессия времени импорта: тяжёлые и необязательные модули не грузятся при импорте src.main"""
+        import subprocess
+        import os
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import src.main"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        imported = {line.split('|')[-1].strip() for line in result.stderr.splitlines()
+                    if line.startswith('import time:')}
+        self.assertIn('src.main', imported)
+        heavy = {'sqlalchemy', 'numpy', 'dataclasses', 'inspect', 'statistics', 'threading',
+                 'queue', 'random', 'sqlite3', 'typing', 'src.snapshot', 'src.importer'}
+        self.assertEqual(imported & heavy, set())
+
+
+class TestCompactProducts(unittest.TestCase):
+    def setUp(self):
+        with contextlib.redirect_stdout(StringIO()) as self.output:
+            self.phone = CompactSmartphone("Phone", "Desc", "500.0", 5, "High", "M1", "".join(["256", "GB"]), "Black")
+            self.grass = CompactLawnGrass("Газон", "Описание", 50, 10, "Россия", 14, "Зеленый")
+
+    def test_no_instance_dict_and_interning(self):
+        self.assertFalse(hasattr(self.phone, '__dict__'))
+        self.assertIs(self.phone.memory, sys.intern("256GB"))
+        with self.assertRaises(AttributeError):
+            self.phone.unknown = 1
+
+    def test_behaves_like_regular_hierarchy(self):
+        self.assertIn("Создан объект класса: CompactSmartphone", self.output.getvalue())
+        self.assertIsInstance(self.phone, Smartphone)
+        self.assertTrue(issubclass(CompactLawnGrass, Product))
+        self.assertEqual(self.phone.price, 500.0)
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            self.phone.price = -1
+        self.assertIn("Цена не должна быть нулевая или отрицательная", fake_out.getvalue())
+        self.assertEqual(self.phone.calculate_total_value(), 2500.0)
+        with self.assertRaises(ValueError):
+            CompactProduct("", "Desc", 1, 1)
+
+    def test_category_storage(self):
+        category = Category("Разное", "Описание", [self.phone, self.grass])
+        self.phone.price = 100.0
+        self.assertEqual(category.total_value, 100.0 * 5 + 50 * 10)
+        del self.grass
+        grass = category._Category__products[1]
+        self.assertIsInstance(grass, CompactLawnGrass)
+        self.assertEqual(grass.country, "Россия")
+
+
+class TestCategoryQuery(unittest.TestCase):
+    def setUp(self):
+        with contextlib.redirect_stdout(StringIO()):
+            self.cheap = Product("Чехол", "Силикон", 500.0, 3)
+            self.phone = Smartphone("Phone", "Desc", 30000.0, 10, "High", "M1", "256GB", "Black")
+            self.other_phone = CompactSmartphone("Phone 2", "Desc", 45000.0, 1, "Low", "M2", "128GB", "White")
+            self.grass = LawnGrass("Газон", "Описание", 800.0, 40, "Россия", 14, "Зеленый")
+            self.category = Category("Разное", "Тест", [self.cheap, self.phone, self.other_phone, self.grass])
+
+    def test_price_range_and_quantity(self):
+        """Диапазон цен включает границы, порог количества — строгий"""
+        self.assertEqual(self.category.query(price_min=500, price_max=30000),
+                         [self.cheap, self.phone, self.grass])
+        self.assertEqual(self.category.query(price_max=800), [self.cheap, self.grass])
+        self.assertEqual(self.category.query(quantity_below=10), [self.cheap, self.other_phone])
+        self.assertEqual(self.category.query(), [self.cheap, self.phone, self.other_phone, self.grass])
+
+    def test_attribute_and_kind_queries(self):
+        """Хэш-индексы по полям наследников и классу товара"""
+        self.assertEqual(self.category.query(kind=Smartphone, memory="256GB"), [self.phone])
+        self.assertEqual(self.category.query(kind=Smartphone), [self.phone, self.other_phone])
+        self.assertEqual(self.category.query(country="Россия", price_max=1000), [self.grass])
+        self.assertEqual(self.category.query(kind=LawnGrass, memory="256GB"), [])
+        self.assertEqual(self.category.query(color="Black", quantity_below=5), [])
+
+    def test_indexes_follow_changes(self):
+        """Индексы обновляются при добавлении, удалении и изменении товаров"""
+        self.assertEqual(self.category.query(price_min=40000), [self.other_phone])
+        self.phone.price = 50000.0
+        self.phone.memory = "512GB"
+        self.other_phone.quantity = 20
+        with contextlib.redirect_stdout(StringIO()):
+            new_grass = LawnGrass("Газон 2", "Описание", 900.0, 5, "Россия", 10, "Зеленый")
+        self.category.add_product(new_grass)
+        self.assertEqual(self.category.query(price_min=40000), [self.phone, self.other_phone])
+        self.assertEqual(self.category.query(memory="512GB"), [self.phone])
+        self.assertEqual(self.category.query(memory="256GB"), [])
+        self.assertEqual(self.category.query(quantity_below=10), [self.cheap, new_grass])
+        self.category.remove_product(self.grass)
+        self.assertEqual(self.category.query(country="Россия"), [new_grass])
+        self.category.extend(Product.from_records([("Кабель", "USB", 45000.0, 2)]))
+        self.assertEqual([product.name for product in self.category.query(price_min=45000, price_max=45000)],
+                         ["Phone 2", "Кабель"])
+
+
+class TestProductRendering(unittest.TestCase):
+    def setUp(self):
+        with contextlib.redirect_stdout(StringIO()):
+            self.products = [Product(f"Товар{i}", "Описание", 10.0 + i, i + 1) for i in range(5)]
+            self.category = Category("Разное", "Тест", self.products)
+
+    def test_pages_match_product_str(self):
+        """Постраничный вывод совпадает со str товаров"""
+        expected = [str(product) for product in self.products]
+        self.assertEqual(list(self.category.iter_products()), expected)
+        self.assertEqual(list(self.category.iter_products(offset=1, limit=2)), expected[1:3])
+        self.assertEqual(self.category.products_page(1, per_page=2), expected[2:4])
+        self.assertEqual(self.category.products_page(5, per_page=2), [])
+        self.assertEqual(self.category.products, "\n".join(expected))
+        with self.assertRaises(ValueError):
+            self.category.iter_products(offset=-1)
+
+    def test_cache_invalidated_only_for_changed_products(self):
+        """Повторный вывод переиспользует строки, изменённые товары форматируются заново"""
+        first = list(self.category.iter_products())
+        self.products[1].price = 99
+        self.products[2].description = "Новое описание"
+        self.category.remove_product(self.products[3])
+        second = list(self.category.iter_products())
+        self.assertEqual(second[1], "Товар1, 99.0 руб. Остаток: 2 шт.")
+        self.assertIs(second[0], first[0])
+        self.assertIs(second[2], first[2])
+        self.assertEqual(len(second), 4)
+        self.assertNotIn(str(self.products[3]), second)
+        self.products[4].quantity = 50
+        self.assertEqual(self.category.products_page(3, per_page=1), [str(self.products[4])])
+
+
+class TestThreadSafety(unittest.TestCase):
+    def setUp(self):
+        with contextlib.redirect_stdout(StringIO()):
+            self.product = Product("Телефон", "Описание", 100.0, 4000)
+            self.category = Category("Смартфоны", "Тест", [self.product])
+        self.category.enable_thread_safety()
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+    def run_threads(self, target, count=8):
+        import threading
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_reserve_and_release(self):
+        """Резерв списывает остаток атомарно и не уходит в минус"""
+        self.product.reserve(3990)
+        with self.assertRaises(ValueError):
+            self.product.reserve(11)
+        self.assertEqual(self.product.quantity, 10)
+        self.product.release(5)
+        with self.assertRaises(ValueError):
+            self.product.reserve(0)
+        self.assertEqual(self.category.totals(), CategoryTotals(1, 15, 100.0, 1500.0))
+        with self.category.locked():
+            self.assertEqual(self.category.quantity_sum, 15)
+
+    def test_concurrent_reserves(self):
+        """Параллельные резервы не теряют списаний, статистика категории сходится"""
+        def checkout():
+            for _ in range(500):
+                self.product.reserve()
+        self.run_threads(checkout)
+        self.assertEqual(self.product.quantity, 0)
+        self.assertEqual(self.category.quantity_sum, 0)
+        self.category.verify_stats()
+
+    def test_concurrent_add_and_remove(self):
+        """Параллельные добавления и удаления сохраняют счётчики и статистику"""
+        before = Category.product_count
+        with contextlib.redirect_stdout(StringIO()):
+            batches = [[Product("Товар", "Описание", 10.0, 1) for _ in range(100)] for _ in range(8)]
+
+        def worker():
+            products = batches.pop()
+            for product in products:
+                self.category.add_product(product)
+            for product in products[::2]:
+                self.category.remove_product(product)
+        self.run_threads(worker)
+        self.assertEqual(Category.product_count - before, 8 * 50)
+        self.assertEqual(self.category.totals().count, 1 + 8 * 50)
+        self.category.verify_stats()
+
+
+class TestCategoryLocks(unittest.TestCase):
+    def setUp(self):
+        previous = set_creation_sink(None)
+        self.addCleanup(set_creation_sink, previous)
+
+    def run_with_timeout(self, *targets):
+        import threading
+        threads = [threading.Thread(target=target, daemon=True) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+            self.assertFalse(thread.is_alive(), "поток завис на блокировке")
+
+    def test_plain_lock_is_reentrant(self):
+        """Переданная нереентерабельная блокировка не мешает вложенным вызовам методов"""
+        import threading
+        lock = threading.Lock()
+        category = Category("Свет", "Лампы", [Product("Лампа", "Настольная", 100.0, 2)])
+        category.enable_thread_safety(lock)
+        other = Category("Мебель", "Стулья", [])
+        other.enable_thread_safety(lock)
+
+        def work():
+            str(category)
+            category.adjust_prices(percent=10)
+            with category.locked():
+                other.add_product(Product("Стул", "Деревянный", 50.0, 1))
+        self.run_with_timeout(work)
+        self.assertAlmostEqual(category.price_sum, 110.0)
+        self.assertEqual(other.quantity_sum, 1)
+        self.assertFalse(lock.locked())
+
+    def test_shared_product_in_two_categories(self):
+        """Переоценка общего товара из двух категорий навстречу друг другу не зависает"""
+        product = Product("Лампа", "Настольная", 100.0, 2)
+        first = Category("Первая", "Тест", [product])
+        second = Category("Вторая", "Тест", [product])
+        first.enable_thread_safety()
+        second.enable_thread_safety()
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+        def reprice(category):
+            def work():
+                for i in range(300):
+                    category.reprice({product.id: 100.0 + i % 7})
+            return work
+        self.run_with_timeout(reprice(first), reprice(second))
+        self.assertEqual(first.price_sum, product.price)
+        self.assertEqual(second.price_sum, product.price)
+        first.verify_stats()
+        second.verify_stats()
+
+
+class TestAsyncCatalog(unittest.TestCase):
+    def setUp(self):
+        self.category = Category("Асинхронная", "Тест", [])
+        self.catalog = AsyncCatalog(self.category)
+        with contextlib.redirect_stdout(StringIO()):
+            self.products = [Product(f"Товар{i}", "Описание", 10.0 + i, i + 1) for i in range(20)]
+
+    def test_writes_in_one_tick_are_batched(self):
+        """Изменения одного такта применяются одним проходом, ошибки получает только их вызывающий"""
+        import asyncio
+
+        async def scenario():
+            with patch.object(AsyncCatalog, '_flush', autospec=True, side_effect=AsyncCatalog._flush) as flush:
+                await asyncio.gather(*(self.catalog.add(product) for product in self.products))
+                self.assertEqual(flush.call_count, 1)
+            results = await asyncio.gather(self.catalog.remove(self.products[0]),
+                                           self.catalog.remove(self.products[0]),
+                                           return_exceptions=True)
+            self.assertIsNone(results[0])
+            self.assertIsInstance(results[1], ValueError)
+            # Чтение видит изменения, ещё не применённые циклом
+            pending = asyncio.ensure_future(self.catalog.add(self.products[0]))
+            await asyncio.sleep(0)
+            totals = await self.catalog.totals()
+            await pending
+            return totals, await self.catalog.query(price_min=28)
+
+        totals, found = asyncio.run(scenario())
+        self.assertEqual(totals.count, 20)
+        self.assertEqual(found, self.products[18:])
+
+    def test_added_products_applied_in_one_bulk_call(self):
+        """Добавления одного такта попадают в таблицу одним вызовом append_many"""
+        import asyncio
+
+        async def scenario():
+            return await asyncio.gather(*(self.catalog.add(product) for product in self.products),
+                                        self.catalog.add(self.products[0]), self.catalog.add("не товар"),
+                                        return_exceptions=True)
+
+        with patch.object(ProductTable, 'append_many', autospec=True,
+                          side_effect=ProductTable.append_many) as append_many, \
+                patch.object(Category, 'add_product', side_effect=AssertionError):
+            results = asyncio.run(scenario())
+        self.assertEqual(append_many.call_count, 1)
+        self.assertEqual(results[:20], [None] * 20)
+        self.assertIsInstance(results[20], ValueError)
+        self.assertIsInstance(results[21], TypeError)
+        self.assertEqual(self.category.totals().count, 20)
+        self.category.verify_stats()
+
+    def test_failed_feed_waits_for_next_chunk(self):
+        """Прерванная загрузка дожидается уже начатого чтения следующей пачки"""
+        import asyncio
+        import time
+
+        def rows():
+            for i in range(25):
+                if i == 10:
+                    time.sleep(0.2)
+                yield {'type': 'product', 'name': f'Товар{i}', 'description': 'Описание',
+                       'price': -1.0 if i == 3 else 1.0 + i, 'quantity': 1}
+
+        def fail(number, message):
+            raise RuntimeError(message)
+
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(1)
+        self.addCleanup(executor.shutdown)
+        catalog = AsyncCatalog(self.category, executor)
+        feed = rows()
+        with self.assertRaises(RuntimeError):
+            asyncio.run(catalog.import_feed(feed, chunk_size=10, on_error=fail))
+        self.assertFalse(feed.gi_running)
+        self.assertEqual(self.category.totals().count, 9)
+
+    def test_imports_run_off_the_loop(self):
+        """Пачки записей и фиды проверяются в пуле и добавляются в категорию"""
+        import asyncio
+
+        async def scenario():
+            count = await self.catalog.import_records([("Кабель", "USB", 100.0, 3)] * 5)
+            rows = [{'type': 'product', 'name': f'Товар{i}', 'description': 'Описание',
+                     'price': 1.0 + i, 'quantity': 1} for i in range(25)]
+            rows[3]['price'] = -1
+            report = await self.catalog.import_feed(iter(rows), chunk_size=10)
+            return count, report
+
+        count, report = asyncio.run(scenario())
+        self.assertEqual(count, 5)
+        self.assertEqual((report.rows, report.imported, report.failed), (25, 24, 1))
+        self.assertEqual(report.errors[0][0], 4)
+        self.assertEqual(self.category.totals().count, 29)
+
+
+class TestReprice(unittest.TestCase):
+    def setUp(self):
+        with contextlib.redirect_stdout(StringIO()):
+            self.products = [Product(f"Товар{i}", "Описание", 10.0 * (i + 1), i + 1) for i in range(5)]
+            self.phone = Smartphone("Phone", "Desc", 1000.0, 2, "High", "M1", "256GB", "Black")
+            self.category = Category("Разное", "Тест", [*self.products, self.phone])
+            self.other = Category("Витрина", "Тест", [self.products[0]])
+        self.category.verify_statistics = True
+
+    def test_mapping_and_arrays(self):
+        """Цены меняются пачкой, живые объекты и другие категории видят новые цены"""
+        report = self.category.reprice({self.products[0].id: 15, self.phone.id: "1200.5"})
+        self.assertEqual(report, RepriceReport(2, []))
+        self.assertEqual(self.products[0].price, 15.0)
+        self.assertEqual(self.phone.price, 1200.5)
+        self.assertEqual(self.other.total_value, 15.0)
+        self.assertEqual(self.category.query(price_min=1200), [self.phone])
+        ids = [product.id for product in self.products]
+        report = self.category.reprice(ids, [1.0] * 5)
+        self.assertEqual(report.updated, 5)
+        self.assertEqual(self.category.price_sum, 5 + 1200.5)
+        self.assertEqual(self.category.products_page(0, per_page=1), ["Товар0, 1.0 руб. Остаток: 1 шт."])
+        with self.assertRaises(ValueError):
+            self.category.reprice(ids, [1.0])
+
+    def test_rejected_rows_are_reported(self):
+        """Ошибочные строки попадают в отчёт без вывода в консоль"""
+        updates = {self.products[0].id: 0, self.products[1].id: "abc", self.products[2].id: float('nan'),
+                   -1: 10.0, self.products[3].id: 77.0}
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            report = self.category.reprice(updates, all_or_nothing=True)
+            self.assertEqual(report.updated, 0)
+            self.assertEqual(self.products[3].price, 40.0)
+            report = self.category.reprice(updates)
+        self.assertEqual(fake_out.getvalue(), "")
+        self.assertEqual(report.updated, 1)
+        self.assertEqual(self.products[3].price, 77.0)
+        self.assertEqual([message for _, _, message in report.rejected], [
+            "Цена должна быть положительной",
+            "Не удалось преобразовать строку в float: 'abc'",
+            "Цена должна быть конечным числом",
+            "Продукт не найден в категории",
+        ])
+
+    def test_adjust_by_filter(self):
+        """Процентная и абсолютная корректировка по условиям query"""
+        report = self.category.adjust_prices(percent=10, kind=Smartphone)
+        self.assertEqual(report.updated, 1)
+        self.assertAlmostEqual(self.phone.price, 1100.0)
+        report = self.category.adjust_prices(delta=-25, price_max=50)
+        self.assertEqual(report.updated, 3)
+        self.assertEqual([product.price for product in self.products], [10.0, 20.0, 5.0, 15.0, 25.0])
+        self.assertEqual(len(report.rejected), 2)
+
+
+class TestStockValue(unittest.TestCase):
+    def setUp(self):
+        with contextlib.redirect_stdout(StringIO()):
+            self.products = [Product(f"Товар{i}", "Описание", 0.1 * (i + 1), i + 1) for i in range(10)]
+            self.phones = [Smartphone("Phone", "Desc", 1000.0, 2, "High", "M1", "256GB", "Black"),
+                           Smartphone("Phone 2", "Desc", 500.0, 1, "Low", "M2", "128GB", "White")]
+            self.grass = LawnGrass("Газон", "Описание", 50.0, 4, "Россия", 14, "Зеленый")
+
+    def test_single_class(self):
+        """Свёртка товаров одного класса совпадает с точной суммой calculate_total_value"""
+        value = stock_value(iter(self.products))
+        self.assertEqual(value, StockValue(Product, 10, 55, math.fsum(p.calculate_total_value() for p in self.products)))
+        self.assertEqual(stock_value(self.phones).total_value, self.phones[0] + self.phones[1])
+        self.assertEqual(stock_value([]), StockValue(None, 0, 0, 0.0))
+
+    def test_group_by_class(self):
+        """Группировка по классам за один проход; смешанные классы без группировки запрещены"""
+        items = [self.phones[0], self.grass, *self.products, self.phones[1]]
+        groups = stock_value(items, by_class=True)
+        self.assertEqual(list(groups), [Smartphone, LawnGrass, Product])
+        self.assertEqual(groups[Smartphone], StockValue(Smartphone, 2, 3, 2500.0))
+        self.assertEqual(groups[LawnGrass].total_value, 200.0)
+        with self.assertRaises(TypeError):
+            stock_value(items)
+        with self.assertRaises(TypeError):
+            stock_value([1, 2])
+
+    def test_category_uses_columns(self):
+        """Для категории свёртка считается по колонкам хранилища"""
+        category = Category("Разное", "Тест", [*self.products, *self.phones, self.grass])
+        self.assertEqual(category.stock_value(by_class=True),
+                         stock_value([*self.products, *self.phones, self.grass], by_class=True))
+        category.remove_product(self.grass)
+        self.assertEqual(set(stock_value(category, by_class=True)), {Product, Smartphone})
+        with self.assertRaises(TypeError):
+            category.stock_value()
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_compare_flags_only_slowdowns(self):
+        """Сравнение с эталоном сообщает только о замедлениях больше допуска"""
+        from benchmarks.suite import compare
+        baseline = {'results': [{'case': 'a', 'size': 10, 'relative': 1.0},
+                                {'case': 'b', 'size': 10, 'relative': 2.0}]}
+        current = {'results': [{'case': 'a', 'size': 10, 'relative': 1.5},
+                               {'case': 'b', 'size': 10, 'relative': 1.0},
+                               {'case': 'c', 'size': 10, 'relative': 9.0}]}
+        self.assertEqual(compare(current, baseline, tolerance=0.25), [('a', 10, 1.0, 1.5, 0.5)])
+        self.assertEqual(compare(current, baseline, tolerance=0.6), [])
+
+    def test_worker_reports_relative_time(self):
+        """Замер сценария возвращает время и относительное время"""
+        from benchmarks.suite import _worker
+        previous = set_creation_sink(None)
+        self.addCleanup(set_creation_sink, previous)
+        result = _worker('add_pairwise', 10, 1, min_time=0)
+        self.assertEqual((result['case'], result['size']), ('add_pairwise', 10))
+        self.assertGreater(result['relative'], 0)
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        instrumentation.reset()
+        self.addCleanup(instrumentation.disable)
+        self.addCleanup(instrumentation.reset)
+
+    def test_enable_swaps_methods_and_disable_restores(self):
+        """При выключенном инструментировании методы остаются исходными"""
+        original = Category.__dict__['add_product']
+        instrumentation.enable()
+        self.assertTrue(instrumentation.is_enabled())
+        self.assertIsNot(Category.__dict__['add_product'], original)
+        instrumentation.disable()
+        self.assertIs(Category.__dict__['add_product'], original)
+        self.assertFalse(instrumentation.is_enabled())
+
+    def test_records_calls_and_exports(self):
+        """Счётчики вызовов, квантили и выгрузка в JSON и Prometheus"""
+        import json
+        instrumentation.enable()
+        with contextlib.redirect_stdout(StringIO()):
+            products = [Smartphone("Phone", "Desc", 100.0 + i, 1, "High", "M1", "256GB", "Black") for i in range(3)]
+        category = Category("Смартфоны", "Тест", [])
+        for product in products:
+            category.add_product(product)
+        category.remove_product(products[0])
+        self.assertEqual(category.quantity_sum, 2)
+        str(category)
+        category.search("Phone")
+        list(category.iter_products())
+        instrumentation.disable()
+        category.average_price()
+        data = instrumentation.snapshot()
+        self.assertEqual(data['Product.__init__']['calls'], 3)
+        self.assertEqual(data['Category.add_product']['calls'], 3)
+        self.assertEqual(data['Category.remove_product']['calls'], 1)
+        self.assertEqual(data['Category.search']['calls'], 1)
+        # один вызов из str(category), второй явный
+        self.assertEqual(data['Category.iter_products']['calls'], 2)
+        self.assertNotIn('Category.average_price', data)
+        self.assertIn('0.99', data['Category.__str__']['quantiles'])
+        self.assertEqual(json.loads(instrumentation.to_json(data)), data)
+        text = instrumentation.to_prometheus(data)
+        self.assertIn('# TYPE catalog_operation_seconds summary', text)
+        self.assertIn('catalog_operation_seconds_count{operation="Category.add_product"} 3', text)
+        self.assertIn('# TYPE catalog_operation_allocated_blocks counter', text)
+        self.assertTrue(all(stats['allocated_blocks'] >= 0 for stats in data.values()))
+
+    def test_profile_context_manager(self):
+        """profile() печатает горячие точки блока"""
+        stream = StringIO()
+        with instrumentation.profile(top=5, stream=stream):
+            Category("Пустая", "Тест", []).stats()
+        self.assertIn("function calls", stream.getvalue())
+
+
+class TestValueCache(unittest.TestCase):
+    def test_lru_hits_misses_and_eviction(self):
+        """Кэш считает попадания и промахи и вытесняет давно не использованные значения"""
+        cache = LRUCache(2)
+        self.assertEqual(cache.get("1.5", float), 1.5)
+        self.assertEqual(cache.get("2", float), 2.0)
+        cache.get("1.5", float)
+        cache.get("3", float)
+        self.assertEqual(cache.stats(), CacheStats(hits=1, misses=3, evictions=1, size=2, maxsize=2))
+        # "2" использовался раньше всех и был вытеснен
+        cache.get("2", float)
+        self.assertEqual(cache.stats().misses, 4)
+        cache.resize(1)
+        self.assertEqual(cache.stats().size, 1)
+        cache.clear()
+        self.assertEqual(cache.stats(), CacheStats(0, 0, 0, 0, 1))
+
+    def test_disabled_cache_and_errors(self):
+        """maxsize=0 отключает кэш, ошибки вычисления не кэшируются"""
+        cache = LRUCache(0)
+        cache.get("1", float)
+        cache.get("1", float)
+        self.assertEqual(cache.stats(), CacheStats(0, 2, 0, 0, 0))
+        cache = LRUCache(4)
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                cache.get("abc", float)
+        self.assertEqual(cache.stats().size, 0)
+        with self.assertRaises(ValueError):
+            LRUCache(-1)
+
+    def test_cache_shared_between_threads(self):
+        """Маленький кэш выдерживает одновременное создание товаров из нескольких потоков"""
+        import threading
+        import time
+        cache = LRUCache(4)
+        failures = []
+
+        def compute(key):
+            # Отдаём GIL посреди промаха, как это делает медленный разбор
+            time.sleep(0)
+            return float(key)
+
+        def worker(seed):
+            try:
+                for i in range(5000):
+                    key = str((seed * 7 + i) % 50)
+                    self.assertEqual(cache.get(key, compute), float(key))
+            except Exception as e:
+                failures.append(e)
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(8)]
+        previous = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(previous)
+        self.assertEqual(failures, [])
+        stats = cache.stats()
+        self.assertEqual(stats.hits + stats.misses, 8 * 5000)
+        self.assertLessEqual(stats.size, 4)
+
+    def test_products_share_validated_strings(self):
+        """Одинаковые описания из разных записей хранятся одним объектом"""
+        first = "".join(["Описание ", "партии"])
+        second = "".join(["Описание ", "партии"])
+        self.assertIsNot(first, second)
+        with contextlib.redirect_stdout(StringIO()):
+            a = Product("Товар", first, "10.5", 1)
+            b = Product("Товар", second, "10.5", 2)
+        self.assertIs(a.description, b.description)
+        self.assertEqual(a.price, 10.5)
+        self.assertGreater(price_cache.stats().hits + text_cache.stats().hits, 0)
+
+    def test_validation_messages_unchanged(self):
+        """Ошибки проверки не зависят от того, есть ли значение в кэше"""
+        for _ in range(2):
+            with self.assertRaises(ValueError) as context:
+                Product("   ", "Описание", 1.0, 1)
+            self.assertEqual(str(context.exception), "Имя товара не может быть пустым")
+            with self.assertRaises(ValueError) as context:
+                Product("Товар", "Описание", "abc", 1)
+            self.assertEqual(str(context.exception), "Не удалось преобразовать строку в float: 'abc'")
+
+
+class TestTextSearch(unittest.TestCase):
+    def setUp(self):
+        previous = set_creation_sink(None)
+        self.addCleanup(set_creation_sink, previous)
+        self.phone = Smartphone("Samsung Galaxy S23 Синий", "Смартфон, камера 200MP", 100.0, 1,
+                                "Высокая", "S23", "256GB", "Синий")
+        self.tree = Product("Ёлка искусственная", "Зелёная ёлка 200 см", 50.0, 2)
+        self.case = Product("Чехол", "Синий чехол для смартфона", 5.0, 3)
+        self.category = Category("Поиск", "Тест", [self.phone, self.tree, self.case])
+
+    def names(self, *args, **kwargs):
+        return [product.name for product in self.category.search(*args, **kwargs)]
+
+    def test_unicode_case_folding(self):
+        """Поиск не учитывает регистр и различие «ё» и «е»"""
+        self.assertEqual(self.names("ЕЛКА"), ["Ёлка искусственная"])
+        self.assertEqual(self.names("200mp"), ["Samsung Galaxy S23 Синий"])
+        self.assertEqual(self.names(""), [])
+        self.assertEqual(self.names("нет такого"), [])
+
+    def test_and_prefix_and_ranking(self):
+        """Все слова обязательны, «*» ищет по началу слова, совпадение в названии выше"""
+        self.assertEqual(self.names("200MP камера"), ["Samsung Galaxy S23 Синий"])
+        self.assertEqual(self.names("синий чехол"), ["Чехол"])
+        self.assertEqual(self.names("смарт*"), ["Samsung Galaxy S23 Синий", "Чехол"])
+        self.assertEqual(self.names("sam gal", prefix=True), ["Samsung Galaxy S23 Синий"])
+        self.assertEqual(self.names("смарт"), [])
+        # «синий» есть в названии телефона и только в описании чехла
+        self.assertEqual(self.names("синий"), ["Samsung Galaxy S23 Синий", "Чехол"])
+        self.assertEqual(self.names("синий", limit=1), ["Samsung Galaxy S23 Синий"])
+        with self.assertRaises(ValueError):
+            self.category.search("синий", limit=-1)
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при добавлении, удалении и переименовании товаров"""
+        self.assertEqual(self.names("синий"), ["Samsung Galaxy S23 Синий", "Чехол"])
+        lamp = Product("Синяя лампа", "Синий свет", 10.0, 1)
+        self.category.add_product(lamp)
+        self.assertIn("Синяя лампа", self.names("синий"))
+        self.category.remove_product(self.phone)
+        # «синяя» — другое слово, поэтому лампа найдена только по описанию
+        self.assertEqual(self.names("синий"), ["Чехол", "Синяя лампа"])
+        self.case.name = "Бампер"
+        self.assertEqual(self.names("чехол"), ["Бампер"])
+        self.assertEqual(self.names("бамп*"), ["Бампер"])
+
+    def test_dense_and_sparse_paths_agree(self):
+        """Пересечение битовых карт даёт тот же результат, что и проверка кандидатов"""
+        colors = ["Черный", "Белый", "Синий"]
+        category = Category("Много", "Тест", [])
+        category.extend_records([(f"Телефон {colors[i % 3]} {i % 7}", f"Описание {colors[i % 2]} {i % 5}",
+                                  100.0, 1) for i in range(3000)])
+        queries = ["синий", "телефон синий 3", "описание черный", "тел* бел*", "1 2"]
+        dense = {query: [p.id for p in category.search(query, limit=None)] for query in queries}
+        category._Category__text_index._SPARSE_CANDIDATES = 10 ** 9
+        for query in queries:
+            self.assertEqual([p.id for p in category.search(query, limit=None)], dense[query], query)
+        self.assertEqual([p.id for p in category.search("синий", limit=5)], dense["синий"][:5])
+
+
+class TestSharedCatalog(unittest.TestCase):
+    def setUp(self):
+        import os
+        from src.shared_catalog import CatalogPublisher
+        previous = set_creation_sink(None)
+        self.addCleanup(set_creation_sink, previous)
+        self.name = f"oop_{os.getpid()}_{self.id().rsplit('.', 1)[-1][:8]}"
+        self.publisher = CatalogPublisher(self.name)
+        self.addCleanup(self.publisher.close)
+        self.category = Category("Смартфоны", "Мобильные устройства", [
+            Product("Iphone 15", "512GB, Gray space", 210000.0, 8),
+            Smartphone("Phone", "Desc", 500.0, 2, "High", "M1", "256GB", "Black"),
+        ])
+
+    def test_reader_attaches_without_copying(self):
+        """Читатель получает категорию поверх разделяемой памяти"""
+        from src.shared_catalog import CatalogReader
+        self.assertEqual(self.publisher.publish(self.category), 1)
+        reader = CatalogReader(self.name)
+        self.addCleanup(reader.close)
+        shared = reader.category
+        table = shared._Category__products
+        self.assertIsInstance(table.prices, memoryview)
+        self.assertNotIsInstance(table._strings, list)
+        self.assertEqual(shared.products, self.category.products)
+        self.assertEqual(shared.totals(), self.category.totals())
+        self.assertEqual(shared.query(kind=Smartphone)[0].memory, "256GB")
+        self.assertEqual([p.name for p in shared.search("512gb")], ["Iphone 15"])
+        # Изменения читателя остаются в его процессе
+        shared.query(kind=Smartphone)[0].name = "Другой"
+        self.assertEqual(self.category.query(kind=Smartphone)[0].name, "Phone")
+
+    def test_generation_swap(self):
+        """Новое поколение заменяет старое, уже подключённая категория остаётся целой"""
+        from src.shared_catalog import CatalogReader
+        self.publisher.publish(self.category)
+        reader = CatalogReader(self.name)
+        self.addCleanup(reader.close)
+        old = reader.category
+        self.category.add_product(Product("Чехол", "Силикон", 990.0, 5))
+        self.assertEqual(self.publisher.publish(self.category), 2)
+        self.assertTrue(reader.refresh())
+        self.assertFalse(reader.refresh())
+        self.assertEqual(reader.generation, 2)
+        self.assertEqual(len(reader.category.query()), 3)
+        self.assertEqual(len(old.query()), 2)
+        self.assertEqual(old.total_value, 210000.0 * 8 + 500.0 * 2)
+
+    def test_other_process_reads_catalog(self):
+        """Категория доступна из другого процесса"""
+        import subprocess
+        import os
+        self.publisher.publish(self.category)
+        code = ("from src.shared_catalog import CatalogReader\n"
+                f"print(CatalogReader({self.name!r}).category.total_value)")
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+        self.assertEqual(float(output), self.category.total_value)
+
+    def test_waits_for_first_generation(self):
+        from src.shared_catalog import CatalogReader
+        with self.assertRaises(TimeoutError):
+            CatalogReader(self.name, timeout=0.05)
+
+
+class TestReconcile(unittest.TestCase):
+    def setUp(self):
+        previous = set_creation_sink(None)
+        self.addCleanup(set_creation_sink, previous)
+        self.lamp = Product("Лампа", "Настольная", 100.0, 5)
+        self.chair = Product("Стул", "Деревянный", 50.0, 2)
+        self.table = Product("Стол", "Обеденный", 300.0, 1)
+        self.category = Category("Сверка", "Тест", [self.lamp, self.chair, self.table])
+
+    def feed(self):
+        return [
+            {'type': 'product', 'name': 'Лампа', 'description': 'Настольная', 'price': '120.0', 'quantity': '5'},
+            {'type': 'product', 'name': 'Стул', 'description': 'Деревянный', 'price': '50.0', 'quantity': '7'},
+            {'type': 'product', 'name': 'Шкаф', 'description': 'Платяной', 'price': '900', 'quantity': '1'},
+        ]
+
+    def test_applies_only_changes(self):
+        """Меняются только отличающиеся поля, пропавшие товары удаляются, новые добавляются"""
+        report = reconcile_feed(self.feed(), self.category)
+        self.assertEqual(report, ReconcileReport(inserted=1, deleted=1, price_changed=1, quantity_changed=1,
+                                                 replaced=0, unchanged=0, rejected=[]))
+        self.assertEqual((self.lamp.price, self.chair.quantity), (120.0, 7))
+        self.assertIs(self.category.get_product(self.lamp.id), self.lamp)
+        self.assertNotIn(self.table, self.category)
+        self.assertEqual(self.category.totals(), CategoryTotals(3, 13, 1070.0, 120.0 * 5 + 50.0 * 7 + 900.0))
+        self.category.verify_stats()
+        # Повторная поставка того же фида ничего не меняет
+        report = reconcile_feed(self.feed(), self.category)
+        self.assertEqual(report.unchanged, 3)
+        self.assertEqual(report[:5], (0, 0, 0, 0, 0))
+
+    def test_too_large_quantity_rejected(self):
+        """Количество, которое не помещается в колонку, отклоняет только свою запись"""
+        feed = self.feed()
+        feed[1]['quantity'] = str(2 ** 63)
+        report = reconcile_feed(feed, self.category)
+        self.assertEqual(report.rejected, [(2, "Количество слишком велико")])
+        self.assertEqual((report.inserted, report.price_changed), (1, 1))
+        self.assertEqual(self.chair.quantity, 2)
+        self.category.verify_stats()
+
+    def test_fingerprint_follows_changes_outside_reconcile(self):
+        """Изменение товара в обход сверки возвращается к состоянию фида при следующей сверке"""
+        reconcile_feed(self.feed(), self.category)
+        self.lamp.price = 1.0
+        self.chair.quantity = 1
+        report = reconcile_feed(self.feed(), self.category)
+        self.assertEqual((report.price_changed, report.quantity_changed, report.unchanged), (1, 1, 1))
+        self.assertEqual((self.lamp.price, self.chair.quantity), (120.0, 7))
+
+    def test_replaces_changed_static_fields(self):
+        """При смене описания или класса товар заменяется новым"""
+        records = [{'name': 'Лампа', 'description': 'Напольная', 'price': 100.0, 'quantity': 5},
+                   {'name': 'Стул', 'description': 'Деревянный', 'price': 50.0, 'quantity': 2},
+                   {'name': 'Стол', 'description': 'Обеденный', 'price': 300.0, 'quantity': 1,
+                    'efficiency': 'Высокая', 'model': 'T', 'memory': '1GB', 'color': 'Белый'}]
+        report = self.category.reconcile(records, [Product, Product, Smartphone])
+        self.assertEqual((report.replaced, report.unchanged, report.inserted, report.deleted), (2, 1, 0, 0))
+        self.assertNotIn(self.lamp, self.category)
+        self.assertIn(self.chair, self.category)
+        names = {product.name: product for product in self.category._Category__products}
+        self.assertEqual(names['Лампа'].description, 'Напольная')
+        self.assertIsInstance(names['Стол'], Smartphone)
+        self.assertEqual(len(self.category._Category__products), 3)
+
+    def test_rejected_rows_keep_products(self):
+        """Ошибочная строка не меняет и не удаляет товар, повторный ключ отклоняется"""
+        rows = self.feed()
+        rows[0]['price'] = '-1'
+        rows[1]['quantity'] = 'много'
+        rows.append(dict(rows[2]))
+        errors = []
+        report = reconcile_feed(rows, self.category, on_error=lambda number, message: errors.append(number))
+        self.assertEqual(errors, [1, 2, 4])
+        self.assertEqual(report.rejected, [])
+        self.assertEqual((self.lamp.price, self.chair.quantity), (100.0, 2))
+        self.assertIn(self.chair, self.category)
+        self.assertEqual((report.inserted, report.deleted), (1, 1))
+
+    def test_composite_key_and_keep_missing(self):
+        """Ключ из нескольких полей; delete_missing=False не удаляет отсутствующие товары"""
+        records = [{'name': 'Лампа', 'description': 'Настольная', 'price': 100.0, 'quantity': 6}]
+        report = self.category.reconcile(records, key=('name', 'description'), delete_missing=False)
+        self.assertEqual((report.quantity_changed, report.deleted), (1, 0))
+        self.assertEqual(len(self.category._Category__products), 3)
+        with self.assertRaises(ValueError):
+            self.category.reconcile(records, [Product, Product])
+
+
+    def test_replaced_product_keeps_key(self):
+        """Заменённый товар находится по ключу при следующей сверке"""
+        records = [{'name': 'Лампа', 'description': 'Напольная', 'price': 100.0, 'quantity': 5}]
+        self.assertEqual(self.category.reconcile(records, delete_missing=False).replaced, 1)
+        report = self.category.reconcile(records, delete_missing=False)
+        self.assertEqual((report.unchanged, report.inserted, report.replaced), (1, 0, 0))
+        self.assertEqual(len(self.category._Category__products), 3)
+
+
+class TestRepository(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        from src.repository import SQLiteRepository
+        previous = set_creation_sink(None)
+        self.addCleanup(set_creation_sink, previous)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.repository = SQLiteRepository(f"{directory.name}/catalog.db", pool_size=2)
+        self.addCleanup(self.repository.close)
+        self.category = Category("Смартфоны", "Мобильные устройства", [
+            Product("Iphone 15", "512GB, Gray space", 210000.0, 8),
+            Smartphone("Phone", "Desc", 500.0, 2, "High", "M1", "256GB", "Black"),
+            LawnGrass("Газон", "Описание", 50.0, 10, "Россия", 14, "Зеленый"),
+        ])
+
+    def test_roundtrip_keeps_classes_and_fields(self):
+        from src.repository import SaveReport
+        self.assertEqual(self.repository.save(self.category), SaveReport(3, 0, 0))
+        loaded = self.repository.load("Смартфоны", page_size=2)
+        self.assertEqual(loaded.products, self.category.products)
+        self.assertEqual(loaded.totals(), self.category.totals())
+        phone, grass = list(loaded._storage())[1:]
+        self.assertEqual((type(phone), phone.memory), (Smartphone, "256GB"))
+        self.assertEqual((type(grass), grass.germination_period), (LawnGrass, 14))
+        self.assertEqual(self.repository.categories(), ["Смартфоны"])
+
+    def test_saves_only_dirty_products(self):
+        from src.repository import SaveReport
+        self.repository.save(self.category)
+        loaded = self.repository.load("Смартфоны")
+        self.assertEqual(self.repository.save(loaded), SaveReport(0, 0, 0))
+        iphone, phone, grass = loaded._storage()
+        iphone.price = 200000.0
+        loaded.remove_product(phone)
+        loaded.add_product(Product("Чехол", "Силикон", 10.0, 5))
+        self.assertEqual(self.repository.save(loaded), SaveReport(1, 1, 1))
+        again = self.repository.load("Смартфоны")
+        self.assertEqual([product.name for product in again._storage()], ["Iphone 15", "Газон", "Чехол"])
+        self.assertEqual(again.price_sum, 200000.0 + 50.0 + 10.0)
+        # Первое сохранение другого объекта категории с тем же названием заменяет её целиком
+        replacement = Category("Смартфоны", "Новое описание", [Product("Pixel", "128GB", 50000.0, 1)])
+        self.assertEqual(self.repository.save(replacement), SaveReport(1, 0, 3))
+        self.assertEqual(self.repository.load("Смартфоны").products, replacement.products)
+        # Старый объект больше не отслеживается и при сохранении снова записывается целиком
+        self.assertEqual(self.repository.save(loaded), SaveReport(3, 0, 1))
+
+    def test_paged_loading(self):
+        self.category.extend_records([(f"Товар {i}", "Описание", 1.0 + i, 1) for i in range(7)])
+        self.repository.save(self.category)
+        pages = self.repository.iter_pages("Смартфоны", page_size=4)
+        self.assertEqual([len(page) for page in pages], [4, 4, 2])
+        page = self.repository.products_page("Смартфоны", 1, per_page=4)
+        self.assertEqual([product.name for product in page], ["Товар 1", "Товар 2", "Товар 3", "Товар 4"])
+        self.assertEqual(self.repository.count("Смартфоны"), 10)
+        with self.assertRaises(ValueError):
+            self.repository.load("Нет такой")
+        with self.assertRaises(ValueError):
+            self.repository.products_page("Смартфоны", -1)
+
+    def test_rename_to_existing_name(self):
+        """Переименование в занятое название даёт ValueError и не меняет базу"""
+        self.repository.save(self.category)
+        other = Category("Ноутбуки", "Портативные", [])
+        self.repository.save(other)
+        other.name = "Смартфоны"
+        with self.assertRaises(ValueError):
+            self.repository.save(other)
+        self.assertEqual(self.repository.categories(), ["Смартфоны", "Ноутбуки"])
+
+    def test_load_stops_tracking_earlier_copy(self):
+        """После load прежний объект той же категории не считается совпадающим с базой"""
+        from src.repository import SaveReport
+        self.repository.save(self.category)
+        loaded = self.repository.load("Смартфоны")
+        loaded.name = "Телефоны"
+        self.assertEqual(self.repository.save(loaded), SaveReport(0, 0, 0))
+        self.assertEqual(self.repository.categories(), ["Телефоны"])
+        # Прежний объект записывается целиком, а не как «без изменений»
+        self.assertEqual(self.repository.save(self.category), SaveReport(3, 0, 0))
+        self.assertEqual(self.repository.categories(), ["Телефоны", "Смартфоны"])
+        self.assertEqual(self.repository.count("Смартфоны"), 3)
+        loaded.reprice({next(iter(loaded._storage())).id: 1.0})
+        self.assertEqual(self.repository.save(loaded), SaveReport(0, 1, 0))
+        self.assertEqual(self.repository.count("Телефоны"), 3)
+
+    def test_concurrent_readers(self):
+        import threading
+        self.repository.save(self.category)
+        results = []
+
+        def read():
+            for _ in range(20):
+                results.append(self.repository.load("Смартфоны").total_value)
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [self.category.total_value] * 80)
+
+    def test_delete(self):
+        self.repository.save(self.category)
+        self.repository.delete("Смартфоны")
+        self.assertEqual(self.repository.categories(), [])
+        self.assertEqual(self.repository.save(self.category).inserted, 3)
+
+
+class TestKopeckPrices(unittest.TestCase):
+    def setUp(self):
+        import random
+        previous = set_creation_sink(None)
+        self.addCleanup(set_creation_sink, previous)
+        self.addCleanup(set_price_mode, set_price_mode('kopecks'))
+        rnd = random.Random(7)
+        self.records = [(f"Товар {i}", "Описание", f"{rnd.randrange(1, 10 ** 6)}.{rnd.randrange(100):02d}",
+                         rnd.randrange(1, 100)) for i in range(2000)]
+
+    def reference(self, records):
+        from decimal import Decimal
+        return sum(Decimal(price) * quantity for _, _, price, quantity in records)
+
+    def test_parse_kopecks(self):
+        """Строки, float и Decimal переводятся в копейки с округлением половины от нуля"""
+        from decimal import Decimal
+        cases = [("1.005", 101), (" 12 ", 1200), ("1e2", 10000), ("-0.015", -2), (".5", 50),
+                 (0.1, 10), (1.005, 101), (7, 700), (Decimal("2.345"), 235)]
+        for value, expected in cases:
+            with self.subTest(value=value):
+                self.assertEqual(parse_kopecks(value), expected)
+        for value in ["", ".", "abc", "nan", float("inf")]:
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_kopecks(value)
+        with self.assertRaises(TypeError):
+            parse_kopecks(None)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            set_price_mode('cents')
+
+    def test_price_beyond_float_range_is_row_error(self):
+        """Слишком большая цена отклоняется так же, как в режиме float, и не прерывает загрузку"""
+        for price in ("1e400", "1e9999", 10 ** 400, 1e308):
+            with self.subTest(price=price), self.assertRaisesRegex(ValueError, "Цена должна быть конечным числом"):
+                Product("Лампа", "Настольная", price, 1)
+        category = Category("Копейки", "Тест", [])
+        feed = io.StringIO('{"name": "A", "description": "D", "price": "1e400", "quantity": 1}\n'
+                           '{"name": "B", "description": "D", "price": "1.50", "quantity": 2}\n')
+        report = import_jsonl(feed, category)
+        self.assertEqual(report.imported, 1)
+        self.assertEqual(report.errors, [(1, "Цена должна быть конечным числом")])
+        self.assertEqual(category.totals_kopecks().total_value, 300)
+
+    def test_prices_rounded_once(self):
+        """Цена приводится к копейке при создании, изменении и в арифметике товаров"""
+        lamp = Product("Лампа", "Настольная", "0.105", 3)
+        self.assertEqual(lamp.price, 0.11)
+        self.assertEqual(lamp.price_kopecks, 11)
+        self.assertEqual(lamp.value_kopecks, 33)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            lamp.price = 0.004
+        self.assertIn("Цена не должна быть нулевая или отрицательная", output.getvalue())
+        self.assertEqual(lamp.price, 0.11)
+        with self.assertRaises(ValueError):
+            Product("Лампа", "Настольная", "0.001", 1)
+
+    def test_totals_match_decimal(self):
+        """Накопленные суммы точно совпадают с расчётом в Decimal"""
+        category = Category("Копейки", "Тест", [])
+        category.extend_records(self.records)
+        reference = self.reference(self.records)
+        totals = category.totals_kopecks()
+        self.assertEqual(totals.total_value, reference * 100)
+        self.assertEqual(category.total_value, float(reference))
+        self.assertEqual(category.stats().total_value, float(reference))
+        self.assertEqual(stock_value(category).total_value, float(reference))
+        from decimal import Decimal
+        price_sum = sum(Decimal(price) for _, _, price, _ in self.records)
+        self.assertEqual(category.average_price(), float(price_sum / len(self.records)))
+
+        products = list(category._storage())
+        category.reprice({products[0].id: "10.015", products[1].id: "3.30"})
+        products[2].quantity += 5
+        category.remove_product(products[3])
+        category.verify_stats()
+        changed = [(name, description, {0: "10.02", 1: "3.30"}.get(i, price), quantity + 5 * (i == 2))
+                   for i, (name, description, price, quantity) in enumerate(self.records) if i != 3]
+        self.assertEqual(category.totals_kopecks().total_value, self.reference(changed) * 100)
+        self.assertEqual(list(category._storage().kopecks()), [product.price_kopecks for product in category._storage()])
+
+    def test_process_workers_use_price_mode(self):
+        """Рабочие процессы parallel_import (в том числе запущенные через spawn) округляют цены до копейки"""
+        import functools
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        spawn_pool = functools.partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context('spawn'))
+        rows = [{'name': f"Товар {i}", 'description': "Описание", 'price': "10.005", 'quantity': 1}
+                for i in range(4)]
+        category = Category("Копейки", "Тест", [])
+        with patch('src.importer.ProcessPoolExecutor', spawn_pool):
+            report = parallel_import(rows, category, workers=2, executor='process', chunk_size=2)
+        self.assertEqual(report.imported, 4)
+        self.assertEqual(set(category._storage().prices), {10.01})
+        self.assertEqual(category.totals_kopecks().total_value, 4004)
 
+    def test_float_category_has_no_kopeck_totals(self):
+        set_price_mode('float')
+        with self.assertRaises(ValueError):
+            Category("Float", "Тест", []).totals_kopecks()
 
+    def test_mode_fixed_at_creation(self):
+        """Переключение режима не меняет расчёты уже созданных категорий и товаров"""
+        set_price_mode('float')
+        lamp = Product("Лампа", "Настольная", 1.005, 3)
+        category = Category("Float", "Тест", [lamp, Product("Стул", "Деревянный", 10.0, 2)])
+        before = (category.total_value, category.stats().total_value,
+                  stock_value(category).total_value, lamp.calculate_total_value())
+        set_price_mode('kopecks')
+        after = (category.total_value, category.stats().total_value,
+                 stock_value(category).total_value, lamp.calculate_total_value())
+        self.assertEqual(after, before)
+        self.assertEqual(category.total_value, category.stats().total_value)
 
+    def test_snapshot_keeps_kopeck_totals(self):
+        """Снимок хранит суммы в копейках; при другом режиме статистика пересчитывается"""
+        import os
+        import tempfile
+        category = Category("Копейки", "Тест", [])
+        category.extend_records(self.records)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kopecks.snap")
+            category.save(path)
+            loaded = Category.load(path)
+            self.assertEqual(loaded.totals_kopecks(), category.totals_kopecks())
+            set_price_mode('float')
+            loaded = Category.load(path)
+            loaded.verify_stats()
+            self.assertEqual(loaded.quantity_sum, category.quantity_sum)
+            del loaded
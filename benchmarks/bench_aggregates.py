@@ -0,0 +1,57 @@
+"""Сравнение Category.stats() с поэлементными циклами по объектам Product.
+
+Запуск: python -m benchmarks.bench_aggregates [размеры...]
+"""
+import contextlib
+import io
+import statistics
+import sys
+import time
+
+from src.main import Category, Product
+
+
+def build_category(size):
+    """Создаёт категорию из size товаров, подавляя вывод миксина."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        products = [Product(f"Товар {i}", "Описание", 100.0 + i % 997, 1 + i % 50)
+                    for i in range(size)]
+    return products, Category("Бенчмарк", "Категория для замеров", products)
+
+
+def per_object_loops(products):
+    """Исходный подход: отдельные циклы по объектам для каждого агрегата."""
+    total_value = 0
+    for product in products:
+        total_value += product.calculate_total_value()
+    total_quantity = 0
+    for product in products:
+        total_quantity += product.quantity
+    all_price = 0
+    for product in products:
+        all_price += product.price
+    prices = [product.price for product in products]
+    return (total_value, total_quantity, all_price / len(products), min(prices), max(prices),
+            statistics.quantiles(prices, n=4, method='inclusive'))
+
+
+def timed(func, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(sizes):
+    print(f"{'товаров':>10} {'циклы, с':>12} {'stats(), с':>12} {'ускорение':>10}")
+    for size in sizes:
+        products, category = build_category(size)
+        loops = timed(per_object_loops, products)
+        batched = timed(category.stats)
+        print(f"{size:>10} {loops:>12.4f} {batched:>12.4f} {loops / batched:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
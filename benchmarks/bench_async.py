@@ -0,0 +1,77 @@
+"""Нагрузочный тест AsyncCatalog: тысячи одновременных клиентов и фоновая загрузка.
+
+Клиенты в цикле добавляют и удаляют товары, ищут по цене и читают
+статистику; параллельно идёт пакетная загрузка записей. Для сравнения
+та же загрузка выполняется прямо в цикле событий через extend_records.
+
+Запуск: python -m benchmarks.bench_async [клиентов] [записей в загрузке]
+"""
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from src.async_catalog import AsyncCatalog
+from src.main import Category, Product, set_creation_sink
+
+REQUESTS_PER_CLIENT = 20
+
+
+async def client(catalog, seed, latencies):
+    rng = random.Random(seed)
+    for _ in range(REQUESTS_PER_CLIENT):
+        action = rng.random()
+        start = time.perf_counter()
+        if action < 0.4:
+            product = Product("Товар", "Описание", 1.0 + rng.random() * 1000, 1 + rng.randrange(50))
+            await catalog.add(product)
+            await catalog.remove(product)
+        elif action < 0.8:
+            low = rng.random() * 1000
+            await catalog.query(price_min=low, price_max=low + 0.5)
+        else:
+            await catalog.totals()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0)
+
+
+async def scenario(clients, import_size, offload):
+    category = Category("Нагрузка", "Бенчмарк", [])
+    category.extend_records([(f"Товар {i}", "Описание", 1.0 + i % 1000, 1 + i % 50) for i in range(100_000)])
+    catalog = AsyncCatalog(category)
+    # Индекс цен строится при первом запросе; строим его заранее
+    await catalog.query(price_min=0, price_max=0)
+    records = [(f"Загрузка {i}", "Описание", 1.0 + i % 997, 1 + i % 20) for i in range(import_size)]
+
+    async def bulk_import():
+        await asyncio.sleep(0.01)
+        if offload:
+            await catalog.import_records(records)
+        else:
+            category.extend_records(records)
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(bulk_import(), *(client(catalog, seed, latencies) for seed in range(clients)))
+    elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def percentile(samples, fraction):
+    return statistics.quantiles(samples, n=100, method='inclusive')[int(fraction * 100) - 1]
+
+
+def main(clients, import_size):
+    set_creation_sink(None)
+    print(f"клиентов: {clients}, запросов: {clients * REQUESTS_PER_CLIENT}, записей в загрузке: {import_size}")
+    print(f"{'загрузка':>10} {'p50, мс':>9} {'p99, мс':>9} {'макс, мс':>9} {'запросов/с':>11}")
+    for title, offload in (('в пуле', True), ('в цикле', False)):
+        latencies, elapsed = asyncio.run(scenario(clients, import_size, offload))
+        print(f"{title:>10} {percentile(latencies, 0.5) * 1000:>9.3f} {percentile(latencies, 0.99) * 1000:>9.3f} "
+              f"{max(latencies) * 1000:>9.1f} {len(latencies) / elapsed:>11.0f}")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [2000, 300_000][len(args):]))
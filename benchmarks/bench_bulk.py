@@ -0,0 +1,60 @@
+"""Сравнение пакетной загрузки (Category.extend_records) с циклом Product.new_product.
+
+Запуск: python -m benchmarks.bench_bulk [размеры...]
+"""
+import contextlib
+import io
+import sys
+import time
+
+from src.main import Category, Product, set_creation_sink
+
+
+def make_records(size):
+    return [{'name': f"Товар {i}", 'description': "Описание", 'price': f"{100 + i % 997}.0",
+             'quantity': 1 + i % 50} for i in range(size)]
+
+
+def new_product_loop(records):
+    category = Category("Цикл", "new_product", [])
+    with contextlib.redirect_stdout(io.StringIO()):
+        for record in records:
+            category.add_product(Product.new_product(record))
+    return category
+
+
+def new_product_loop_silent(records):
+    previous = set_creation_sink(None)
+    try:
+        category = Category("Цикл", "new_product без логов", [])
+        for record in records:
+            category.add_product(Product.new_product(record))
+    finally:
+        set_creation_sink(previous)
+    return category
+
+
+def bulk(records):
+    category = Category("Пакет", "extend_records", [])
+    category.extend_records(records)
+    return category
+
+
+def timed(func, records):
+    start = time.perf_counter()
+    func(records)
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'строк':>10} {'new_product':>12} {'без логов':>12} {'пакетно':>13} {'ускорение':>10}")
+    for size in sizes:
+        records = make_records(size)
+        loop = timed(new_product_loop, records)
+        silent = timed(new_product_loop_silent, records)
+        batched = timed(bulk, records)
+        print(f"{size:>10} {loop:>12.3f} {silent:>12.3f} {batched:>13.3f} {loop / batched:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
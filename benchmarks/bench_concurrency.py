@@ -0,0 +1,77 @@
+"""Пропускная способность потокобезопасных категорий: своя блокировка у каждой категории против одной общей.
+
+Каждый поток выполняет смесь операций над случайными категориями: резерв
+и возврат остатка, смену цены, добавление и удаление товара, чтение
+снимка статистики. На CPython с GIL рост числа потоков упирается в
+интерпретатор; на сборках без GIL (3.13t) разница между режимами
+показывает цену общей блокировки.
+
+Запуск: python -m benchmarks.bench_concurrency [потоки...]
+"""
+import random
+import sys
+import threading
+import time
+
+from src.main import Category, Product, set_creation_sink
+
+CATEGORIES = 32
+PRODUCTS = 200
+OPERATIONS = 20_000
+
+
+def build(shared_lock):
+    categories = []
+    for index in range(CATEGORIES):
+        category = Category(f"Категория {index}", "Бенчмарк",
+                            [Product(f"Товар {i}", "Описание", 100.0 + i, 1_000_000) for i in range(PRODUCTS)])
+        category.enable_thread_safety(shared_lock)
+        categories.append((category, category.query()))
+    return categories
+
+
+def worker(categories, operations, seed):
+    rng = random.Random(seed)
+    for _ in range(operations):
+        category, products = rng.choice(categories)
+        product = rng.choice(products)
+        action = rng.random()
+        if action < 0.5:
+            product.reserve()
+            product.release()
+        elif action < 0.7:
+            product.price = 100.0 + rng.random() * 100
+        elif action < 0.85:
+            extra = Product("Новинка", "Описание", 10.0, 1)
+            category.add_product(extra)
+            category.remove_product(extra)
+        else:
+            category.totals()
+
+
+def run(threads, shared_lock):
+    categories = build(shared_lock)
+    per_thread = OPERATIONS // threads
+    pool = [threading.Thread(target=worker, args=(categories, per_thread, seed)) for seed in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    for category, _ in categories:
+        category.verify_stats()
+    return per_thread * threads / elapsed
+
+
+def main(thread_counts):
+    set_creation_sink(None)
+    print(f"{'потоков':>8} {'свои блокировки, оп/с':>22} {'общая блокировка, оп/с':>23}")
+    for threads in thread_counts:
+        striped = run(threads, None)
+        global_lock = run(threads, threading.RLock())
+        print(f"{threads:>8} {striped:>22.0f} {global_lock:>23.0f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1, 2, 4, 8])
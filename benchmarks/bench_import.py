@@ -0,0 +1,37 @@
+"""Время импорта src.main по данным python -X importtime.
+
+Запуск: python -m benchmarks.bench_import [повторов]
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_profile():
+    """Возвращает список (модуль, собственное время, накопленное время) в микросекундах."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import src.main"],
+                            capture_output=True, text=True, check=True, cwd=ROOT)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(own), int(cumulative)))
+    return rows
+
+
+def main(repeat):
+    totals = []
+    for _ in range(repeat):
+        rows = import_profile()
+        totals.append(next(cumulative for name, _, cumulative in rows if name == 'src.main'))
+    print(f"src.main: лучшее {min(totals) / 1000:.1f} мс, медиана {sorted(totals)[len(totals) // 2] / 1000:.1f} мс")
+    print("самые дорогие модули последнего запуска:")
+    for name, own, cumulative in sorted(rows, key=lambda row: row[2], reverse=True)[:10]:
+        print(f"  {name:<30} {cumulative / 1000:>7.1f} мс")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,49 @@
+"""Память на один товар для обычной и компактной (__slots__) иерархий (tracemalloc).
+
+Запуск: python -m benchmarks.bench_memory [товаров]
+"""
+import sys
+import tracemalloc
+
+from src.main import (CompactLawnGrass, CompactProduct, CompactSmartphone, LawnGrass, Product,
+                      Smartphone, set_creation_sink)
+
+COLORS = ["Черный", "Белый", "Синий", "Зеленый"]
+
+
+def make_args(cls, i):
+    base = (f"Товар {i}", "Описание", 100.0 + i % 997, 1 + i % 50)
+    if issubclass(cls, Smartphone):
+        # Строки собираются заново, чтобы повторы не совпадали по ссылке без интернирования
+        return base + ("High", "Model " + str(i % 10), str(64 << i % 4) + "GB", "".join(COLORS[i % 4]))
+    if issubclass(cls, LawnGrass):
+        return base + ("Россия"[:], 7 + i % 14, "".join(COLORS[i % 4]))
+    return base
+
+
+def bytes_per_product(cls, size):
+    """Память, удерживаемая товарами вместе с их строками, в пересчёте на один товар."""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    products = [cls(*make_args(cls, i)) for i in range(size)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del products
+    return (after - before) / size
+
+
+def main(size):
+    previous = set_creation_sink(None)
+    try:
+        print(f"{'класс':<12} {'обычный, Б':>12} {'компактный, Б':>14} {'экономия':>9}")
+        for regular, compact in ((Product, CompactProduct), (Smartphone, CompactSmartphone),
+                                 (LawnGrass, CompactLawnGrass)):
+            before = bytes_per_product(regular, size)
+            after = bytes_per_product(compact, size)
+            print(f"{regular.__name__:<12} {before:>12.0f} {after:>14.0f} {1 - after / before:>8.0%}")
+    finally:
+        set_creation_sink(previous)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
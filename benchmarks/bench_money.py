@@ -0,0 +1,66 @@
+"""Денежные расчёты в float против целых копеек (set_price_mode).
+
+Для каждого режима замеряются:
+- пакетная загрузка категории с накоплением сумм (extend_records);
+- накопление сумм заново по готовым колонкам (как после загрузки снимка
+  без сохранённой статистики);
+- переоценка 10% товаров одной пачкой (reprice);
+- совпадение общей стоимости с эталоном, посчитанным в Decimal
+  и округлённым до ближайшего float.
+
+Запуск: python -m benchmarks.bench_money [товаров ...]
+"""
+from decimal import Decimal
+import random
+import sys
+import time
+
+from src.main import Category, _new_totals, set_creation_sink, set_price_mode
+
+
+def make_records(size, seed=0):
+    rnd = random.Random(seed)
+    return [(f"Товар {i}", "Описание", f"{rnd.randrange(1, 100_000)}.{rnd.randrange(100):02d}", rnd.randrange(1, 50))
+            for i in range(size)]
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def measure(records, mode):
+    previous = set_price_mode(mode)
+    try:
+        category = Category("Бенчмарк", "Категория для замеров", [])
+        load, _ = timed(lambda: category.extend_records(records))
+        table = category._storage()
+        totals = _new_totals()
+        recount, _ = timed(lambda: totals.on_extend(table, 0, len(table)))
+        rows = table._uids[::10]
+        reprice, _ = timed(lambda: category.reprice(rows, [f"{i % 1000}.99" for i in range(len(rows))]))
+        return load, recount, reprice, category
+    finally:
+        set_price_mode(previous)
+
+
+def main(sizes):
+    previous = set_creation_sink(None)
+    try:
+        print(f"{'товаров':>9} {'режим':>8} {'загрузка, с':>12} {'суммы, с':>9} {'переоценка, с':>14} {'= Decimal':>10}")
+        for size in sizes:
+            records = make_records(size)
+            decimal, _ = timed(lambda: sum(Decimal(price) * quantity for _, _, price, quantity in records))
+            print(f"{size:>9} {'Decimal':>8} {'':>12} {decimal:>9.3f} {'':>14} {'':>10}")
+            for mode in ('float', 'kopecks'):
+                load, recount, reprice, category = measure(records, mode)
+                reference = sum(Decimal(f"{product.price:.2f}") * product.quantity for product in category._storage())
+                exact = category.total_value == float(reference)
+                print(f"{size:>9} {mode:>8} {load:>12.3f} {recount:>9.3f} {reprice:>14.3f} {'да' if exact else 'нет':>10}")
+    finally:
+        set_creation_sink(previous)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
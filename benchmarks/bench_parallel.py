@@ -0,0 +1,35 @@
+"""Масштабирование parallel_import по числу рабочих процессов.
+
+Запуск: python -m benchmarks.bench_parallel [строк] [процессы...]
+"""
+import os
+import sys
+import time
+
+from src.importer import import_feed, parallel_import
+from src.main import Category
+
+
+def make_rows(size):
+    for i in range(size):
+        yield {'type': 'product', 'name': f"Товар {i}", 'description': f"Описание {i % 1000}",
+               'price': f"{100 + i % 997}.50", 'quantity': str(1 + i % 50)}
+
+
+def main(size, worker_counts):
+    start = time.perf_counter()
+    import_feed(make_rows(size), Category("Последовательно", "import_feed", []), chunk_size=50_000)
+    serial = time.perf_counter() - start
+    print(f"строк: {size}, ядер: {os.cpu_count()}")
+    print(f"{'процессов':>10} {'время, с':>10} {'ускорение':>10}")
+    print(f"{'import_feed':>10} {serial:>10.2f} {1:>9.1f}x")
+    for workers in worker_counts:
+        start = time.perf_counter()
+        parallel_import(make_rows(size), Category("Параллельно", "parallel_import", []), workers=workers)
+        elapsed = time.perf_counter() - start
+        print(f"{workers:>10} {elapsed:>10.2f} {serial / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(args[0] if args else 5_000_000, args[1:] or [1, 2, 4, 8])
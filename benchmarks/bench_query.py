@@ -0,0 +1,64 @@
+"""Задержка Category.query() по сравнению с перебором всех товаров.
+
+Запуск: python -m benchmarks.bench_query [размеры...]
+"""
+import statistics
+import sys
+import time
+
+from src.main import Category, LawnGrass, Product, Smartphone, set_creation_sink
+
+QUERIES = {
+    'цена 100..101': dict(price_min=100, price_max=101),
+    'количество < 2': dict(quantity_below=2),
+    'Smartphone 256GB': dict(kind=Smartphone, memory='256GB', price_min=100, price_max=110),
+    'LawnGrass США': dict(country='США', quantity_below=3),
+}
+
+
+def build_category(size):
+    category = Category("Бенчмарк", "Категория для замеров", [])
+    category.extend_records([(f"Товар {i}", "Описание", 1.0 + i % 1000, 1 + i % 50)
+                             for i in range(size // 2)])
+    category.extend_records([(f"Телефон {i}", "Описание", 100.0 + i % 500, 1 + i % 20, "Высокая", "M",
+                              ("128GB", "256GB", "512GB")[i % 3], "Черный") for i in range(size // 4)],
+                            product_class=Smartphone)
+    category.extend_records([(f"Газон {i}", "Описание", 10.0 + i % 50, 1 + i % 30, ("Россия", "США")[i % 2],
+                              7, "Зеленый") for i in range(size - size // 2 - size // 4)],
+                            product_class=LawnGrass)
+    return category
+
+
+def scan(category, price_min=None, price_max=None, quantity_below=None, kind=Product, **attributes):
+    """Перебор без индексов: проверка каждого товара."""
+    low = price_min if price_min is not None else float('-inf')
+    high = price_max if price_max is not None else float('inf')
+    limit = quantity_below if quantity_below is not None else float('inf')
+    return [product for product in category.query()
+            if low <= product.price <= high and product.quantity < limit and isinstance(product, kind)
+            and all(getattr(product, field, None) == value for field, value in attributes.items())]
+
+
+def latency(func, repeat=50):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main(sizes):
+    set_creation_sink(None)
+    print(f"{'товаров':>10} {'запрос':>18} {'найдено':>8} {'перебор, мс':>12} {'query, мс':>10}")
+    for size in sizes:
+        category = build_category(size)
+        for title, query in QUERIES.items():
+            found = len(category.query(**query))
+            scanned = latency(lambda: scan(category, **query), repeat=3)
+            indexed = latency(lambda: category.query(**query))
+            print(f"{size:>10} {title:>18} {found:>8} {scanned * 1000:>12.2f} {indexed * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -0,0 +1,82 @@
+"""Сверка фида поставщика с категорией против полной пересборки категории.
+
+Новый фид отличается от загруженного на долю churn строк: часть цен и
+количеств изменена, часть товаров удалена и столько же добавлено.
+Пересборка создаёт каждый товар через Product.new_product (как раньше при
+каждой поставке) и, для сравнения, через пакетный Category.extend_records.
+
+Запуск: python -m benchmarks.bench_reconcile [строк] [доля изменений]
+"""
+import sys
+import time
+
+from src.importer import reconcile_feed
+from src.main import Category, Product, set_creation_sink
+
+
+def make_feed(size, churn=0.0, seed=0):
+    """Строки фида как после разбора CSV; изменения распределены по фиду равномерно."""
+    step = int(1 / churn) if churn else 0
+    rows = []
+    for i in range(size):
+        price = 100 + i % 997
+        quantity = 1 + i % 50
+        name = f"Товар {i}"
+        if step and i % step == seed % step:
+            change = (i // step) % 4
+            if change == 0:
+                price += 1
+            elif change == 1:
+                quantity += 1
+            elif change == 2:
+                # Товар снят с продажи и заменён новым
+                name = f"Новинка {i}"
+            else:
+                continue
+        rows.append({'type': 'product', 'name': name, 'description': f"Описание {i % 50}",
+                     'price': f"{price}.50", 'quantity': quantity})
+    return rows
+
+
+def rebuild_new_product(rows):
+    start = time.perf_counter()
+    for row in rows:
+        row['quantity'] = int(row['quantity'])
+    Category("Поставщик", "Фид", [Product.new_product(row) for row in rows])
+    return time.perf_counter() - start
+
+
+def rebuild_records(rows):
+    start = time.perf_counter()
+    category = Category("Поставщик", "Фид", [])
+    category.extend_records(rows)
+    return time.perf_counter() - start
+
+
+def main(size, churn):
+    previous = set_creation_sink(None)
+    try:
+        category = Category("Поставщик", "Фид", [])
+        category.extend_records(make_feed(size))
+        start = time.perf_counter()
+        reconcile_feed(make_feed(size), category)
+        first = time.perf_counter() - start
+        feed = make_feed(size, churn)
+        start = time.perf_counter()
+        report = reconcile_feed(feed, category)
+        reconcile = time.perf_counter() - start
+        full = rebuild_new_product(make_feed(size, churn))
+        records = rebuild_records(make_feed(size, churn))
+    finally:
+        set_creation_sink(previous)
+    print(f"{size} строк, изменено {churn:.0%}: {report}")
+    print(f"{'способ':<34} {'время, с':>9}")
+    print(f"{'пересборка через new_product':<34} {full:>9.3f}")
+    print(f"{'пересборка через extend_records':<34} {records:>9.3f}")
+    print(f"{'первая сверка (строит отпечатки)':<34} {first:>9.3f}")
+    print(f"{'сверка':<34} {reconcile:>9.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 0.01)
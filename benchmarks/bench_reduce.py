@@ -0,0 +1,49 @@
+"""Общая стоимость остатков: попарный Product.__add__ против stock_value.
+
+Запуск: python -m benchmarks.bench_reduce [размеры...]
+"""
+import sys
+
+from benchmarks.bench_aggregates import timed
+from src.main import Category, LawnGrass, Product, Smartphone, set_creation_sink, stock_value
+
+
+def build_products(size):
+    products = [Product(f"Товар {i}", "Описание", 100.0 + i % 997, 1 + i % 50) for i in range(size // 2)]
+    products += [Smartphone(f"Телефон {i}", "Описание", 1000.0 + i % 97, 1 + i % 5, "Высокая", "M", "256GB",
+                            "Черный") for i in range(size // 4)]
+    products += [LawnGrass(f"Газон {i}", "Описание", 50.0 + i % 13, 1 + i % 30, "Россия", 14, "Зеленый")
+                 for i in range(size - len(products))]
+    return products
+
+
+def pairwise(products):
+    """Исходный подход: группировка вручную и попарное сложение через __add__."""
+    groups = {}
+    for product in products:
+        groups.setdefault(type(product), []).append(product)
+    totals = {}
+    for cls, group in groups.items():
+        total = 0.0
+        for index in range(0, len(group) - 1, 2):
+            total += group[index] + group[index + 1]
+        if len(group) % 2:
+            total += group[-1].calculate_total_value()
+        totals[cls] = total
+    return totals
+
+
+def main(sizes):
+    set_creation_sink(None)
+    print(f"{'товаров':>10} {'__add__, с':>11} {'объекты, с':>11} {'категория, с':>13} {'ускорение':>10}")
+    for size in sizes:
+        products = build_products(size)
+        category = Category("Бенчмарк", "Категория для замеров", products)
+        loop = timed(pairwise, products)
+        objects = timed(stock_value, products, True)
+        columns = timed(category.stock_value, True)
+        print(f"{size:>10} {loop:>11.3f} {objects:>11.3f} {columns:>13.3f} {loop / columns:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,35 @@
+"""Повторный вывод списка товаров: join по str(product) против кэшированного Category.products.
+
+Запуск: python -m benchmarks.bench_render [размеры...]
+"""
+import sys
+
+from benchmarks.bench_aggregates import build_category, timed
+
+
+def join_every_time(category):
+    """Исходный подход: каждый вывод заново форматирует все товары."""
+    return "\n".join(str(product) for product in category._Category__products)
+
+
+def main(sizes):
+    print(f"{'товаров':>10} {'join, с':>10} {'кэш, с':>10} {'1% изменён, с':>14} {'страница, мс':>13}")
+    for size in sizes:
+        products, category = build_category(size)
+        full = timed(join_every_time, category)
+        category.products
+        cached = timed(lambda: category.products)
+        changed = products[::100]
+
+        def after_changes():
+            for product in changed:
+                product.quantity += 1
+            return category.products
+
+        partial = timed(after_changes)
+        page = timed(lambda: category.products_page(size // 200, per_page=100))
+        print(f"{size:>10} {full:>10.4f} {cached:>10.4f} {partial:>14.4f} {page * 1000:>13.3f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000])
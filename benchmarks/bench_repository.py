@@ -0,0 +1,70 @@
+"""Запись и чтение категории в базе SQLite (src/repository.py).
+
+Сравниваются:
+- полная запись через executemany в одной транзакции;
+- вставка по одной строке через execute;
+- постраничная загрузка категории;
+- запись только изменённых товаров после изменения 1% цен.
+
+Запуск: python -m benchmarks.bench_repository [товаров ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from src.main import Category, Product, set_creation_sink
+from src.repository import _INSERT_PRODUCT, SQLiteRepository
+
+
+def make_category(size):
+    category = Category("Бенчмарк", "Категория для замеров", [])
+    category.extend_records([(f"Товар {i}", "Описание", 100.0 + i % 997, 1 + i % 50) for i in range(size)])
+    return category
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def insert_row_by_row(repository, category):
+    """Та же запись, но отдельным execute на каждую строку."""
+    table = category._storage()
+    rows = repository._product_values(table, range(len(table)), range(1, len(table) + 1), 1)
+    with repository._transaction() as connection:
+        connection.execute("INSERT INTO categories (id, name, description) VALUES (1, 'Построчно', '')")
+        for row in rows:
+            connection.execute(_INSERT_PRODUCT, row)
+
+
+def measure(size, directory):
+    category = make_category(size)
+    with SQLiteRepository(os.path.join(directory, f"bulk_{size}.db")) as repository:
+        save, _ = timed(lambda: repository.save(category))
+        load, loaded = timed(lambda: repository.load(category.name))
+        rows = loaded._storage()._uids[::100]
+        loaded.reprice(dict.fromkeys(rows, 1.0))
+        dirty, report = timed(lambda: repository.save(loaded))
+    with SQLiteRepository(os.path.join(directory, f"rows_{size}.db")) as repository:
+        row_by_row, _ = timed(lambda: insert_row_by_row(repository, category))
+    return save, row_by_row, load, dirty, report.updated
+
+
+def main(sizes):
+    previous = set_creation_sink(None)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            print(f"{'товаров':>9} {'executemany':>13} {'построчно':>13} {'загрузка':>13} "
+                  f"{'изменения (1%)':>16}")
+            for size in sizes:
+                save, row_by_row, load, dirty, updated = measure(size, directory)
+                print(f"{size:>9} {size / save:>10.0f}/с {size / row_by_row:>10.0f}/с "
+                      f"{size / load:>10.0f}/с {dirty * 1000:>9.1f} мс ({updated})")
+    finally:
+        set_creation_sink(previous)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,40 @@
+"""Переоценка всех товаров: сеттер price по одному товару против Category.reprice.
+
+Запуск: python -m benchmarks.bench_reprice [размеры...]
+"""
+import sys
+import time
+
+from src.main import Category, set_creation_sink
+
+
+def build_category(size):
+    category = Category("Бенчмарк", "Категория для замеров", [])
+    category.extend_records([(f"Товар {i}", "Описание", 100.0 + i % 997, 1 + i % 50) for i in range(size)])
+    return category
+
+
+def per_object(category, factor):
+    for product in category.query():
+        product.price = product.price * factor
+
+
+def main(sizes):
+    set_creation_sink(None)
+    print(f"{'товаров':>10} {'сеттер, с':>10} {'reprice, с':>11} {'ускорение':>10}")
+    for size in sizes:
+        category = build_category(size)
+        category.query(price_min=0)
+        start = time.perf_counter()
+        per_object(category, 1.01)
+        loop = time.perf_counter() - start
+        category = build_category(size)
+        category.query(price_min=0)
+        start = time.perf_counter()
+        category.adjust_prices(percent=1)
+        batched = time.perf_counter() - start
+        print(f"{size:>10} {loop:>10.3f} {batched:>11.3f} {loop / batched:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
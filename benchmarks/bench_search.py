@@ -0,0 +1,88 @@
+"""Полнотекстовый поиск Category.search() по сравнению с перебором названий и описаний.
+
+Печатает время построения индекса, занимаемую им память (sys.getsizeof
+словарей, слов и списков идентификаторов) и медианную задержку запросов.
+
+Запуск: python -m benchmarks.bench_search [размеры...]
+"""
+import statistics
+import sys
+import time
+
+from src.main import Category, Smartphone, set_creation_sink
+from src.search import _Bitmap, _normalize
+
+BRANDS = ["Samsung", "Xiaomi", "Apple", "Honor", "Realme", "Tecno", "Poco", "Nothing"]
+SERIES = ["Galaxy", "Redmi", "iPhone", "Magic", "Narzo", "Spark", "Phone", "Ultra", "Note", "Pro"]
+COLORS = ["Черный", "Белый", "Синий", "Зеленый", "Серебристый", "Фиолетовый"]
+MEMORY = ["64GB", "128GB", "256GB", "512GB", "1TB"]
+FEATURES = ["камера 200MP", "камера 50MP", "быстрая зарядка", "защита от воды", "AMOLED экран",
+            "два SIM", "NFC", "стилус", "ёмкий аккумулятор", "беспроводная зарядка"]
+
+QUERIES = ['256GB', 'Синий', '200MP камера', 'samsung galaxy 256gb синий', 'Galaxy S1234', 'смарт*',
+           'iph* 1tb', 'нет такого слова']
+
+
+def build_category(size):
+    category = Category("Бенчмарк", "Категория для замеров", [])
+    category.extend_records(
+        [(f"{BRANDS[i % 8]} {SERIES[i % 10]} S{i % 20_000} {MEMORY[i % 5]} {COLORS[i % 6]}",
+          f"Смартфон {BRANDS[i % 8]}: {FEATURES[i % 10]}, {FEATURES[i % 7]}, цвет {COLORS[i % 6].lower()}",
+          100.0 + i % 997, 1 + i % 50, "Высокая", f"S{i % 20_000}", MEMORY[i % 5], COLORS[i % 6])
+         for i in range(size)], product_class=Smartphone)
+    return category
+
+
+def scan(category, text):
+    """Перебор без индекса: все слова запроса ищутся подстрокой в названии и описании."""
+    words = _normalize(text).split()
+    return [product for product in category.query()
+            if all(word in _normalize(product.name) or word in _normalize(product.description) for word in words)]
+
+
+def index_bytes(category):
+    index = category._Category__text_index
+    total = sys.getsizeof(index._vocabulary or [])
+    for postings in index._postings:
+        total += sys.getsizeof(postings)
+        for word, posting in postings.items():
+            total += sys.getsizeof(word)
+            if type(posting) is _Bitmap:
+                total += sys.getsizeof(posting) + sys.getsizeof(posting.data) + sys.getsizeof(posting.bits)
+            else:
+                total += sys.getsizeof(posting)
+    return total
+
+
+def latency(func, repeat=50):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main(sizes):
+    set_creation_sink(None)
+    for size in sizes:
+        category = build_category(size)
+        start = time.perf_counter()
+        category.search('')
+        built = time.perf_counter() - start
+        # Битовые карты частых слов переводятся в int при первом запросе
+        for text in QUERIES:
+            category.search(text)
+        memory = index_bytes(category)
+        print(f"{size} товаров: индекс построен за {built:.2f} с, память {memory / 2 ** 20:.1f} МиБ "
+              f"({memory / size:.0f} Б на товар)")
+        print(f"{'запрос':<28} {'найдено':>8} {'search, мс':>11} {'перебор, мс':>12}")
+        for text in QUERIES:
+            found = len(category.search(text, limit=None))
+            indexed = latency(lambda: category.search(text))
+            scanned = latency(lambda: scan(category, text), repeat=1) if size <= 100_000 else float('nan')
+            print(f"{text:<28} {found:>8} {indexed * 1000:>11.3f} {scanned * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,78 @@
+"""Память и время старта обработчиков: своя копия категории против подключения к разделяемой памяти.
+
+Каждый обработчик запускается в отдельном процессе и сообщает время
+получения категории и память, выделенную им при этом (tracemalloc; страницы
+разделяемого сегмента сюда не входят, потому что общие для всех процессов).
+Товары — Product: дополнительные поля наследников хранятся в метаданных
+снимка и разбираются в каждом процессе.
+
+Запуск: python -m benchmarks.bench_shared [товаров] [обработчиков]
+"""
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+
+from src.main import Category, set_creation_sink
+from src.shared_catalog import CatalogPublisher, CatalogReader
+
+
+def make_records(size):
+    return [(f"Телефон {i}", f"Описание {i % 1000}", 100.0 + i % 997, 1 + i % 50) for i in range(size)]
+
+
+def build(size):
+    category = Category("Каталог", "Бенчмарк", [])
+    category.extend_records(make_records(size))
+    return category
+
+
+def worker(mode, size, name, results):
+    set_creation_sink(None)
+    start = time.perf_counter()
+    if mode == 'копия':
+        category = build(size)
+    else:
+        category = CatalogReader(name).category
+    elapsed = time.perf_counter() - start
+    # Память замеряется отдельным повтором: под tracemalloc всё работает в разы медленнее
+    tracemalloc.start()
+    copy = build(size) if mode == 'копия' else CatalogReader(name).category
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del copy
+    results.put((mode, elapsed, memory, category.total_value))
+
+
+def main(size, workers):
+    set_creation_sink(None)
+    name = f"bench_{os.getpid()}"
+    category = build(size)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    with CatalogPublisher(name) as publisher:
+        start = time.perf_counter()
+        publisher.publish(category)
+        published = time.perf_counter() - start
+        print(f"товаров: {size}, обработчиков: {workers}, публикация поколения: {published:.3f} с")
+        print(f"{'режим':<12} {'старт, с':>9} {'память на обработчик, МиБ':>27}")
+        for mode in ('копия', 'разделяемая'):
+            processes = [context.Process(target=worker, args=(mode, size, name, results)) for _ in range(workers)]
+            for process in processes:
+                process.start()
+            rows = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            assert all(row[3] == category.total_value for row in rows)
+            elapsed = max(row[1] for row in rows)
+            memory = max(row[2] for row in rows) / 2 ** 20
+            print(f"{mode:<12} {elapsed:>9.3f} {memory:>27.1f}")
+        start = time.perf_counter()
+        publisher.publish(category)
+        print(f"повторная публикация (смена поколения): {time.perf_counter() - start:.3f} с")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(args[0] if args else 1_000_000, args[1] if len(args) > 1 else 2)
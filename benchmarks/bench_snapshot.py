@@ -0,0 +1,43 @@
+"""Холодный старт: загрузка снимка против повторного построения категории.
+
+Запуск: python -m benchmarks.bench_snapshot [товаров]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from src.main import Category, Product, set_creation_sink
+
+
+def make_records(size):
+    return [{'name': f"Товар {i}", 'description': f"Описание {i % 1000}",
+             'price': 100.0 + i % 997, 'quantity': 1 + i % 50} for i in range(size)]
+
+
+def main(size):
+    records = make_records(size)
+    previous = set_creation_sink(None)
+    try:
+        start = time.perf_counter()
+        category = Category("Каталог", "new_product", [Product.new_product(record) for record in records])
+        rebuild = time.perf_counter() - start
+    finally:
+        set_creation_sink(previous)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalog.snap")
+        start = time.perf_counter()
+        category.save(path)
+        save = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = Category.load(path)
+        load = time.perf_counter() - start
+        assert loaded.total_value == category.total_value
+        print(f"товаров: {size}, размер снимка: {os.path.getsize(path) / 2 ** 20:.1f} МБ")
+    print(f"построение через new_product: {rebuild:.3f} с")
+    print(f"сохранение снимка:            {save:.3f} с")
+    print(f"загрузка снимка:              {load:.3f} с ({rebuild / load:.0f}x быстрее)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,70 @@
+"""Создание товаров из строк фида с кэшем цен и строк и без него (время и память tracemalloc).
+
+Строки собираются заново для каждой записи, как после разбора CSV, поэтому
+без кэша одинаковые описания не совпадают по ссылке.
+
+Запуск: python -m benchmarks.bench_value_cache [товаров]
+"""
+import sys
+import time
+import tracemalloc
+
+from src.main import Product, price_cache, set_creation_sink, text_cache
+
+DESCRIPTIONS = ["Описание товара из каталога поставщика, партия " + str(i) for i in range(50)]
+
+
+def make_rows(size):
+    return [(f"Товар {i % 1000}", "".join(DESCRIPTIONS[i % 50]), str(100 + i % 997) + ".50", 1 + i % 50)
+            for i in range(size)]
+
+
+def ingest(rows):
+    start = time.perf_counter()
+    products = [Product(*row) for row in rows]
+    return time.perf_counter() - start
+
+
+def bytes_retained(size):
+    """Память, удерживаемая товарами после освобождения записей фида, в пересчёте на товар."""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    rows = make_rows(size)
+    products = [Product(*row) for row in rows]
+    del rows
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del products
+    return (after - before) / size
+
+
+def measure(size, price_size, text_size):
+    price_cache.resize(price_size)
+    text_cache.resize(text_size)
+    price_cache.clear()
+    text_cache.clear()
+    seconds = min(ingest(make_rows(size)) for _ in range(3))
+    price_cache.clear()
+    text_cache.clear()
+    return seconds, bytes_retained(size)
+
+
+def main(size):
+    previous = set_creation_sink(None)
+    sizes = price_cache.maxsize, text_cache.maxsize
+    try:
+        off_time, off_memory = measure(size, 0, 0)
+        on_time, on_memory = measure(size, *sizes)
+        print(f"{'кэш':<6} {'время, с':>9} {'память, Б/товар':>16}")
+        print(f"{'нет':<6} {off_time:>9.3f} {off_memory:>16.0f}")
+        print(f"{'да':<6} {on_time:>9.3f} {on_memory:>16.0f}")
+        print(f"цены: {price_cache.stats()}")
+        print(f"строки: {text_cache.stats()}")
+    finally:
+        price_cache.resize(sizes[0])
+        text_cache.resize(sizes[1])
+        set_creation_sink(previous)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,269 @@
+"""Набор микро- и макро-бенчмарков модели товаров с сохранённым эталоном.
+
+Каждый сценарий запускается на нескольких размерах каталога в отдельном
+процессе, чтобы замеры не зависели от порядка. Для сравнения с эталоном
+используется отношение времени сценария ко времени калибровочного цикла,
+выполненного непосредственно перед ним, поэтому эталон, снятый на одной
+машине, можно сравнивать с запуском на другой.
+
+Запуск:
+    python -m benchmarks.suite                       # сравнить с benchmarks/baseline.json
+    python -m benchmarks.suite --output result.json  # сохранить результаты в JSON
+    python -m benchmarks.suite --update-baseline     # перезаписать эталон
+
+Код возврата 1, если хотя бы один сценарий медленнее эталона больше чем на --tolerance.
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from src.main import Category, Product, StdoutCreationSink, set_creation_sink
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+SIZES = (1_000, 10_000)
+
+
+def make_products(size):
+    return [Product(f"Товар {i}", "Описание", 100.0 + i % 997, 1 + i % 50) for i in range(size)]
+
+
+def make_category(size):
+    return Category("Бенчмарк", "Категория для замеров", make_products(size))
+
+
+def bench_construct_logged(size):
+    previous = set_creation_sink(StdoutCreationSink())
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            make_products(size)
+    return run, None, lambda: set_creation_sink(previous)
+
+
+def bench_construct_silent(size):
+    return lambda: make_products(size), None, None
+
+
+def bench_new_product(size):
+    records = [{'name': f"Товар {i}", 'description': "Описание", 'price': 100.0 + i % 997,
+                'quantity': 1 + i % 50} for i in range(size)]
+    return lambda: [Product.new_product(record) for record in records], None, None
+
+
+def bench_add_product(size):
+    products = make_products(size)
+
+    def run():
+        category = Category("Бенчмарк", "add_product", [])
+        for product in products:
+            category.add_product(product)
+    return run, None, None
+
+
+def bench_remove_product(size):
+    products = make_products(size)
+    categories = []
+
+    def run():
+        category = categories.pop()
+        for product in products:
+            category.remove_product(product)
+    # Заполненная категория готовится перед каждым повтором
+    return run, lambda: categories.append(Category("Бенчмарк", "remove_product", products)), None
+
+
+def bench_average_price(size):
+    category = make_category(size)
+
+    def run():
+        for _ in range(10_000):
+            category.average_price()
+    return run, None, None
+
+
+def bench_render_cold(size):
+    categories = []
+    return lambda: str(categories.pop()), lambda: categories.append(make_category(size)), None
+
+
+def bench_render_warm(size):
+    category = make_category(size)
+    str(category)
+    return lambda: str(category), None, None
+
+
+def bench_add_pairwise(size):
+    products = make_products(size)
+    pairs = list(zip(products[::2], products[1::2]))
+
+    def run():
+        total = 0.0
+        for first, second in pairs:
+            total += first + second
+    return run, None, None
+
+
+# Имя сценария -> функция подготовки; она возвращает (run, prepare, teardown):
+# prepare вызывается перед каждым замером, teardown — один раз в конце
+CASES = {
+    'construct_logged': bench_construct_logged,
+    'construct_silent': bench_construct_silent,
+    'new_product': bench_new_product,
+    'add_product': bench_add_product,
+    'remove_product': bench_remove_product,
+    'average_price_x10000': bench_average_price,
+    'render_cold': bench_render_cold,
+    'render_warm': bench_render_warm,
+    'add_pairwise': bench_add_pairwise,
+}
+
+
+def _calibration_loop():
+    """Фиксированный цикл на чистом Python — единица измерения для сравнения машин."""
+    total = 0
+    for i in range(50_000):
+        total += i % 7
+    return total
+
+
+def measure(func):
+    # Как timeit: сборщик мусора не должен срабатывать посреди замера
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def run_case(name, size, repeat, min_time=0.5):
+    """Замеряет сценарий name на каталоге из size товаров.
+
+    Перед каждым замером выполняется калибровочный цикл; отношение времени
+    сценария к нему меньше зависит от соседней нагрузки на машину, чем
+    абсолютное время. Быстрые сценарии повторяются больше repeat раз, пока
+    суммарное время замеров не достигнет min_time секунд (но не больше 200
+    повторов). Возвращает лучшее время и медиану отношений.
+    """
+    run, prepare, teardown = CASES[name](size)
+    samples = []
+    ratios = []
+    try:
+        while len(samples) < repeat or (sum(samples) < min_time and len(samples) < 200):
+            if prepare is not None:
+                prepare()
+            calibration = min(measure(_calibration_loop) for _ in range(3))
+            elapsed = measure(run)
+            samples.append(elapsed)
+            ratios.append(elapsed / calibration)
+    finally:
+        if teardown is not None:
+            teardown()
+    return min(samples), statistics.median(ratios)
+
+
+def _worker(name, size, repeat, min_time=0.5):
+    """Замер одного сценария в текущем процессе."""
+    set_creation_sink(None)
+    seconds, relative = run_case(name, size, repeat, min_time)
+    return {'case': name, 'size': size, 'seconds': seconds, 'relative': relative}
+
+
+def run_suite(sizes=SIZES, repeat=5, cases=None):
+    """Прогоняет сценарии, каждый в своём процессе, и возвращает результаты в виде словаря для JSON."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    for name in cases or CASES:
+        for size in sizes:
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.suite', '--worker', name, str(size), str(repeat)],
+                capture_output=True, text=True, check=True, cwd=root,
+            ).stdout
+            results.append(json.loads(output))
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def _relative_times(results):
+    return {(row['case'], row['size']): row['relative'] for row in results['results']}
+
+
+def compare(current, baseline, tolerance=0.35):
+    """Сравнивает относительные времена с эталоном.
+
+    Возвращает список регрессий (сценарий, размер, эталон, текущее, изменение)
+    для сценариев, ставших медленнее больше чем на tolerance.
+    """
+    expected = _relative_times(baseline)
+    regressions = []
+    for row in current['results']:
+        before = expected.get((row['case'], row['size']))
+        if before is None:
+            continue
+        change = row['relative'] / before - 1
+        if change > tolerance:
+            regressions.append((row['case'], row['size'], before, row['relative'], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки модели товаров")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES))
+    parser.add_argument('--output', help="куда сохранить результаты в JSON")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.35,
+                        help="допустимое замедление относительно эталона (0.35 = 35%%)")
+    parser.add_argument('--update-baseline', action='store_true', help="перезаписать эталон результатами")
+    parser.add_argument('--worker', nargs=3, metavar=('CASE', 'SIZE', 'REPEAT'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        name, size, repeat = args.worker
+        print(json.dumps(_worker(name, int(size), int(repeat))))
+        return 0
+
+    current = run_suite(args.sizes, args.repeat, args.cases)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(current, file, ensure_ascii=False, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(current, file, ensure_ascii=False, indent=2)
+        print(f"Эталон сохранён в {args.baseline}")
+        return 0
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+    expected = _relative_times(baseline) if baseline else {}
+    print(f"{'сценарий':<20} {'размер':>8} {'время, мс':>10} {'эталон':>9}")
+    for row in current['results']:
+        before = expected.get((row['case'], row['size']))
+        change = f"{row['relative'] / before - 1:+.0%}" if before else '—'
+        print(f"{row['case']:<20} {row['size']:>8} {row['seconds'] * 1000:>10.2f} {change:>9}")
+    if baseline is None:
+        print(f"Эталон {args.baseline} не найден; сохраните его флагом --update-baseline")
+        return 0
+    regressions = compare(current, baseline, args.tolerance)
+    for case, size, before, after, change in regressions:
+        print(f"РЕГРЕССИЯ: {case} на {size} товаров медленнее эталона на {change:.0%}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Асинхронный фасад над Category для сервисов на asyncio.
+
+Изменения, пришедшие в одном такте цикла событий, применяются к
+категории одним проходом. Проверка больших пачек и чтение фидов
+выполняются в пуле потоков, а в цикл событий возвращаются только готовые
+колоночные таблицы, поэтому загрузка не останавливает обработку запросов.
+
+Логирование создания товаров (CreateLogMixin) по умолчанию пишет в консоль
+синхронно; в асинхронном сервисе стоит установить QueueCreationSink или
+отключить его через set_creation_sink(None).
+"""
+import asyncio
+import itertools
+import operator
+
+from src.importer import ImportReport, _build_chunk
+from src.main import Category, Product
+
+
+class AsyncCatalog:
+    """Корутины добавления, удаления, поиска и статистики поверх одной категории.
+
+    Все обращения к категории выполняются в потоке цикла событий, поэтому
+    блокировки категории не нужны.
+    """
+
+    def __init__(self, category: Category, executor=None):
+        self.category = category
+        # Пул для проверки пачек; None — пул цикла событий по умолчанию
+        self.executor = executor
+        # Ожидающие изменения: ('add' или 'remove', товар, future)
+        self._pending = []
+        self._flush_handle = None
+
+    def _submit(self, operation, product):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((operation, product, future))
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_soon(self._flush)
+        return future
+
+    def _flush(self):
+        """Применяет все изменения, накопленные за такт цикла событий.
+
+        Подряд идущие добавления применяются одной пачкой через
+        Category.extend, удаления — по одному; порядок изменений сохраняется.
+        Ошибка одного изменения получает только его вызывающий.
+        """
+        pending, self._pending = self._pending, []
+        self._flush_handle = None
+        pending = [item for item in pending if not item[2].cancelled()]
+        with self.category.locked():
+            for operation, group in itertools.groupby(pending, key=operator.itemgetter(0)):
+                group = list(group)
+                if operation == 'add':
+                    errors = []
+                    try:
+                        self.category.extend([product for _, product, _ in group], errors=errors)
+                    except Exception as e:
+                        errors = [(position, e) for position in range(len(group))]
+                    failed = dict(errors)
+                    for position, (_, _, future) in enumerate(group):
+                        if position in failed:
+                            future.set_exception(failed[position])
+                        else:
+                            future.set_result(None)
+                    continue
+                for _, product, future in group:
+                    try:
+                        self.category.remove_product(product)
+                    except Exception as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(None)
+
+    def _apply_pending(self):
+        """Применяет ещё не выполненные изменения перед чтением."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush()
+
+    async def add(self, product):
+        """Добавляет товар в категорию вместе с другими изменениями текущего такта."""
+        await self._submit('add', product)
+
+    async def remove(self, product):
+        """Удаляет товар из категории вместе с другими изменениями текущего такта."""
+        await self._submit('remove', product)
+
+    async def query(self, **conditions) -> list:
+        """Ищет товары как Category.query."""
+        self._apply_pending()
+        return self.category.query(**conditions)
+
+    async def get(self, product_id: int):
+        """Возвращает товар по идентификатору."""
+        self._apply_pending()
+        return self.category.get_product(product_id)
+
+    async def totals(self):
+        """Возвращает согласованный снимок накопленной статистики (O(1))."""
+        self._apply_pending()
+        return self.category.totals()
+
+    async def stats(self, n: int = 4):
+        """Считает полную статистику категории (как Category.stats)."""
+        self._apply_pending()
+        return self.category.stats(n)
+
+    async def import_records(self, records, product_class=Product, errors: list | None = None) -> int:
+        """Проверяет записи в пуле потоков и добавляет их в категорию одной пачкой.
+
+        Параметры и результат — как у Category.extend_records.
+        """
+        loop = asyncio.get_running_loop()
+        table = await loop.run_in_executor(
+            self.executor, lambda: product_class.from_records(records, errors=errors))
+        self._apply_pending()
+        self.category.extend(table)
+        return len(table)
+
+    async def import_feed(self, rows, type_column: str = 'type', chunk_size: int = 10_000,
+                          on_error=None) -> ImportReport:
+        """Загружает поток строк фида (см. src/importer.py), не блокируя цикл событий.
+
+        Чтение и проверка пачек выполняются в пуле потоков, следующая пачка
+        готовится, пока текущая добавляется в категорию.
+        """
+        loop = asyncio.get_running_loop()
+        report = ImportReport()
+        numbered = enumerate(rows, start=1)
+
+        def next_chunk():
+            chunk = list(itertools.islice(numbered, chunk_size))
+            return len(chunk), _build_chunk(chunk, type_column)
+
+        upcoming = loop.run_in_executor(self.executor, next_chunk)
+        try:
+            while True:
+                size, (table, errors) = await upcoming
+                if not size:
+                    return report
+                upcoming = loop.run_in_executor(self.executor, next_chunk)
+                self._apply_pending()
+                self.category.extend(table)
+                report.rows += size
+                report.imported += len(table)
+                report.failed += len(errors)
+                for number, message in errors:
+                    if on_error is None:
+                        report.errors.append((number, message))
+                    else:
+                        on_error(number, message)
+        finally:
+            # Если загрузка прервана, уже начатая пачка дожидается завершения: поток пула
+            # не читает rows после возврата, а её ошибка не остаётся необработанной
+            if not upcoming.done():
+                await asyncio.wait([upcoming])
+            if not upcoming.cancelled():
+                upcoming.exception()
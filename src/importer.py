@@ -0,0 +1,264 @@
+import collections
+import csv
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from src.main import Category, LawnGrass, Product, ProductTable, ReconcileReport, Smartphone
+from src.money import get_price_mode, set_price_mode
+
+# Значения колонки типа и соответствующие им классы товаров
+PRODUCT_TYPES = {
+    'product': Product,
+    'smartphone': Smartphone,
+    'lawngrass': LawnGrass,
+    'lawn_grass': LawnGrass,
+}
+
+# Поля, которые в текстовых фидах приходят строками, но хранятся числами
+_INT_FIELDS = ('quantity', 'germination_period')
+
+
+@dataclass
+class ImportReport:
+    """Итог загрузки фида."""
+
+    rows: int = 0
+    imported: int = 0
+    failed: int = 0
+    # Ошибки (номер строки, сообщение), если не передан обработчик on_error
+    errors: list = field(default_factory=list)
+
+
+def _open(source, newline=None):
+    """Открывает путь на чтение; открытые файлы возвращает как есть."""
+    if hasattr(source, 'read'):
+        return source, False
+    return open(source, encoding='utf-8', newline=newline), True
+
+
+def read_csv(source):
+    """Построчно читает CSV с заголовком и выдаёт строки-словари."""
+    file, owned = _open(source, newline='')
+    try:
+        yield from csv.DictReader(file)
+    finally:
+        if owned:
+            file.close()
+
+
+def read_jsonl(source):
+    """Построчно читает JSON Lines; некорректная строка выдаётся как исключение ValueError."""
+    file, owned = _open(source)
+    try:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield ValueError(f"Некорректный JSON: {e}")
+                continue
+            if isinstance(row, dict):
+                yield row
+            else:
+                yield ValueError(f"Строка должна быть JSON-объектом, получен {type(row).__name__}")
+    finally:
+        if owned:
+            file.close()
+
+
+# Класс товара -> его поля из _INT_FIELDS
+_class_int_fields = {}
+
+# Ошибки разбора одной строки: строка отклоняется, загрузка продолжается
+_ROW_ERRORS = (ValueError, TypeError, AttributeError)
+
+
+def _prepare(row, type_column):
+    """Определяет класс товара по колонке типа и приводит числовые поля."""
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError(f"Строка должна быть словарём, получен {type(row).__name__}")
+    kind = row.pop(type_column, None)
+    # Обычно тип уже записан так же, как в PRODUCT_TYPES, и нормализовать его не нужно
+    cls = PRODUCT_TYPES.get(kind) if type(kind) is str else None
+    if cls is None:
+        if kind is not None and not isinstance(kind, str):
+            raise ValueError(f"Неизвестный тип товара: '{kind}'")
+        kind = (kind or 'product').strip().lower()
+        cls = PRODUCT_TYPES.get(kind)
+        if cls is None:
+            raise ValueError(f"Неизвестный тип товара: '{kind}'")
+    int_fields = _class_int_fields.get(cls)
+    if int_fields is None:
+        int_fields = _class_int_fields[cls] = tuple(
+            name for name in _INT_FIELDS if name == 'quantity' or name in cls._extra_fields)
+    for name in int_fields:
+        value = row.get(name)
+        if isinstance(value, str):
+            try:
+                row[name] = int(value)
+            except ValueError:
+                raise ValueError(f"Поле {name} должно быть целым числом: '{value}'") from None
+    return cls, row
+
+
+def import_feed(rows, category: Category, type_column: str = 'type', chunk_size: int = 10_000,
+                on_progress=None, on_error=None) -> ImportReport:
+    """Загружает поток строк в категорию пачками по chunk_size.
+
+    Память ограничена размером пачки: строки читаются из генератора rows
+    и сразу передаются в Category.extend_records. Ошибочные строки не
+    прерывают загрузку: они передаются в on_error(номер строки, сообщение)
+    или копятся в ImportReport.errors. После каждой пачки вызывается
+    on_progress(report).
+    """
+    report = ImportReport()
+    numbered = enumerate(rows, start=1)
+    while True:
+        chunk = list(itertools.islice(numbered, chunk_size))
+        if not chunk:
+            return report
+        errors = []
+        prepared = []
+        for number, row in chunk:
+            try:
+                prepared.append((number, *_prepare(row, type_column)))
+            except _ROW_ERRORS as e:
+                errors.append((number, str(e)))
+        # Подряд идущие строки одного класса добавляем одной пачкой, сохраняя порядок
+        for cls, group in itertools.groupby(prepared, key=lambda item: item[1]):
+            group = list(group)
+            group_errors = []
+            report.imported += category.extend_records(
+                [record for _, _, record in group], product_class=cls, errors=group_errors)
+            errors.extend((group[index][0], message) for index, message in group_errors)
+        report.rows += len(chunk)
+        report.failed += len(errors)
+        for number, message in sorted(errors):
+            if on_error is None:
+                report.errors.append((number, message))
+            else:
+                on_error(number, message)
+        if on_progress is not None:
+            on_progress(report)
+
+
+def reconcile_feed(rows, category: Category, key='name', type_column: str = 'type',
+                   delete_missing: bool = True, on_error=None) -> ReconcileReport:
+    """Сверяет полный фид поставщика с категорией и применяет только изменения.
+
+    В отличие от import_feed, фид читается целиком: товары, которых в нём
+    нет, удаляются (если delete_missing), а совпавшие по ключу key меняются
+    только при отличиях (см. Category.reconcile). Товары, строки которых не
+    удалось разобрать, не удаляются. Ошибки (номер строки, сообщение)
+    передаются в on_error или возвращаются в ReconcileReport.rejected.
+    """
+    fields = (key,) if isinstance(key, str) else tuple(key)
+    classes = []
+    records = []
+    numbers = []
+    errors = []
+    keep = []
+    for number, row in enumerate(rows, start=1):
+        try:
+            cls, record = _prepare(row, type_column)
+        except _ROW_ERRORS as e:
+            errors.append((number, str(e)))
+            if isinstance(row, dict):
+                keep.append(row.get(key) if isinstance(key, str) else tuple(map(row.get, fields)))
+            continue
+        classes.append(cls)
+        records.append(record)
+        numbers.append(number)
+    report = category.reconcile(records, classes, key=key, delete_missing=delete_missing, keep=keep)
+    errors.extend((numbers[position], message) for position, message in report.rejected)
+    errors.sort()
+    if on_error is not None:
+        for number, message in errors:
+            on_error(number, message)
+        errors = []
+    return report._replace(rejected=errors)
+
+
+def _build_chunk(chunk, type_column):
+    """Проверяет пачку пронумерованных строк и собирает из неё ProductTable.
+
+    Выполняется в рабочем процессе или потоке; возвращает таблицу и ошибки.
+    """
+    errors = []
+    prepared = []
+    for number, row in chunk:
+        try:
+            prepared.append((number, *_prepare(row, type_column)))
+        except _ROW_ERRORS as e:
+            errors.append((number, str(e)))
+    table = ProductTable()
+    for cls, group in itertools.groupby(prepared, key=lambda item: item[1]):
+        group = list(group)
+        group_errors = []
+        table.extend(cls.from_records([record for _, _, record in group], errors=group_errors))
+        errors.extend((group[index][0], message) for index, message in group_errors)
+    errors.sort()
+    return table, errors
+
+
+def parallel_import(rows, category: Category, workers: int | None = None, executor: str = 'process',
+                    type_column: str = 'type', chunk_size: int = 50_000,
+                    on_progress=None, on_error=None) -> ImportReport:
+    """Загружает строки в категорию, проверяя пачки параллельно.
+
+    executor='process' распределяет пачки по пулу процессов (для разбора и
+    проверки), executor='thread' — по пулу потоков (когда узкое место —
+    чтение источника). Готовые колоночные пачки добавляются в категорию
+    строго в порядке исходных строк. Одновременно в работе не больше
+    2 * workers пачек, поэтому память ограничена размером пачки.
+    Рабочие процессы проверяют цены в текущем режиме цен (set_price_mode).
+    """
+    workers = workers or os.cpu_count() or 1
+    pool_class = {'process': ProcessPoolExecutor, 'thread': ThreadPoolExecutor}[executor]
+    pool_options = {'max_workers': workers}
+    if executor == 'process':
+        # Процессы, запущенные через spawn или forkserver, не наследуют режим цен
+        pool_options.update(initializer=set_price_mode, initargs=(get_price_mode(),))
+    report = ImportReport()
+    numbered = enumerate(rows, start=1)
+    chunks = iter(lambda: list(itertools.islice(numbered, chunk_size)), [])
+
+    def merge(size, future):
+        table, errors = future.result()
+        category.extend(table)
+        report.rows += size
+        report.imported += len(table)
+        report.failed += len(errors)
+        for number, message in errors:
+            if on_error is None:
+                report.errors.append((number, message))
+            else:
+                on_error(number, message)
+        if on_progress is not None:
+            on_progress(report)
+
+    with pool_class(**pool_options) as pool:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append((len(chunk), pool.submit(_build_chunk, chunk, type_column)))
+            if len(pending) >= 2 * workers:
+                merge(*pending.popleft())
+        while pending:
+            merge(*pending.popleft())
+    return report
+
+
+def import_csv(source, category: Category, **kwargs) -> ImportReport:
+    """Загружает CSV-фид в категорию (параметры как у import_feed)."""
+    return import_feed(read_csv(source), category, **kwargs)
+
+
+def import_jsonl(source, category: Category, **kwargs) -> ImportReport:
+    """Загружает фид JSON Lines в категорию (параметры как у import_feed)."""
+    return import_feed(read_jsonl(source), category, **kwargs)
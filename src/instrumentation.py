@@ -0,0 +1,191 @@
+"""Инструментирование горячих операций каталога.
+
+enable() подменяет методы Product и Category обёртками, которые считают
+вызовы, суммарное время, квантили времени и прирост числа выделенных
+блоков памяти; disable() возвращает исходные методы. Пока
+инструментирование выключено, обёрток нет и накладные расходы нулевые.
+
+    from src import instrumentation
+    instrumentation.enable()
+    ...
+    print(instrumentation.to_prometheus())
+    instrumentation.disable()
+
+profile() — контекстный менеджер, который выполняет блок под cProfile и
+печатает самые затратные функции.
+"""
+import collections
+import contextlib
+import json
+import sys
+import time
+
+from src.main import Category, _ProductBase
+
+# Сколько последних замеров каждой операции хранить для квантилей
+SAMPLE_LIMIT = 4096
+QUANTILES = (0.5, 0.9, 0.99)
+
+# (класс, атрибут, название операции в отчётах)
+TARGETS = (
+    (_ProductBase, '__init__', 'Product.__init__'),
+    (_ProductBase, 'new_product', 'Product.new_product'),
+    (_ProductBase, 'from_records', 'Product.from_records'),
+    (Category, 'add_product', 'Category.add_product'),
+    (Category, 'remove_product', 'Category.remove_product'),
+    (Category, 'extend', 'Category.extend'),
+    (Category, 'extend_records', 'Category.extend_records'),
+    (Category, 'average_price', 'Category.average_price'),
+    (Category, 'quantity_sum', 'Category.quantity_sum'),
+    (Category, 'price_sum', 'Category.price_sum'),
+    (Category, 'total_value', 'Category.total_value'),
+    (Category, 'totals', 'Category.totals'),
+    (Category, 'stats', 'Category.stats'),
+    (Category, 'stock_value', 'Category.stock_value'),
+    (Category, 'query', 'Category.query'),
+    (Category, 'search', 'Category.search'),
+    (Category, 'reprice', 'Category.reprice'),
+    (Category, 'reconcile', 'Category.reconcile'),
+    (Category, 'products', 'Category.products'),
+    (Category, 'products_page', 'Category.products_page'),
+    # без блокировки время отражает только создание ленивого итератора
+    (Category, 'iter_products', 'Category.iter_products'),
+    (Category, '__str__', 'Category.__str__'),
+)
+
+
+class _OperationStats:
+    """Накопленные замеры одной операции."""
+
+    __slots__ = ('calls', 'seconds', 'allocated_blocks', 'samples')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.allocated_blocks = 0
+        self.samples = collections.deque(maxlen=SAMPLE_LIMIT)
+
+    def record(self, elapsed, blocks):
+        self.calls += 1
+        self.seconds += elapsed
+        # счётчик Prometheus не убывает: освобождённые за вызов блоки не вычитаем
+        self.allocated_blocks += max(blocks, 0)
+        self.samples.append(elapsed)
+
+    def summary(self):
+        samples = sorted(self.samples)
+        quantiles = {str(q): samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+                     for q in QUANTILES}
+        return {
+            'calls': self.calls,
+            'seconds': self.seconds,
+            'mean': self.seconds / self.calls if self.calls else 0.0,
+            'max': samples[-1] if samples else 0.0,
+            'quantiles': quantiles,
+            'allocated_blocks': self.allocated_blocks,
+        }
+
+
+_stats = collections.defaultdict(_OperationStats)
+# (класс, атрибут) -> исходное значение атрибута, пока инструментирование включено
+_originals = {}
+
+
+def _timed(function, label):
+    stats = _stats[label]
+    clock = time.perf_counter
+    blocks = sys.getallocatedblocks
+
+    def wrapper(*args, **kwargs):
+        before = blocks()
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stats.record(clock() - start, blocks() - before)
+    wrapper.__name__ = function.__name__
+    wrapper.__qualname__ = function.__qualname__
+    wrapper.__doc__ = function.__doc__
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def _instrumented(attribute, label):
+    """Возвращает обёртку для метода, classmethod или свойства."""
+    if isinstance(attribute, property):
+        return property(_timed(attribute.fget, label), attribute.fset, attribute.fdel, attribute.__doc__)
+    if isinstance(attribute, classmethod):
+        return classmethod(_timed(attribute.__func__, label))
+    return _timed(attribute, label)
+
+
+def enable(targets=TARGETS):
+    """Подменяет методы из targets обёртками, собирающими статистику."""
+    for cls, name, label in targets:
+        if (cls, name) in _originals:
+            continue
+        original = cls.__dict__[name]
+        _originals[cls, name] = original
+        setattr(cls, name, _instrumented(original, label))
+
+
+def disable():
+    """Возвращает исходные методы; собранная статистика сохраняется до reset()."""
+    while _originals:
+        (cls, name), original = _originals.popitem()
+        setattr(cls, name, original)
+
+
+def is_enabled() -> bool:
+    return bool(_originals)
+
+
+def reset():
+    """Очищает собранную статистику."""
+    for stats in _stats.values():
+        stats.__init__()
+
+
+def snapshot() -> dict:
+    """Возвращает статистику по операциям: вызовы, время, квантили и выделенные блоки памяти."""
+    return {label: stats.summary() for label, stats in sorted(_stats.items()) if stats.calls}
+
+
+def to_json(data: dict | None = None) -> str:
+    """Снимок статистики в JSON."""
+    return json.dumps(snapshot() if data is None else data, ensure_ascii=False, indent=2)
+
+
+def to_prometheus(data: dict | None = None, prefix: str = 'catalog_operation') -> str:
+    """Снимок статистики в текстовом формате Prometheus."""
+    data = snapshot() if data is None else data
+    lines = [
+        f"# HELP {prefix}_seconds Время выполнения операций каталога",
+        f"# TYPE {prefix}_seconds summary",
+    ]
+    for label, stats in data.items():
+        for quantile, value in stats['quantiles'].items():
+            lines.append(f'{prefix}_seconds{{operation="{label}",quantile="{quantile}"}} {value!r}')
+        lines.append(f'{prefix}_seconds_sum{{operation="{label}"}} {stats["seconds"]!r}')
+        lines.append(f'{prefix}_seconds_count{{operation="{label}"}} {stats["calls"]}')
+    lines += [
+        f"# HELP {prefix}_allocated_blocks Суммарный прирост числа выделенных блоков памяти за время операций",
+        f"# TYPE {prefix}_allocated_blocks counter",
+    ]
+    for label, stats in data.items():
+        lines.append(f'{prefix}_allocated_blocks{{operation="{label}"}} {stats["allocated_blocks"]}')
+    return "\n".join(lines) + "\n"
+
+
+@contextlib.contextmanager
+def profile(top: int = 20, sort: str = 'cumulative', stream=None):
+    """Выполняет блок под cProfile и печатает top самых затратных функций в stream (по умолчанию stdout)."""
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        pstats.Stats(profiler, stream=stream or sys.stdout).sort_stats(sort).print_stats(top)
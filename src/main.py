@@ -1,17 +1,302 @@
-from statistics import quantiles
-
-from sqlalchemy.sql.base import elements
+# Модуль импортирует только лёгкие модули стандартной библиотеки;
+# очереди, потоки, статистика, numpy и хранилища подключаются при первом использовании.
+# Блокировки берутся из встроенного _thread, который уже загружен интерпретатором.
+import _thread
 from abc import ABC, abstractmethod
+from array import array
+import bisect
+from collections import namedtuple
+import itertools
+import math
+import operator
+import sys
+import weakref
+
+from src.money import (  # noqa: F401  (переэкспорт)
+    _NOT_CACHED, CacheStats, LRUCache, _kopecks, get_price_mode, parse_kopecks, price_cache, set_price_mode,
+)
+from src import money as _money
+from src.search import _Bitmap, _TextIndex, _normalize  # noqa: F401  (переэкспорт)
+
+# Сквозной счётчик идентификаторов товаров
+_product_ids = itertools.count(1)
+# Живые объекты товаров по идентификатору (для повторного использования представлений)
+_live_products = weakref.WeakValueDictionary()
+# Полосы блокировок для атомарного резерва остатков: товар берёт полосу по своему идентификатору
+_STRIPES = 64
+_stripe_locks = [_thread.allocate_lock() for _ in range(_STRIPES)]
+
+
+def _checked_text(text):
+    """Возвращает непустую строку как есть или None для пустой."""
+    return text if text.strip() else None
+
+
+# Проверенные названия и описания товаров: одинаковые строки из фидов
+# после проверки заменяются одним общим экземпляром.
+text_cache = LRUCache(65536)
+
+
+class BulkValidationError(ValueError):
+    """Ошибка пакетной загрузки: содержит список (номер строки, сообщение) для всех плохих строк."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"Некорректных строк: {len(errors)}; первая: строка {errors[0][0]}: {errors[0][1]}")
+
+
+def _record_columns(records, extra_fields):
+    """Раскладывает записи (словари или кортежи) по колонкам.
+
+    Возвращает список колонок name, description, price, quantity, дополнительных
+    полей и номеров исходных строк, а также список строк с неверным числом полей.
+    """
+    records = records if isinstance(records, list) else list(records)
+    width = 4 + len(extra_fields)
+    bad_rows = []
+    if all(type(record) is dict for record in records):
+        columns = [
+            [record.get('name', '') for record in records],
+            [record.get('description', '') for record in records],
+            [record.get('price') for record in records],
+            [record.get('quantity') for record in records],
+        ]
+        columns.extend([record.get(field) for record in records] for field in extra_fields)
+        columns.append(range(len(records)))
+        return columns, bad_rows
+    rows = []
+    for index, record in enumerate(records):
+        if isinstance(record, dict):
+            record = (record.get('name', ''), record.get('description', ''), record.get('price'),
+                      record.get('quantity'), *(record.get(field) for field in extra_fields))
+        elif len(record) != width:
+            bad_rows.append((index, f"Ожидалось полей: {width}, получено: {len(record)}"))
+            continue
+        rows.append((*record, index))
+    columns = [list(column) for column in zip(*rows)] or [[] for _ in range(width + 1)]
+    return columns, bad_rows
+
+
+# Количество хранится в колонке int64
+_QUANTITY_LIMIT = 1 << 63
+
+
+def _checked_quantity(quantity):
+    """Приводит количество к int и проверяет, что оно помещается в колонку ProductTable."""
+    try:
+        quantity = operator.index(quantity)
+    except TypeError:
+        raise TypeError(f"Количество должно быть целым числом, получен {type(quantity).__name__}") from None
+    if not -_QUANTITY_LIMIT <= quantity < _QUANTITY_LIMIT:
+        raise ValueError("Количество слишком велико")
+    return quantity
+
+
+def _checked_value(price, quantity):
+    """Проверяет, что стоимость остатка price * quantity помещается в float (её копит статистика категории)."""
+    if not math.isfinite(price * quantity):
+        raise ValueError("Стоимость остатка слишком велика")
+
+
+def _validate_columns(names, descriptions, raw_prices, quantities):
+    """Проверяет колонки целиком; возвращает цены в виде float или None, если есть ошибки."""
+    if not names:
+        return []
+    try:
+        if not (all(map(str.strip, names)) and all(map(str.strip, descriptions))):
+            return None
+        prices = list(map(_money._parse_price, raw_prices))
+        if min(prices) <= 0 or not set(map(type, quantities)) <= {int} or min(quantities) <= 0:
+            return None
+        if max(quantities) >= _QUANTITY_LIMIT or not all(map(math.isfinite, prices)):
+            return None
+        if not all(map(math.isfinite, map(operator.mul, prices, quantities))):
+            return None
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return prices
+
+
+def _validate_fields(name, description, price_, quantity):
+    """Проверяет поля товара так же, как Product.__init__, и возвращает цену в виде float."""
+    if not isinstance(name, str):
+        raise TypeError(f"Имя товара должно быть строкой, получен {type(name).__name__}")
+    if not isinstance(description, str):
+        raise TypeError(f"Описание товара должно быть строкой, получен {type(description).__name__}")
+    if not name or not name.strip():
+        raise ValueError("Имя товара не может быть пустым")
+    if not description or not description.strip():
+        raise ValueError("Описание товара не может быть пустым")
+    if quantity == 0:
+        raise ValueError("Товар с нулевым количеством не может быть добавлен")
+    try:
+        price = _money._parse_price(price_)
+    except ValueError as e:
+        raise ValueError(f"Не удалось преобразовать строку в float: '{price_}'") from e
+    except OverflowError:
+        # float(10 ** 400): целое число за пределами float, как и float('1e400') == inf
+        price = math.inf
+    if not math.isfinite(price):
+        raise ValueError("Цена должна быть конечным числом")
+    if price <= 0:
+        raise ValueError("Цена должна быть положительной")
+    if quantity < 0:
+        raise ValueError("Количество не может быть отрицательным")
+    if quantity >= _QUANTITY_LIMIT:
+        raise ValueError("Количество слишком велико")
+    _checked_value(price, quantity)
+    return price
+
+
+def _validate_prices(raw_prices):
+    """Проверяет колонку новых цен целиком; возвращает array('d') или None, если есть ошибки."""
+    try:
+        prices = array('d', map(_money._parse_price, raw_prices))
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if prices and (not all(map(math.isfinite, prices)) or min(prices) <= 0):
+        return None
+    return prices
+
+
+def _validate_price(price_):
+    """Проверяет одну новую цену и возвращает её в виде float."""
+    try:
+        price = _money._parse_price(price_)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Не удалось преобразовать строку в float: '{price_}'") from e
+    except OverflowError:
+        price = math.inf
+    if not math.isfinite(price):
+        raise ValueError("Цена должна быть конечным числом")
+    if price <= 0:
+        raise ValueError("Цена должна быть положительной")
+    return price
+
+
+class StdoutCreationSink:
+    """Печатает сведения о создании объекта в stdout (исходное поведение миксина)."""
+
+    def emit(self, class_name, args, kwargs):
+        print(f"Создан объект класса: {class_name}")
+        print(f"Переданные аргументы: args={args}, kwargs={kwargs}")
+
+
+class SamplingCreationSink:
+    """Передаёт во вложенный приёмник только долю rate событий."""
+
+    def __init__(self, sink, rate: float, random_=None):
+        if not 0 <= rate <= 1:
+            raise ValueError("Доля выборки должна быть в диапазоне [0, 1]")
+        if random_ is None:
+            import random
+            random_ = random.random
+        self.sink = sink
+        self.rate = rate
+        self._random = random_
+
+    def emit(self, class_name, args, kwargs):
+        if self._random() < self.rate:
+            self.sink.emit(class_name, args, kwargs)
+
+
+class QueueCreationSink:
+    """Буферизует события в очереди и передаёт их пачками в фоновом потоке.
+
+    writer получает список записей вида {'class': ..., 'args': ..., 'kwargs': ...}.
+    Исключение writer не останавливает фоновый поток: оно передаётся в
+    on_error(исключение, записи) (по умолчанию печатается в stderr), а
+    пачка считается обработанной.
+    """
+
+    _STOP = object()
+
+    def __init__(self, writer, batch_size: int = 1000, on_error=None):
+        import queue
+        import threading
+        self.writer = writer
+        self.batch_size = batch_size
+        self.on_error = on_error
+        self.errors = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="creation-log", daemon=True)
+        self._thread.start()
+
+    def emit(self, class_name, args, kwargs):
+        self._queue.put({'class': class_name, 'args': args, 'kwargs': kwargs})
+
+    def _run(self):
+        import queue
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is self._STOP
+            records = batch[:-1] if stop else batch
+            try:
+                if records:
+                    self.writer(records)
+            except Exception as e:
+                self._report(e, records)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _report(self, error, records):
+        self.errors += 1
+        try:
+            if self.on_error is None:
+                print(f"Ошибка записи журнала создания ({len(records)} записей): {error!r}", file=sys.stderr)
+            else:
+                self.on_error(error, records)
+        except Exception:
+            # Ошибка в обработчике тоже не должна останавливать поток
+            pass
+
+    def flush(self):
+        """Ждёт, пока все накопленные события будут переданы writer.
+
+        Если фоновый поток уже остановлен, не ждёт.
+        """
+        queue = self._queue
+        with queue.all_tasks_done:
+            while queue.unfinished_tasks and self._thread.is_alive():
+                queue.all_tasks_done.wait(0.1)
+
+    def close(self):
+        """Передаёт оставшиеся события и останавливает фоновый поток."""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+        self._thread.join()
+
 
 class CreateLogMixin:
+    __slots__ = ()
+    # Приёмник событий создания; None отключает логирование
+    creation_sink = StdoutCreationSink()
+
     def __init__(self, *args, **kwargs):
-        print(f"Создан объект класса: {self.__class__.__name__}")
-        # Сохраняем оригинальные аргументы без преобразования в float
-        original_args = args
-        print(f"Переданные аргументы: args={original_args}, kwargs={kwargs}")
+        sink = CreateLogMixin.creation_sink
+        if sink is not None:
+            # Передаём оригинальные аргументы без преобразования в float
+            sink.emit(self.__class__.__name__, args, kwargs)
         super().__init__(*args, **kwargs)
 
+
+def set_creation_sink(sink):
+    """Устанавливает приёмник событий создания товаров и возвращает прежний."""
+    previous = CreateLogMixin.creation_sink
+    CreateLogMixin.creation_sink = sink
+    return previous
+
 class BaseProduct(ABC):
+    __slots__ = ()
+
     def __init__(self, name: str, description: str, price_: float, quantity: int):
         self.name = name
         self.description = description
@@ -27,30 +312,57 @@ class BaseProduct(ABC):
         pass
 
 
-class Product(CreateLogMixin, BaseProduct):
-    """Класс, представляющий товар."""
+class _ProductBase(CreateLogMixin, BaseProduct):
+    """Общая логика товара для обычной иерархии и компактной иерархии на __slots__."""
+
+    __slots__ = ()
+    # Хранилища, в которых лежит товар (уведомляются об изменении полей)
+    _observers = ()
+    # Дополнительные поля наследников, хранящиеся в ProductTable
+    _extra_fields = ()
+    # Поля, изменение которых нужно передать в хранилища
+    _tracked_fields = frozenset({'name', 'description', '_price', 'quantity'})
 
     def __init__(self, name: str, description: str, price_: float, quantity: int):
-        if not name or not name.strip():
+        # Строки проверяются через кэш и заменяются общим экземпляром
+        # (для пустой строки кэш хранит None, так что повторный strip не нужен)
+        if type(name) is str:
+            name = text_cache.get(name, _checked_text)
+        elif name:
+            name = _checked_text(name)
+        if not name:
             raise ValueError("Имя товара не может быть пустым")
-        if not description or not description.strip():
+        if type(description) is str:
+            description = text_cache.get(description, _checked_text)
+        elif description:
+            description = _checked_text(description)
+        if not description:
             raise ValueError("Описание товара не может быть пустым")
+        if type(quantity) is not int or not -_QUANTITY_LIMIT <= quantity < _QUANTITY_LIMIT:
+            quantity = _checked_quantity(quantity)
         if quantity == 0:
             raise ValueError("Товар с нулевым количеством не может быть добавлен")
             
         # Сначала вызываем миксин с оригинальными аргументами
         super().__init__(name, description, price_, quantity)
         
-        # Затем преобразуем цену в float
+        # Затем преобразуем цену в float (в режиме копеек — округлённый до копейки)
+        parse = _money._parse_price
         try:
-            self._price = float(price_)
+            price = price_cache.get(price_, parse) if type(price_) is str else parse(price_)
         except ValueError as e:
             raise ValueError(f"Не удалось преобразовать строку в float: '{price_}'") from e
+        except OverflowError:
+            price = math.inf
+        self._price = price
         
-        if self._price <= 0:
+        if not math.isfinite(price):
+            raise ValueError("Цена должна быть конечным числом")
+        if price <= 0:
             raise ValueError("Цена должна быть положительной")
         if quantity < 0:
             raise ValueError("Количество не может быть отрицательным")
+        self._uid = next(_product_ids)
         # try:
         #     price_ = float(price_)
         # except ValueError as e:
@@ -70,6 +382,32 @@ class Product(CreateLogMixin, BaseProduct):
     #     """Метод возвращает в строковом значении Имя продукта +  цену + количество"""
     #     return f'{self.name}, {self._price} руб. Остаток: {self.quantity} шт.'
 
+    def __setattr__(self, key, value):
+        """Передаёт изменения отслеживаемых полей в хранилища ProductTable."""
+        observers = self._observers
+        if observers and key == 'quantity':
+            # Проверяем до присваивания, чтобы товар и колонка не разошлись
+            value = _checked_quantity(value)
+            _checked_value(self._price, value)
+        super().__setattr__(key, value)
+        if observers and key in self._tracked_fields:
+            for table in observers:
+                table._product_changed(self, key)
+
+    @classmethod
+    def _from_columns(cls, uid, name, description, price, quantity, extras):
+        """Собирает лёгкое представление товара из колонок без валидации и логирования."""
+        product = cls.__new__(cls)
+        fields = product.__dict__
+        fields['name'] = name
+        fields['description'] = description
+        fields['_price'] = price
+        fields['quantity'] = quantity
+        fields['_uid'] = uid
+        if extras is not None:
+            fields.update(zip(cls._extra_fields, extras))
+        return product
+
     def __add__(self, other):
         if type(self) != type(other):
              raise TypeError("Нельзя складывать товары разных типов!")
@@ -103,19 +441,62 @@ class Product(CreateLogMixin, BaseProduct):
         # total_price_all_product = total_price_product_2 + total_price_product_1
         # return total_price_all_product
         
+    @property
+    def id(self):
+        """Стабильный идентификатор товара."""
+        return self._uid
+
+    def reserve(self, amount: int = 1):
+        """Атомарно списывает amount единиц остатка (например, при оформлении заказа).
+
+        Если остатка не хватает, количество не меняется и выбрасывается ValueError.
+        """
+        if not isinstance(amount, int) or amount <= 0:
+            raise ValueError("Количество для резерва должно быть положительным целым числом")
+        with _stripe_locks[self._uid % _STRIPES]:
+            if self.quantity < amount:
+                raise ValueError(f"Недостаточно товара '{self.name}': остаток {self.quantity}, запрошено {amount}")
+            self.quantity -= amount
+
+    def release(self, amount: int = 1):
+        """Атомарно возвращает amount единиц на склад (отмена резерва)."""
+        if not isinstance(amount, int) or amount <= 0:
+            raise ValueError("Количество для возврата должно быть положительным целым числом")
+        with _stripe_locks[self._uid % _STRIPES]:
+            self.quantity += amount
+
     @property
     def price(self):
         """Геттер для цены."""
         return self._price
 
+    @property
+    def price_kopecks(self) -> int:
+        """Цена в целых копейках (в режиме копеек — точно, иначе с округлением)."""
+        return round(self._price * 100)
+
+    @property
+    def value_kopecks(self) -> int:
+        """Стоимость остатка в целых копейках: price_kopecks * quantity без потерь."""
+        return round(self._price * 100) * self.quantity
+
     @price.setter
     def price(self, value):
         """Сеттер для цены с проверкой."""
-        if value <= 0:
+        try:
+            price = _money._parse_price(value) if 0 < value < math.inf else value
+        except OverflowError:
+            price = math.inf
+        if not math.isfinite(price):
+            print("Цена должна быть конечным числом")
+        elif price <= 0:
             print("Цена не должна быть нулевая или отрицательная")
+        elif not math.isfinite(price * self.quantity):
+            print("Стоимость остатка слишком велика")
         else:
-            self._price = value
-            
+            # Как и в __init__, цена хранится как float — в том же виде, что и в колонке таблицы
+            self._price = price
+
     @classmethod
     def new_product(cls, product_info: dict):
         """Создаёт новый объект Product из словаря параметров."""
@@ -126,7 +507,68 @@ class Product(CreateLogMixin, BaseProduct):
             quantity=product_info.get('quantity')
         )
 
+    @classmethod
+    def from_records(cls, records, errors: list | None = None):
+        """Пакетно проверяет записи и возвращает их в виде ProductTable без создания объектов.
+
+        Запись — словарь с ключами name, description, price, quantity и
+        дополнительными полями класса либо кортеж в порядке аргументов
+        конструктора. Все некорректные строки собираются вместе: если передан
+        список errors, пары (номер строки, сообщение) добавляются в него,
+        а строки пропускаются, иначе выбрасывается BulkValidationError.
+        """
+        table = ProductTable()
+        table._extend_rows(cls, *cls._validated_columns(records, errors))
+        return table
+
+    @classmethod
+    def _validated_columns(cls, records, errors):
+        """Проверяет записи и возвращает колонки names, descriptions, prices, quantities, extras."""
+        columns, bad_rows = _record_columns(records, cls._extra_fields)
+        names, descriptions, raw_prices, quantities = columns[:4]
+        prices = _validate_columns(names, descriptions, raw_prices, quantities)
+        if prices is None:
+            # В пачке есть ошибки: проверяем построчно, чтобы собрать их все
+            prices = []
+            keep = []
+            for row, fields in enumerate(zip(names, descriptions, raw_prices, quantities)):
+                try:
+                    if not isinstance(fields[3], int):
+                        raise TypeError("Количество должно быть целым числом")
+                    price = _validate_fields(*fields)
+                except (ValueError, TypeError) as e:
+                    bad_rows.append((columns[-1][row], str(e)))
+                    price = None
+                prices.append(price)
+                keep.append(price is not None)
+            columns = [list(itertools.compress(column, keep)) for column in columns]
+            names, descriptions, _, quantities = columns[:4]
+            prices = list(itertools.compress(prices, keep))
+        if bad_rows:
+            bad_rows.sort()
+            if errors is None:
+                raise BulkValidationError(bad_rows)
+            errors.extend(bad_rows)
+        if cls._extra_fields:
+            extras = list(zip(*columns[4:-1]))
+        else:
+            extras = [None] * len(names)
+        return names, descriptions, prices, quantities, extras
+
+    @classmethod
+    def from_columns(cls, names, descriptions, prices, quantities, *extra_columns, errors: list | None = None):
+        """Как from_records, но принимает данные в виде отдельных колонок."""
+        return cls.from_records(zip(names, descriptions, prices, quantities, *extra_columns), errors)
+
+
+class Product(_ProductBase):
+    """Класс, представляющий товар."""
+
+
 class Smartphone(Product):
+    _extra_fields = ('efficiency', 'model', 'memory', 'color')
+    _tracked_fields = Product._tracked_fields | frozenset(_extra_fields)
+
     def __init__(self, name: str, description: str, price_: float, quantity: int, efficiency, model, memory, color):
         super().__init__(name, description, price_, quantity)
         self.efficiency = efficiency
@@ -135,6 +577,9 @@ class Smartphone(Product):
         self.color = color
 
 class LawnGrass(Product):
+    _extra_fields = ('country', 'germination_period', 'color')
+    _tracked_fields = Product._tracked_fields | frozenset(_extra_fields)
+
     def __init__(self, name: str, description: str, price_: float, quantity: int, country: str, germination_period: int, color: str):
         super().__init__(name, description, price_, quantity)
         self.country = country
@@ -142,45 +587,1770 @@ class LawnGrass(Product):
         self.color = color
 
 
+class CompactProduct(_ProductBase):
+    """Товар без __dict__: атрибуты хранятся в __slots__.
+
+    Ведёт себя как Product (проверки, логирование, свойство price) и
+    считается его подклассом для isinstance, но занимает меньше памяти.
+    """
+
+    __slots__ = ('name', 'description', '_price', 'quantity', '_uid', '_observers', '__weakref__')
+
+    def __init__(self, name: str, description: str, price_: float, quantity: int):
+        # Слот должен быть заполнен до первого присваивания через __setattr__
+        object.__setattr__(self, '_observers', ())
+        super().__init__(name, description, price_, quantity)
+
+    @classmethod
+    def _from_columns(cls, uid, name, description, price, quantity, extras):
+        """Собирает лёгкое представление товара из колонок без валидации и логирования."""
+        product = cls.__new__(cls)
+        set_field = object.__setattr__
+        set_field(product, '_observers', ())
+        set_field(product, 'name', name)
+        set_field(product, 'description', description)
+        set_field(product, '_price', price)
+        set_field(product, 'quantity', quantity)
+        set_field(product, '_uid', uid)
+        if extras is not None:
+            for field, value in zip(cls._extra_fields, extras):
+                set_field(product, field, value)
+        return product
+
+
+def _intern(value):
+    """Интернирует строки, чтобы повторяющиеся значения хранились в одном экземпляре."""
+    return sys.intern(value) if type(value) is str else value
+
+
+class CompactSmartphone(CompactProduct):
+    """Компактный вариант Smartphone; модель, память и цвет интернируются."""
+
+    __slots__ = ('efficiency', 'model', 'memory', 'color')
+    _extra_fields = Smartphone._extra_fields
+    _tracked_fields = Smartphone._tracked_fields
+
+    def __init__(self, name: str, description: str, price_: float, quantity: int, efficiency, model, memory, color):
+        super().__init__(name, description, price_, quantity)
+        self.efficiency = _intern(efficiency)
+        self.model = _intern(model)
+        self.memory = _intern(memory)
+        self.color = _intern(color)
+
+
+class CompactLawnGrass(CompactProduct):
+    """Компактный вариант LawnGrass; страна и цвет интернируются."""
+
+    __slots__ = ('country', 'germination_period', 'color')
+    _extra_fields = LawnGrass._extra_fields
+    _tracked_fields = LawnGrass._tracked_fields
+
+    def __init__(self, name: str, description: str, price_: float, quantity: int, country: str, germination_period: int, color: str):
+        super().__init__(name, description, price_, quantity)
+        self.country = _intern(country)
+        self.germination_period = germination_period
+        self.color = _intern(color)
+
+
+# Компактные классы проходят проверки isinstance/issubclass для своих аналогов
+Product.register(CompactProduct)
+Smartphone.register(CompactSmartphone)
+LawnGrass.register(CompactLawnGrass)
+
+
+# Модуль numpy, None, если он не установлен, или _NOT_CACHED до первой попытки импорта
+_numpy_module = _NOT_CACHED
+
+
+def _numpy():
+    """Возвращает модуль numpy, если он установлен, иначе None.
+
+    Результат первой попытки импорта запоминается, чтобы без numpy не
+    повторять поиск модуля при каждом вызове.
+    """
+    global _numpy_module
+    if _numpy_module is _NOT_CACHED:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy_module = numpy
+    return _numpy_module
+
+
+class CategoryStats(namedtuple('CategoryStats', 'count quantity_sum total_value mean_price '
+                                                'min_price max_price price_quantiles')):
+    """Сводная статистика категории, посчитанная за один проход по колонкам."""
+
+    __slots__ = ()
+
+
+# Знаменатель любого float делит 2 ** 1074, поэтому сумма в этих единицах точна
+_EXACT_SCALE = 1 << 1074
+
+
+def _scaled(value):
+    """Переводит float в целое число единиц 2 ** -1074 без потери точности."""
+    numerator, denominator = value.as_integer_ratio()
+    return numerator << (1075 - denominator.bit_length())
+
+
+def _fsum(values):
+    """math.fsum, который при выходе суммы за пределы float возвращает ±inf вместо OverflowError."""
+    values = values if isinstance(values, (list, array)) else list(values)
+    try:
+        return math.fsum(values)
+    except OverflowError:
+        total = _ExactSum()
+        total.add_many(values)
+        return total.value
+
+
+class _ExactSum:
+    """Точная сумма конечных чисел float, поддерживающая вычитание.
+
+    Результат совпадает с math.fsum по тем же слагаемым; сумма, которая
+    не помещается в float, читается как ±inf.
+    """
+
+    __slots__ = ('_total',)
+
+    def __init__(self):
+        self._total = 0
+
+    def add(self, value):
+        self._total += _scaled(float(value))
+
+    def add_many(self, values):
+        # math.fsum округляет точную сумму корректно, поэтому, вычитая уже
+        # учтённые части, за несколько проходов получаем её без потерь
+        values = list(values)
+        count = len(values)
+        total = self._total
+        try:
+            while True:
+                part = math.fsum(values)
+                if not part:
+                    break
+                total += _scaled(part)
+                values.append(-part)
+        except OverflowError:
+            # Промежуточная сумма вышла за пределы float: складываем слагаемые по одному
+            total = self._total + sum(map(_scaled, map(float, values[:count])))
+        self._total = total
+
+    def sub(self, value):
+        self._total -= _scaled(float(value))
+
+    @property
+    def value(self):
+        try:
+            return self._total / _EXACT_SCALE
+        except OverflowError:
+            return math.inf if self._total > 0 else -math.inf
+
+    def mean(self, count):
+        value = self.value
+        if math.isinf(value):
+            # Сумма не помещается в float, а среднее помещается
+            return self._total / (_EXACT_SCALE * count)
+        return value / count
+
+
+class _KopeckSum:
+    """Сумма в целых копейках."""
+
+    __slots__ = ('_total',)
+
+    def __init__(self):
+        self._total = 0
+
+    @property
+    def value(self):
+        try:
+            return self._total / 100
+        except OverflowError:
+            return math.inf if self._total > 0 else -math.inf
+
+    def mean(self, count):
+        # Одно деление целых чисел округляется корректно, без двойного округления
+        return self._total / (100 * count)
+
+
+class _RunningTotals:
+    """Поддерживает сумму цен, сумму количеств и общую стоимость таблицы."""
+
+    def __init__(self):
+        self.count = 0
+        self.quantity_sum = 0
+        self.price_sum = _ExactSum()
+        self.value_sum = _ExactSum()
+
+    def state(self):
+        """Возвращает накопленные значения в виде списка целых чисел."""
+        return [self.count, self.quantity_sum, self.price_sum._total, self.value_sum._total]
+
+    @classmethod
+    def from_state(cls, state):
+        totals = cls()
+        totals.count, totals.quantity_sum, totals.price_sum._total, totals.value_sum._total = state
+        return totals
+
+    def on_insert(self, table, row):
+        price = table._prices[row]
+        quantity = table._quantities[row]
+        self.count += 1
+        self.quantity_sum += quantity
+        self.price_sum.add(price)
+        self.value_sum.add(price * quantity)
+
+    def on_extend(self, table, start, stop):
+        prices = table._prices[start:stop]
+        quantities = table._quantities[start:stop]
+        self.count += stop - start
+        self.quantity_sum += sum(quantities)
+        self.price_sum.add_many(prices)
+        self.value_sum.add_many(map(operator.mul, prices, quantities))
+
+    def on_remove(self, table, row):
+        price = table._prices[row]
+        quantity = table._quantities[row]
+        self.count -= 1
+        self.quantity_sum -= quantity
+        self.price_sum.sub(price)
+        self.value_sum.sub(price * quantity)
+
+    def on_update(self, table, row, field, old):
+        if field == 'price':
+            quantity = table._quantities[row]
+            self.price_sum.sub(old)
+            self.price_sum.add(table._prices[row])
+            self.value_sum.sub(old * quantity)
+            self.value_sum.add(table._prices[row] * quantity)
+        elif field == 'quantity':
+            price = table._prices[row]
+            self.quantity_sum += table._quantities[row] - old
+            self.value_sum.sub(price * old)
+            self.value_sum.add(price * table._quantities[row])
+
+    def on_update_many(self, table, rows, field, old):
+        if field != 'price':
+            for row, value in zip(rows, old):
+                self.on_update(table, row, field, value)
+            return
+        prices = table._prices
+        quantities = list(map(table._quantities.__getitem__, rows))
+        new = list(map(prices.__getitem__, rows))
+        self.price_sum.add_many(itertools.chain(new, map(operator.neg, old)))
+        self.value_sum.add_many(itertools.chain(
+            map(operator.mul, new, quantities),
+            map(operator.neg, map(operator.mul, old, quantities))))
+
+    def verify(self, table):
+        """Сверяет накопленные суммы с полным пересчётом по колонкам."""
+        expected = (
+            len(table),
+            sum(table.quantities),
+            _fsum(table.prices),
+            _fsum(map(operator.mul, table.prices, table.quantities)),
+        )
+        actual = (self.count, self.quantity_sum, self.price_sum.value, self.value_sum.value)
+        if actual != expected:
+            raise AssertionError(f"Статистика категории расходится с пересчётом: {actual} != {expected}")
+
+
+class _KopeckTotals(_RunningTotals):
+    """Статистика в режиме копеек: суммы цен и стоимостей — точные целые числа копеек."""
+
+    def __init__(self):
+        self.count = 0
+        self.quantity_sum = 0
+        self.price_sum = _KopeckSum()
+        self.value_sum = _KopeckSum()
+
+    def state(self):
+        return super().state() + ['kopecks']
+
+    @classmethod
+    def from_state(cls, state):
+        return super().from_state(state[:4])
+
+    def on_insert(self, table, row):
+        kopecks = round(table._prices[row] * 100)
+        quantity = table._quantities[row]
+        self.count += 1
+        self.quantity_sum += quantity
+        self.price_sum._total += kopecks
+        self.value_sum._total += kopecks * quantity
+
+    def on_extend(self, table, start, stop):
+        kopecks = _kopecks(table._prices[start:stop])
+        quantities = table._quantities[start:stop]
+        self.count += stop - start
+        self.quantity_sum += sum(quantities)
+        self.price_sum._total += sum(kopecks)
+        self.value_sum._total += sum(map(operator.mul, kopecks, quantities))
+
+    def on_remove(self, table, row):
+        kopecks = round(table._prices[row] * 100)
+        quantity = table._quantities[row]
+        self.count -= 1
+        self.quantity_sum -= quantity
+        self.price_sum._total -= kopecks
+        self.value_sum._total -= kopecks * quantity
+
+    def on_update(self, table, row, field, old):
+        if field == 'price':
+            change = round(table._prices[row] * 100) - round(old * 100)
+            self.price_sum._total += change
+            self.value_sum._total += change * table._quantities[row]
+        elif field == 'quantity':
+            change = table._quantities[row] - old
+            self.quantity_sum += change
+            self.value_sum._total += change * round(table._prices[row] * 100)
+
+    def on_update_many(self, table, rows, field, old):
+        if field != 'price':
+            for row, value in zip(rows, old):
+                self.on_update(table, row, field, value)
+            return
+        new = _kopecks(map(table._prices.__getitem__, rows))
+        changes = list(map(operator.sub, new, _kopecks(old)))
+        self.price_sum._total += sum(changes)
+        self.value_sum._total += sum(map(operator.mul, changes, map(table._quantities.__getitem__, rows)))
+
+    def verify(self, table):
+        kopecks = _kopecks(table.prices)
+        expected = (len(table), sum(table.quantities), sum(kopecks),
+                    sum(map(operator.mul, kopecks, table.quantities)))
+        actual = (self.count, self.quantity_sum, self.price_sum._total, self.value_sum._total)
+        if actual != expected:
+            raise AssertionError(f"Статистика категории расходится с пересчётом: {actual} != {expected}")
+
+
+def _new_totals():
+    """Создаёт накопитель статистики для текущего режима цен."""
+    return _KopeckTotals() if get_price_mode() == 'kopecks' else _RunningTotals()
+
+
+def _totals_from_state(state):
+    """Восстанавливает статистику из state(); None, если она накоплена в другом режиме цен."""
+    cls = _KopeckTotals if get_price_mode() == 'kopecks' else _RunningTotals
+    if (state[4:] == ['kopecks']) != (cls is _KopeckTotals):
+        return None
+    return cls.from_state(state)
+
+
+def _column(typecode, values):
+    """Возвращает values в виде array(typecode), не копируя уже подходящий массив."""
+    if isinstance(values, array) and values.typecode == typecode:
+        return values
+    return array(typecode, values)
+
+
+class _StringPool(dict):
+    """Словарь строка -> номер, добавляющий неизвестные строки в список strings."""
+
+    def __init__(self, strings=()):
+        super().__init__(zip(strings, range(len(strings))))
+        self.strings = strings if isinstance(strings, list) else list(strings)
+
+    def __missing__(self, text):
+        self[text] = string_id = len(self.strings)
+        self.strings.append(text)
+        return string_id
+
+
+class ProductTable:
+    """Колоночное хранилище товаров.
+
+    Цены, количества и ссылки на интернированные названия и описания лежат
+    в непрерывных типизированных массивах. Объекты Product создаются только
+    по запросу и переиспользуются, пока на них есть ссылки.
+
+    Строки находятся по идентификатору товара через словарь за O(1).
+    Удаление помечает строку пустым идентификатором (0), а колонки
+    уплотняются, когда удалённых строк становится больше половины
+    или перед чтением колонок целиком.
+
+    Числовые колонки могут быть буферами только для чтения (например,
+    memoryview на отображённый в память снимок); при первом изменении
+    они копируются в массивы.
+    """
+
+    # Числовые колонки и их типы элементов
+    _NUMERIC_COLUMNS = (('_prices', 'd'), ('_quantities', 'q'), ('_names', 'q'),
+                        ('_descriptions', 'q'), ('_kinds', 'B'))
+    # Блокировка категории-владельца в потокобезопасном режиме
+    _lock = None
+    # Группа таблиц, у которых могут быть общие строки, вместе с этой (общий для группы WeakSet,
+    # создаётся при первой общей строке)
+    _peers = None
+    # К строкам таблицы привязывались объекты товаров
+    _has_objects = False
+
+    def __init__(self, products=()):
+        # Цены округлены до копейки: агрегаты считаются в целых копейках.
+        # Режим запоминается при создании и не зависит от последующих set_price_mode
+        self._kopeck_prices = get_price_mode() == 'kopecks'
+        self._uids = array('q')
+        self._prices = array('d')
+        self._quantities = array('q')
+        self._names = array('q')
+        self._descriptions = array('q')
+        self._kinds = array('B')
+        # Значения дополнительных полей наследников (None для Product)
+        self._extras = []
+        # Таблица интернированных строк
+        self._string_pool = _StringPool()
+        self._strings = self._string_pool.strings
+        # Классы товаров, хранящихся в таблице
+        self._kind_list = []
+        self._kind_ids = {}
+        # Индекс: идентификатор товара -> номер строки
+        self._row_index = {}
+        # Количество удалённых, но ещё не уплотнённых строк
+        self._dead = 0
+        # Подписчики на вставку, удаление и изменение строк
+        self._listeners = []
+        # Числовые колонки ссылаются на внешние буферы только для чтения
+        self._readonly = False
+        for product in products:
+            self.append(product)
+
+    @classmethod
+    def from_buffers(cls, prices, quantities, names, descriptions, kinds, extras, strings, kind_list):
+        """Создаёт таблицу поверх готовых колонок без копирования и без проверки строк.
+
+        Колонки — буферы с типами элементов 'd', 'q', 'q', 'q', 'B'
+        (array или memoryview). strings — список или последовательность
+        строк только для чтения, которая копируется в список при первом
+        добавлении новой строки. Строкам выдаются новые идентификаторы.
+        """
+        table = cls()
+        table._kind_list = list(kind_list)
+        table._kind_ids = {kind_cls: kind for kind, kind_cls in enumerate(table._kind_list)}
+        # Словарь строк и индекс по идентификаторам строятся при первом обращении
+        table._strings = strings
+        table._string_pool = None
+        table._uids = array('q', itertools.islice(_product_ids, len(prices)))
+        table._row_index = None
+        table._prices = prices
+        table._quantities = quantities
+        table._names = names
+        table._descriptions = descriptions
+        table._kinds = kinds
+        table._extras = extras
+        table._readonly = not all(isinstance(getattr(table, name), array)
+                                  for name, _ in cls._NUMERIC_COLUMNS)
+        return table
+
+    def _make_writable(self):
+        """Копирует колонки из буферов только для чтения в массивы."""
+        if not self._readonly:
+            return
+        for name, typecode in self._NUMERIC_COLUMNS:
+            column = array(typecode)
+            column.frombytes(memoryview(getattr(self, name)).cast('B'))
+            setattr(self, name, column)
+        self._readonly = False
+
+    def __getstate__(self):
+        """Передаёт при сериализации только колонки, таблицу строк и классы."""
+        self._make_writable()
+        self.compact()
+        return {
+            'prices': self._prices,
+            'quantities': self._quantities,
+            'names': self._names,
+            'descriptions': self._descriptions,
+            'kinds': self._kinds,
+            'extras': self._extras,
+            'strings': list(self._strings),
+            'kind_list': self._kind_list,
+            'kopeck_prices': self._kopeck_prices,
+        }
+
+    def __setstate__(self, state):
+        """Восстанавливает таблицу; строкам выдаются новые идентификаторы этого процесса."""
+        self.__init__()
+        self._kopeck_prices = state.get('kopeck_prices', False)
+        self._kind_list = state['kind_list']
+        self._kind_ids = {cls: kind for kind, cls in enumerate(self._kind_list)}
+        self._intern_many(state['strings'])
+        self._append_columns(
+            array('q', itertools.islice(_product_ids, len(state['prices']))),
+            state['prices'],
+            state['quantities'],
+            state['names'],
+            state['descriptions'],
+            state['kinds'],
+            state['extras'],
+        )
+
+    def __len__(self):
+        return len(self._uids) - self._dead
+
+    @property
+    def _rows(self):
+        """Индекс идентификатор товара -> номер строки (строится лениво)."""
+        if self._row_index is None:
+            self._row_index = {uid: row for row, uid in enumerate(self._uids) if uid}
+        return self._row_index
+
+    @_rows.setter
+    def _rows(self, index):
+        self._row_index = index
+
+    @property
+    def _string_ids(self):
+        """Словарь строка -> номер в таблице строк (строится лениво)."""
+        if self._string_pool is None:
+            self._string_pool = _StringPool(self._strings)
+            self._strings = self._string_pool.strings
+        return self._string_pool
+
+    def __iter__(self):
+        for row, uid in enumerate(self._uids):
+            if uid:
+                yield self.view(row)
+
+    def __getitem__(self, index):
+        self.compact()
+        return self.view(index)
+
+    def __contains__(self, product):
+        return self._find_row(product) is not None
+
+    @property
+    def prices(self):
+        """Колонка цен (array('d'))."""
+        self.compact()
+        return self._prices
+
+    @property
+    def quantities(self):
+        """Колонка количеств (array('q'))."""
+        self.compact()
+        return self._quantities
+
+    def add_listener(self, listener, replay: bool = True):
+        """Подписывает listener на изменения строк.
+
+        Listener реализует методы on_insert(table, row), on_extend(table, start, stop)
+        для пачки подряд добавленных строк, on_remove(table, row)
+        и on_update(table, row, field, old); необязательный метод
+        on_update_many(table, rows, field, old_values) получает пачечные
+        изменения одним вызовом. Уже имеющиеся строки передаются
+        ему через on_extend, если не указано replay=False.
+        """
+        self.compact()
+        self._listeners.append(listener)
+        if replay and self._uids:
+            listener.on_extend(self, 0, len(self._uids))
+
+    def get(self, uid):
+        """Возвращает товар по идентификатору или None."""
+        row = self._rows.get(uid)
+        if row is None:
+            return None
+        return self.view(row)
+
+    def compact(self):
+        """Убирает из колонок удалённые строки и перестраивает индекс."""
+        if not self._dead:
+            return
+        alive = self._uids
+        for name, typecode in self._NUMERIC_COLUMNS:
+            setattr(self, name, array(typecode, itertools.compress(getattr(self, name), alive)))
+        self._extras = list(itertools.compress(self._extras, alive))
+        self._uids = array('q', filter(None, alive))
+        self._rows = {uid: row for row, uid in enumerate(self._uids)}
+        self._dead = 0
+
+    def kopecks(self) -> array:
+        """Возвращает цены в целых копейках одной колонкой array('q').
+
+        Для цен, округлённых до копейки (режим копеек), перевод точный.
+        При наличии numpy колонка переводится векторно.
+        """
+        self.compact()
+        np = _numpy()
+        if np is None:
+            return array('q', _kopecks(self._prices))
+        kopecks = array('q')
+        kopecks.frombytes(np.rint(np.frombuffer(self._prices, dtype=np.float64) * 100).astype(np.int64).tobytes())
+        return kopecks
+
+    def aggregate(self, n: int = 4) -> CategoryStats:
+        """Считает агрегаты по колонкам цен и количеств.
+
+        При наличии numpy колонки читаются без копирования через буфер массива,
+        иначе используется стандартная библиотека. Для таблицы, созданной в
+        режиме копеек, общая стоимость и средняя цена считаются точно в целых
+        копейках.
+        """
+        self.compact()
+        count = len(self._prices)
+        if not count:
+            return CategoryStats(0, 0, 0.0, 0.0, 0.0, 0.0, ())
+        np = _numpy()
+        if np is not None:
+            prices = np.frombuffer(self._prices, dtype=np.float64)
+            quantities = np.frombuffer(self._quantities, dtype=np.int64)
+            cuts = np.quantile(prices, [i / n for i in range(1, n)]) if count > 1 else None
+            if self._kopeck_prices:
+                kopecks = np.rint(prices * 100).astype(np.int64)
+                largest = int(kopecks.max())
+                # В int64 считаем, только если сумма заведомо не переполнится
+                if largest * max(int(quantities.max()), 1) * count < 1 << 63:
+                    total_value = int(kopecks @ quantities) / 100
+                else:
+                    total_value = sum(map(operator.mul, kopecks.tolist(), quantities.tolist())) / 100
+                mean_price = sum(kopecks.tolist()) / (100 * count)
+            else:
+                # Суммируем так же точно, как без numpy и как Category.total_value
+                total_value = _fsum((prices * quantities).tolist())
+                mean_price = self._mean(self._prices)
+            return CategoryStats(
+                count=count,
+                quantity_sum=int(quantities.sum()),
+                total_value=total_value,
+                mean_price=mean_price,
+                min_price=float(prices.min()),
+                max_price=float(prices.max()),
+                price_quantiles=tuple(cuts.tolist()) if cuts is not None else (prices[0].item(),) * (n - 1),
+            )
+        from statistics import quantiles
+        prices = self._prices
+        quantities = self._quantities
+        if count > 1:
+            cuts = tuple(quantiles(prices, n=n, method='inclusive'))
+        else:
+            cuts = (prices[0],) * (n - 1)
+        if self._kopeck_prices:
+            kopecks = _kopecks(prices)
+            total_value = sum(map(operator.mul, kopecks, quantities)) / 100
+            mean_price = sum(kopecks) / (100 * count)
+        else:
+            total_value = _fsum(map(operator.mul, prices, quantities))
+            mean_price = self._mean(prices)
+        return CategoryStats(
+            count=count,
+            quantity_sum=sum(quantities),
+            total_value=total_value,
+            mean_price=mean_price,
+            min_price=min(prices),
+            max_price=max(prices),
+            price_quantiles=cuts,
+        )
+
+    @staticmethod
+    def _mean(prices):
+        """Средняя цена как в Category.average_price, в том числе когда сумма цен не помещается в float."""
+        try:
+            return math.fsum(prices) / len(prices)
+        except OverflowError:
+            total = _ExactSum()
+            total.add_many(prices)
+            return total.mean(len(prices))
+
+    def _intern(self, text):
+        """Возвращает номер строки в таблице строк, добавляя её при необходимости."""
+        return self._string_ids[text]
+
+    def _intern_many(self, texts):
+        """Интернирует строки пачкой и возвращает итератор их номеров."""
+        pool = self._string_ids
+        fresh = [text for text in dict.fromkeys(texts) if text not in pool]
+        if fresh:
+            strings = self._strings
+            pool.update(zip(fresh, range(len(strings), len(strings) + len(fresh))))
+            strings.extend(fresh)
+        return map(pool.__getitem__, texts)
+
+    def _kind(self, cls):
+        """Возвращает номер класса товара в таблице классов."""
+        kind = self._kind_ids.get(cls)
+        if kind is None:
+            kind = len(self._kind_list)
+            self._kind_list.append(cls)
+            self._kind_ids[cls] = kind
+        return kind
+
+    def _find_row(self, product):
+        return self._rows.get(getattr(product, '_uid', None))
+
+    def _row_values(self, product):
+        """Готовит значения колонок товара: цену, количество, номера строк, класс и доп. поля.
+
+        Значения всех колонок готовятся до изменения таблицы: ошибка типа
+        или переполнение не должны оставить недописанную строку.
+        """
+        cls = type(product)
+        price = float(product._price)
+        quantity = _checked_quantity(product.quantity)
+        _checked_value(price, quantity)
+        kind = self._kind(cls)
+        if kind > 255:
+            raise ValueError("Слишком много классов товаров в одной таблице")
+        extras = tuple(getattr(product, field) for field in cls._extra_fields) if cls._extra_fields else None
+        return price, quantity, self._intern(product.name), self._intern(product.description), kind, extras
+
+    def append(self, product):
+        """Добавляет товар в таблицу и подписывает таблицу на его изменения."""
+        self._make_writable()
+        uid = product._uid
+        if uid in self._rows:
+            raise ValueError("Продукт уже есть в таблице")
+        price, quantity, name, description, kind, extras = self._row_values(product)
+        if product._observers:
+            # Все хранилища товара уже в одной группе, достаточно первого
+            self._share_with(product._observers[0])
+        self._rows[uid] = len(self._uids)
+        self._uids.append(uid)
+        self._prices.append(price)
+        self._quantities.append(quantity)
+        self._names.append(name)
+        self._descriptions.append(description)
+        self._kinds.append(kind)
+        self._extras.append(extras)
+        self._attach(product)
+        for listener in self._listeners:
+            listener.on_insert(self, len(self._uids) - 1)
+
+    def append_many(self, products, errors: list | None = None) -> int:
+        """Добавляет товары пачкой: подписчики получают одно уведомление on_extend.
+
+        Каждый товар проверяется как в append до изменения таблицы. Если
+        передан список errors, пары (номер товара, исключение) добавляются
+        в него, а ошибочные товары пропускаются; иначе выбрасывается первое
+        исключение и таблица не меняется. Возвращает число добавленных товаров.
+        """
+        self._make_writable()
+        rows = self._rows
+        accepted = []
+        values = []
+        seen = set()
+        for index, product in enumerate(products):
+            try:
+                uid = product._uid
+                if uid in rows or uid in seen:
+                    raise ValueError("Продукт уже есть в таблице")
+                values.append((uid, *self._row_values(product)))
+            except (TypeError, ValueError) as e:
+                if errors is None:
+                    raise
+                errors.append((index, e))
+                continue
+            seen.add(uid)
+            accepted.append(product)
+        if not accepted:
+            return 0
+        self._append_columns(*map(list, zip(*values)))
+        for product in accepted:
+            if product._observers:
+                self._share_with(product._observers[0])
+            self._attach(product)
+        return len(accepted)
+
+    def _extend_rows(self, cls, names, descriptions, prices, quantities, extras):
+        """Добавляет уже проверенные строки одного класса пачкой."""
+        self._append_columns(
+            array('q', itertools.islice(_product_ids, len(names))),
+            prices,
+            quantities,
+            self._intern_many(names),
+            self._intern_many(descriptions),
+            array('B', [self._kind(cls)]) * len(names),
+            extras,
+        )
+
+    def extend(self, other):
+        """Добавляет все строки другой таблицы, не создавая объектов товаров."""
+        other.compact()
+        if not self._rows.keys().isdisjoint(other._uids):
+            raise ValueError("Продукт уже есть в таблице")
+        # Переводим номера строк и классов другой таблицы в номера этой таблицы
+        string_ids = array('q', self._intern_many(other._strings))
+        kind_ids = array('B', map(self._kind, other._kind_list))
+        self._append_columns(
+            other._uids,
+            other._prices,
+            other._quantities,
+            map(string_ids.__getitem__, other._names),
+            map(string_ids.__getitem__, other._descriptions),
+            map(kind_ids.__getitem__, other._kinds),
+            other._extras,
+        )
+        # Строки other (и таблиц её группы) теперь лежат и здесь
+        self._share_with(other)
+        if other._has_objects:
+            for product in filter(None, map(_live_products.get, other._uids)):
+                self._attach(product)
+
+    def _share_with(self, table):
+        """Запоминает, что у таблиц есть общие строки: изменения строки передаются во все её таблицы.
+
+        Таблицы с общими строками объединяются в группу (меньшая группа
+        вливается в большую), поэтому повторное добавление того же товара
+        в ещё одну таблицу стоит одной проверки.
+        """
+        group = self._peers
+        if table is self or group is not None and group is table._peers:
+            return
+        other = table._peers
+        if group is None:
+            group = self._peers = weakref.WeakSet((self,))
+        if other is None:
+            other = table._peers = weakref.WeakSet((table,))
+        if len(group) < len(other):
+            group, other = other, group
+        for member in list(other):
+            member._peers = group
+            group.add(member)
+
+    def _owners(self, uid):
+        """Другие таблицы, в которых лежит строка uid."""
+        peers = self._peers
+        if not peers:
+            return ()
+        return [table for table in list(peers) if table is not self and uid in table._rows]
+
+    def _append_columns(self, uids, prices, quantities, names, descriptions, kinds, extras):
+        self._make_writable()
+        # Колонки собираются целиком до изменения таблицы, как и в append
+        uids = _column('q', uids)
+        prices = _column('d', prices)
+        quantities = _column('q', quantities)
+        names = _column('q', names)
+        descriptions = _column('q', descriptions)
+        kinds = _column('B', kinds)
+        extras = extras if isinstance(extras, list) else list(extras)
+        if not len(uids) == len(prices) == len(quantities) == len(names) == len(descriptions) == len(kinds) == len(extras):
+            raise ValueError("Колонки разной длины")
+        start = len(self._uids)
+        self._uids.extend(uids)
+        self._rows.update(zip(uids, range(start, len(self._uids))))
+        self._prices.extend(prices)
+        self._quantities.extend(quantities)
+        self._names.extend(names)
+        self._descriptions.extend(descriptions)
+        self._kinds.extend(kinds)
+        self._extras.extend(extras)
+        for listener in self._listeners:
+            listener.on_extend(self, start, len(self._uids))
+
+    def remove(self, product):
+        """Удаляет товар из таблицы."""
+        row = self._rows.pop(getattr(product, '_uid', None), None)
+        if row is None:
+            raise ValueError("Продукт не найден в таблице")
+        for listener in self._listeners:
+            listener.on_remove(self, row)
+        self._uids[row] = 0
+        self._extras[row] = None
+        self._dead += 1
+        self._detach(product)
+        if self._dead * 2 > len(self._uids):
+            self.compact()
+
+    def view(self, row):
+        """Возвращает объект товара для строки, создавая его при необходимости."""
+        uid = self._uids[row]
+        product = _live_products.get(uid)
+        if product is None:
+            cls = self._kind_list[self._kinds[row]]
+            product = cls._from_columns(
+                uid,
+                self._strings[self._names[row]],
+                self._strings[self._descriptions[row]],
+                self._prices[row],
+                self._quantities[row],
+                self._extras[row],
+            )
+            # Список хранилищ товара живёт только в объекте: новый объект подписывается на все таблицы строки
+            for table in self._owners(uid):
+                table._attach(product)
+        self._attach(product)
+        return product
+
+    def set_prices(self, rows, prices):
+        """Записывает уже проверенные цены в строки rows и уведомляет подписчиков одной пачкой."""
+        self._set_many('price', '_prices', '_price', rows, prices)
+
+    def set_quantities(self, rows, quantities):
+        """Записывает уже проверенные количества в строки rows и уведомляет подписчиков одной пачкой."""
+        self._set_many('quantity', '_quantities', 'quantity', rows, quantities)
+
+    def _set_many(self, field, column_name, attribute, rows, values):
+        self._make_writable()
+        column = getattr(self, column_name)
+        old = array(column.typecode, map(column.__getitem__, rows))
+        for row, value in zip(rows, values):
+            column[row] = value
+        # Живые объекты товаров получают новое значение; другие хранилища, где они лежат, — уведомление
+        # (под блокировкой категории — после её освобождения, см. _CategoryLock)
+        lock = self._lock
+        shared = bool(self._peers)
+        for row, value in zip(rows, values):
+            uid = self._uids[row]
+            product = _live_products.get(uid)
+            if product is not None:
+                object.__setattr__(product, attribute, value)
+            elif shared and self._owners(uid):
+                # Объекта нет, а строка лежит и в других таблицах: изменение передаётся через новое представление
+                product = self.view(row)
+            else:
+                continue
+            for table in product._observers:
+                if table is not self:
+                    if lock is None:
+                        table._product_changed(product, attribute)
+                    else:
+                        lock.defer(table, product, attribute)
+        for listener in self._listeners:
+            update_many = getattr(listener, 'on_update_many', None)
+            if update_many is not None:
+                update_many(self, rows, field, old)
+            else:
+                for row, value in zip(rows, old):
+                    listener.on_update(self, row, field, value)
+
+    def _attach(self, product):
+        observers = product._observers
+        if not observers:
+            observers = []
+            object.__setattr__(product, '_observers', observers)
+        if self not in observers:
+            observers.append(self)
+        _live_products[product._uid] = product
+        self._has_objects = True
+
+    def _detach(self, product):
+        if self in product._observers:
+            product._observers.remove(self)
+
+    def _product_changed(self, product, field):
+        """Синхронизирует колонку с изменённым полем товара."""
+        if self._lock is None:
+            self._apply_change(product, field)
+        else:
+            with self._lock:
+                self._apply_change(product, field)
+
+    def _apply_change(self, product, field):
+        row = self._find_row(product)
+        if row is None:
+            return
+        self._make_writable()
+        value = getattr(product, field)
+        if field == '_price':
+            field = 'price'
+            old = self._prices[row]
+            self._prices[row] = value
+        elif field == 'quantity':
+            old = self._quantities[row]
+            self._quantities[row] = value
+        elif field == 'name':
+            old = self._strings[self._names[row]]
+            self._names[row] = self._intern(value)
+        elif field == 'description':
+            old = self._strings[self._descriptions[row]]
+            self._descriptions[row] = self._intern(value)
+        else:
+            cls = type(product)
+            old = self._extras[row][cls._extra_fields.index(field)]
+            self._extras[row] = tuple(getattr(product, name) for name in cls._extra_fields)
+        for listener in self._listeners:
+            listener.on_update(self, row, field, old)
+
+
+# Отметка «у строки нет такого поля» для хэш-индексов
+_MISSING = object()
+
+
+def _row_value(table, row, field):
+    """Значение поля строки таблицы или _MISSING, если у класса товара нет такого поля."""
+    if field == 'price':
+        return table._prices[row]
+    if field == 'quantity':
+        return table._quantities[row]
+    if field == 'kind':
+        return table._kinds[row]
+    if field == 'name':
+        return table._strings[table._names[row]]
+    if field == 'description':
+        return table._strings[table._descriptions[row]]
+    extra_fields = table._kind_list[table._kinds[row]]._extra_fields
+    if field not in extra_fields:
+        return _MISSING
+    return table._extras[row][extra_fields.index(field)]
+
+
+class _CategoryIndex:
+    """Вторичные индексы категории для Category.query.
+
+    Отсортированные списки (значение, идентификатор) для цены и количества
+    ищутся через bisect, хэш-индексы значение -> множество идентификаторов
+    строятся по классу товара и полям наследников. Каждый индекс создаётся
+    при первом запросе по своему полю, а дальше обновляется по уведомлениям
+    ProductTable. Индексы хранят идентификаторы, а не номера строк, поэтому
+    уплотнение таблицы их не затрагивает.
+    """
+
+    # Порог, после которого пачку новых строк выгоднее досортировать, чем вставлять по одной
+    _BULK_INSERT = 16
+
+    def __init__(self, table):
+        self._table = table
+        # Колонка -> отсортированный список (значение, идентификатор)
+        self._sorted = {}
+        # Поле -> {значение: множество идентификаторов}
+        self._hashed = {}
+        table.add_listener(self, replay=False)
+
+    def _value(self, row, field):
+        return _row_value(self._table, row, field)
+
+    def _live_rows(self, start=0, stop=None):
+        uids = self._table._uids
+        for row in range(start, len(uids) if stop is None else stop):
+            if uids[row]:
+                yield row, uids[row]
+
+    def _sorted_index(self, column):
+        index = self._sorted.get(column)
+        if index is None:
+            index = sorted((self._value(row, column), uid) for row, uid in self._live_rows())
+            self._sorted[column] = index
+        return index
+
+    def _hash_index(self, field):
+        index = self._hashed.get(field)
+        if index is None:
+            index = self._hashed[field] = {}
+            self._add_hashed(field, index, self._live_rows())
+        return index
+
+    def _add_hashed(self, field, index, rows):
+        for row, uid in rows:
+            value = self._value(row, field)
+            if value is not _MISSING:
+                index.setdefault(value, set()).add(uid)
+
+    def _discard_hashed(self, index, value, uid):
+        uids = index.get(value)
+        if uids is not None:
+            uids.discard(uid)
+            if not uids:
+                del index[value]
+
+    def on_insert(self, table, row):
+        self.on_extend(table, row, row + 1)
+
+    def on_extend(self, table, start, stop):
+        for column, index in self._sorted.items():
+            items = [(self._value(row, column), uid) for row, uid in self._live_rows(start, stop)]
+            if len(items) < self._BULK_INSERT:
+                for item in items:
+                    bisect.insort(index, item)
+            else:
+                index.extend(items)
+                index.sort()
+        for field, index in self._hashed.items():
+            self._add_hashed(field, index, self._live_rows(start, stop))
+
+    def on_remove(self, table, row):
+        uid = table._uids[row]
+        for column, index in self._sorted.items():
+            del index[bisect.bisect_left(index, (self._value(row, column), uid))]
+        for field, index in self._hashed.items():
+            self._discard_hashed(index, self._value(row, field), uid)
+
+    def on_update(self, table, row, field, old):
+        uid = table._uids[row]
+        index = self._sorted.get(field)
+        if index is not None:
+            del index[bisect.bisect_left(index, (old, uid))]
+            bisect.insort(index, (self._value(row, field), uid))
+        index = self._hashed.get(field)
+        if index is not None:
+            self._discard_hashed(index, old, uid)
+            self._add_hashed(field, index, [(row, uid)])
+
+    def on_update_many(self, table, rows, field, old):
+        if len(rows) >= self._BULK_INSERT and field in self._sorted:
+            # Большую пачку дешевле отсортировать заново при следующем запросе
+            del self._sorted[field]
+        for row, value in zip(rows, old):
+            self.on_update(table, row, field, value)
+
+    def _range(self, column, low, high, high_inclusive=True):
+        """Возвращает отсортированный индекс и границы среза со значениями от low до high."""
+        index = self._sorted_index(column)
+        start = 0 if low is None else bisect.bisect_left(index, (low,))
+        if high is None:
+            stop = len(index)
+        elif high_inclusive:
+            stop = bisect.bisect_right(index, (high, math.inf))
+        else:
+            stop = bisect.bisect_left(index, (high,))
+        return index, start, stop
+
+    def query(self, price_min=None, price_max=None, quantity_below=None, kind=None, attributes=None):
+        """Возвращает номера строк, удовлетворяющих всем условиям, в порядке хранения.
+
+        Перебирается самый узкий из индексов; с множествами хэш-индексов
+        кандидаты пересекаются целиком, а диапазоны проверяются по колонкам.
+        """
+        table = self._table
+        # Условия по диапазонам: (размер, идентификаторы, проверка строки)
+        ranges = []
+        # Условия по хэш-индексам: множества идентификаторов
+        uid_sets = []
+        row_checks = []
+        if price_min is not None or price_max is not None:
+            index, start, stop = self._range('price', price_min, price_max)
+            low = -math.inf if price_min is None else price_min
+            high = math.inf if price_max is None else price_max
+            ranges.append((stop - start, index, start, stop,
+                           lambda row: low <= table._prices[row] <= high))
+        if quantity_below is not None:
+            index, start, stop = self._range('quantity', None, quantity_below, high_inclusive=False)
+            ranges.append((stop - start, index, start, stop,
+                           lambda row: table._quantities[row] < quantity_below))
+        if kind is not None:
+            kind_ids = {kind_id for kind_id, cls in enumerate(table._kind_list) if issubclass(cls, kind)}
+            by_kind = self._hash_index('kind')
+            groups = [by_kind[kind_id] for kind_id in kind_ids if kind_id in by_kind]
+            if len(groups) == 1:
+                uid_sets.append(groups[0])
+            elif not groups:
+                return []
+            else:
+                row_checks.append(lambda row: table._kinds[row] in kind_ids)
+        for field, value in (attributes or {}).items():
+            uid_sets.append(self._hash_index(field).get(value, set()))
+        uid_sets.sort(key=len)
+        ranges.sort(key=operator.itemgetter(0))
+        if uid_sets and (not ranges or len(uid_sets[0]) <= ranges[0][0]):
+            uids = uid_sets.pop(0)
+        elif ranges:
+            _, index, start, stop, _ = ranges.pop(0)
+            uids = [uid for _, uid in index[start:stop]]
+        else:
+            uids = (uid for _, uid in self._live_rows())
+        for uid_set in uid_sets:
+            uids = uid_set.intersection(uids)
+        row_checks.extend(check for *_, check in ranges)
+        result = sorted(map(table._rows.__getitem__, uids))
+        if row_checks:
+            result = [row for row in result if all(check(row) for check in row_checks)]
+        return result
+
+
+class _RenderCache:
+    """Кэш строковых представлений товаров категории.
+
+    Строка товара форматируется прямо из колонок при первом обращении и
+    сбрасывается, только когда меняются название, цена или количество.
+    Для классов со своим __str__ строка собирается через объект товара
+    и сбрасывается при изменении любого поля.
+    """
+
+    _FIELDS = frozenset({'name', 'price', 'quantity'})
+
+    def __init__(self, table):
+        self._table = table
+        # Идентификатор товара -> готовая строка
+        self._lines = {}
+        table.add_listener(self, replay=False)
+
+    def on_insert(self, table, row):
+        pass
+
+    def on_extend(self, table, start, stop):
+        pass
+
+    def on_remove(self, table, row):
+        self._lines.pop(table._uids[row], None)
+
+    def on_update(self, table, row, field, old):
+        if field in self._FIELDS or table._kind_list[table._kinds[row]].__str__ is not BaseProduct.__str__:
+            self._lines.pop(table._uids[row], None)
+
+    def on_update_many(self, table, rows, field, old):
+        for row, value in zip(rows, old):
+            self.on_update(table, row, field, value)
+
+    def _format(self, row):
+        table = self._table
+        if table._kind_list[table._kinds[row]].__str__ is not BaseProduct.__str__:
+            return str(table.view(row))
+        # То же, что BaseProduct.__str__, но без создания объекта товара
+        return f'{table._strings[table._names[row]]}, {table._prices[row]} руб. ' \
+               f'Остаток: {table._quantities[row]} шт.'
+
+    def render(self, offset=0, limit=None):
+        """Лениво выдаёт строки товаров с offset, не больше limit штук."""
+        table = self._table
+        table.compact()
+        stop = len(table._uids) if limit is None else min(offset + limit, len(table._uids))
+        lines = self._lines
+        for row in range(offset, stop):
+            uid = table._uids[row]
+            line = lines.get(uid)
+            if line is None:
+                line = lines[uid] = self._format(row)
+            yield line
+
+
+def _fingerprint(cls, name, description, price, quantity, extras):
+    """Отпечаток строки фида или товара: хэш класса и всех полей."""
+    return hash((cls, name, description, price, quantity, extras or ()))
+
+
+class _FeedIndex:
+    """Ключи и отпечатки товаров категории для Category.reconcile.
+
+    Ключ товара — значение поля fields[0] либо кортеж значений полей fields —
+    сопоставляется идентификатору товара, идентификатор — отпечатку. После
+    сверки отпечатком становится хэш записи фида в том виде, в каком она
+    пришла (например, с ценой-строкой), поэтому неизменная запись
+    распознаётся без разбора полей. Любое изменение товара в обход сверки
+    заменяет отпечаток хэшем колонок. Если ключ повторяется, в индексе
+    остаётся первый товар с ним.
+    """
+
+    def __init__(self, table, fields):
+        self.fields = fields
+        # Ключ -> идентификатор товара
+        self.uids = {}
+        # Идентификатор товара -> отпечаток
+        self.fingerprints = {}
+        table.add_listener(self)
+
+    def _key(self, table, row, changed=None, old=None):
+        """Ключ строки; если передано поле changed, вместо его значения берётся old."""
+        values = []
+        for field in self.fields:
+            value = old if field == changed else _row_value(table, row, field)
+            values.append(None if value is _MISSING else value)
+        return values[0] if len(values) == 1 else tuple(values)
+
+    def _fingerprint(self, table, row):
+        return _fingerprint(table._kind_list[table._kinds[row]], table._strings[table._names[row]],
+                            table._strings[table._descriptions[row]], table._prices[row],
+                            table._quantities[row], table._extras[row])
+
+    def on_insert(self, table, row):
+        self.on_extend(table, row, row + 1)
+
+    def on_extend(self, table, start, stop):
+        uids = table._uids[start:stop]
+        strings = table._strings
+        names = list(map(strings.__getitem__, table._names[start:stop]))
+        descriptions = list(map(strings.__getitem__, table._descriptions[start:stop]))
+        fingerprints = map(hash, zip(
+            map(table._kind_list.__getitem__, table._kinds[start:stop]), names, descriptions,
+            table._prices[start:stop], table._quantities[start:stop],
+            [extras or () for extras in table._extras[start:stop]]))
+        if self.fields == ('name',):
+            keys = names
+        elif self.fields == ('description',):
+            keys = descriptions
+        else:
+            keys = [self._key(table, row) for row in range(start, stop)]
+        if 0 not in uids and len(set(keys)) == len(keys) and self.uids.keys().isdisjoint(keys):
+            self.uids.update(zip(keys, uids))
+            self.fingerprints.update(zip(uids, fingerprints))
+            return
+        for uid, key, fingerprint in zip(uids, keys, fingerprints):
+            if uid:
+                self.uids.setdefault(key, uid)
+                self.fingerprints[uid] = fingerprint
+
+    def on_remove(self, table, row):
+        uid = table._uids[row]
+        key = self._key(table, row)
+        if self.uids.get(key) == uid:
+            del self.uids[key]
+        del self.fingerprints[uid]
+
+    def on_update(self, table, row, field, old):
+        uid = table._uids[row]
+        if field in self.fields:
+            key = self._key(table, row, field, old)
+            if self.uids.get(key) == uid:
+                del self.uids[key]
+            self.uids.setdefault(self._key(table, row), uid)
+        self.fingerprints[uid] = self._fingerprint(table, row)
+
+    def on_update_many(self, table, rows, field, old):
+        for row, value in zip(rows, old):
+            self.on_update(table, row, field, value)
+
+
+# Защищает счётчики Category.category_count и Category.product_count
+_counter_lock = _thread.allocate_lock()
+
+
+class _NoLock:
+    """Заглушка контекстного менеджера для категорий без блокировки."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _CategoryLock:
+    """Реентерабельная блокировка категории поверх переданной блокировки.
+
+    Методы категории вызывают друг друга под блокировкой, поэтому повторный
+    захват тем же потоком только увеличивает счётчик. Изменения товаров,
+    которые нужно передать в хранилища других категорий, откладываются до
+    полного освобождения: иначе две категории с общим товаром могли бы
+    ждать блокировки друг друга.
+    """
+
+    __slots__ = ('_lock', '_owner', '_count', '_deferred')
+
+    def __init__(self, lock):
+        self._lock = lock
+        self._owner = None
+        self._count = 0
+        self._deferred = []
+
+    def acquire(self, blocking=True, timeout=-1):
+        me = _thread.get_ident()
+        if self._owner == me:
+            self._count += 1
+            return True
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        self._owner = me
+        self._count = 1
+        return True
+
+    def release(self):
+        if self._owner != _thread.get_ident():
+            raise RuntimeError("Блокировка категории не захвачена этим потоком")
+        self._count -= 1
+        if self._count:
+            return
+        deferred, self._deferred = self._deferred, []
+        self._owner = None
+        self._lock.release()
+        for table, product, field in deferred:
+            table._product_changed(product, field)
+
+    def defer(self, table, product, field):
+        """Передаёт изменение товара в чужое хранилище после освобождения блокировки."""
+        if self._owner == _thread.get_ident():
+            self._deferred.append((table, product, field))
+        else:
+            table._product_changed(product, field)
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+        return False
+
+
+# Переданная блокировка -> обёртка; категории с общей блокировкой получают общую обёртку
+_category_locks = {}
+
+
+def _category_lock(lock):
+    if lock is None:
+        return _CategoryLock(_thread.allocate_lock())
+    if isinstance(lock, _CategoryLock):
+        return lock
+    with _counter_lock:
+        # Блокировка хранится вместе с обёрткой, поэтому её id не переиспользуется
+        return _category_locks.setdefault(id(lock), (lock, _CategoryLock(lock)))[1]
+
+
+def _synchronized(method):
+    """Выполняет метод категории под её блокировкой, если включён потокобезопасный режим."""
+    def wrapper(self, *args, **kwargs):
+        lock = self._lock
+        if lock is None:
+            return method(self, *args, **kwargs)
+        with lock:
+            return method(self, *args, **kwargs)
+    # Вместо functools.wraps, чтобы не увеличивать время импорта модуля
+    wrapper.__name__ = method.__name__
+    wrapper.__qualname__ = method.__qualname__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+class CategoryTotals(namedtuple('CategoryTotals', 'count quantity_sum price_sum total_value')):
+    """Согласованный снимок накопленной статистики категории."""
+
+    __slots__ = ()
+
+
+class StockValue(namedtuple('StockValue', 'product_class count quantity total_value')):
+    """Итог свёртки остатков: класс товаров, число товаров, сумма количеств и общая стоимость."""
+
+    __slots__ = ()
+
+
+def _runs(keys):
+    """Разбивает последовательность на отрезки одинаковых подряд идущих значений: (значение, начало, конец)."""
+    runs = []
+    start = 0
+    for key, run in itertools.groupby(keys):
+        stop = start + len(list(run))
+        runs.append((key, start, stop))
+        start = stop
+    return runs
+
+
+def stock_value(items, by_class: bool = False):
+    """Считает общую стоимость остатков за один проход.
+
+    items — итерируемый набор товаров, Category или ProductTable.
+    Как и в Product.__add__, складывать можно только товары одного класса:
+    классы проверяются один раз на группу, а не для каждой пары. При
+    by_class=True возвращается словарь класс -> StockValue для всех
+    классов сразу, иначе — один StockValue (TypeError, если классов несколько).
+    Стоимость суммируется точно (math.fsum; для таблицы или категории,
+    созданной в режиме копеек, — в целых копейках).
+    """
+    if isinstance(items, Category):
+        return items.stock_value(by_class)
+    kopecks = isinstance(items, ProductTable) and items._kopeck_prices
+    if isinstance(items, ProductTable):
+        items.compact()
+        prices = items._prices
+        quantities = items._quantities
+        runs = [(items._kind_list[kind], start, stop) for kind, start, stop in _runs(items._kinds)]
+    else:
+        items = items if isinstance(items, list) else list(items)
+        runs = _runs(map(type, items))
+    # Отрезки одного класса собираются в группы; классы проверяются один раз на группу
+    groups = {}
+    for cls, start, stop in runs:
+        groups.setdefault(cls, []).append((start, stop))
+    for cls in groups:
+        if not (isinstance(cls, type) and issubclass(cls, Product)):
+            raise TypeError(f"Ожидался товар, получен объект класса {cls.__name__}")
+    if not isinstance(items, ProductTable):
+        prices = list(map(operator.attrgetter('_price'), items))
+        quantities = list(map(operator.attrgetter('quantity'), items))
+    result = {}
+    for cls, spans in groups.items():
+        if len(spans) == 1:
+            (start, stop), = spans
+            group_prices = prices[start:stop]
+            group_quantities = quantities[start:stop]
+        else:
+            group_prices = list(itertools.chain.from_iterable(prices[start:stop] for start, stop in spans))
+            group_quantities = list(itertools.chain.from_iterable(quantities[start:stop] for start, stop in spans))
+        if kopecks:
+            value = sum(map(operator.mul, _kopecks(group_prices), group_quantities)) / 100
+        else:
+            value = _fsum(map(operator.mul, group_prices, group_quantities))
+        result[cls] = StockValue(cls, len(group_prices), sum(group_quantities), value)
+    if by_class:
+        return result
+    if len(result) > 1:
+        raise TypeError("Нельзя складывать товары разных типов!")
+    return next(iter(result.values()), StockValue(None, 0, 0, 0.0))
+
+
+class RepriceReport(namedtuple('RepriceReport', 'updated rejected')):
+    """Итог пакетного изменения цен.
+
+    updated — число изменённых товаров, rejected — список
+    (идентификатор товара, переданная цена, сообщение) для отклонённых строк.
+    """
+
+    __slots__ = ()
+
+
+class ReconcileReport(namedtuple('ReconcileReport', 'inserted deleted price_changed quantity_changed '
+                                                   'replaced unchanged rejected')):
+    """Итог сверки категории с фидом.
+
+    Числа добавленных, удалённых, заменённых товаров, товаров с изменённой
+    ценой, количеством и без изменений; rejected — список
+    (номер записи, сообщение) для отклонённых записей.
+    """
+
+    __slots__ = ()
+
+
 class Category:
     """Класс, представляющий категорию товаров."""
 
     category_count = 0
     product_count = 0
+    # Отладочный режим: сверять накопленную статистику с полным пересчётом
+    verify_statistics = False
+    # Блокировка потокобезопасного режима (см. enable_thread_safety)
+    _lock = None
 
     def __init__(self, name: str, description: str, products: list[Product]):
-        Category.category_count += 1
-        Category.product_count += len(products)
         self.name = name
         self.description = description
-        self.__products = products
+        self.__products = ProductTable()
+        self.__totals = _new_totals()
+        self.__products.add_listener(self.__totals)
+        self.__index = None
+        self.__text_index = None
+        self.__render_cache = None
+        self.__feed_index = None
+        appended = []
+        try:
+            for product in products:
+                self.__products.append(product)
+                appended.append(product)
+        except Exception:
+            # Товары, уже попавшие в таблицу, не должны ссылаться на несозданную категорию
+            for product in appended:
+                self.__products._detach(product)
+            raise
+        # Счётчики меняются только для успешно созданной категории
+        self._count(categories=1, products=len(appended))
+
+    @staticmethod
+    def _count(products=0, categories=0):
+        """Атомарно меняет общие счётчики категорий и товаров."""
+        with _counter_lock:
+            Category.category_count += categories
+            Category.product_count += products
+
+    def enable_thread_safety(self, lock=None):
+        """Включает потокобезопасный режим категории.
+
+        Изменения состава категории, чтение статистики и запросы выполняются
+        под блокировкой категории; туда же попадают изменения полей товаров,
+        лежащих в категории. По умолчанию у каждой категории своя
+        блокировка; можно передать общую блокировку lock (например,
+        threading.Lock() или other.locked()). Блокировка всегда
+        реентерабельна: переданная lock оборачивается, и категории с одной
+        и той же lock делят одну обёртку.
+        """
+        self._lock = _category_lock(lock)
+        self.__products._lock = self._lock
+
+    def locked(self):
+        """Контекстный менеджер для согласованного чтения нескольких значений категории."""
+        return _NoLock() if self._lock is None else self._lock
 
     def __str__(self):
-        total_quantity = 0
-        for product in self.__products:
-            total_quantity += product.quantity
+        total_quantity = self.quantity_sum
         return f'{self.name}, количество продуктов: {total_quantity} шт.'
 
+    @_synchronized
     def average_price(self):# расчитываем средний ценник
-        all_price_category = 0
-        for i in self.__products:
-            all_price_category += i.price
+        totals = self._checked_totals()
         try:
-            total_average_price = all_price_category / len(self.__products)
+            total_average_price = totals.price_sum.mean(totals.count)
             return total_average_price
         except ZeroDivisionError:
             return 0
 
+    def _checked_totals(self):
+        if self.verify_statistics:
+            self.__totals.verify(self.__products)
+        return self.__totals
+
+    @property
+    @_synchronized
+    def quantity_sum(self):
+        """Суммарное количество товаров в категории, O(1)."""
+        return self._checked_totals().quantity_sum
+
+    @property
+    @_synchronized
+    def price_sum(self):
+        """Сумма цен товаров категории, O(1)."""
+        return self._checked_totals().price_sum.value
+
+    @property
+    @_synchronized
+    def total_value(self):
+        """Общая стоимость остатков категории, O(1)."""
+        return self._checked_totals().value_sum.value
+
+    @_synchronized
+    def totals(self) -> CategoryTotals:
+        """Возвращает количество товаров, сумму количеств, сумму цен и общую стоимость одним снимком."""
+        totals = self._checked_totals()
+        return CategoryTotals(totals.count, totals.quantity_sum, totals.price_sum.value, totals.value_sum.value)
+
+    @_synchronized
+    def totals_kopecks(self) -> CategoryTotals:
+        """Как totals(), но сумма цен и общая стоимость — точные целые числа копеек.
+
+        Доступно для категорий, созданных в режиме копеек (set_price_mode).
+        """
+        totals = self._checked_totals()
+        if not isinstance(totals, _KopeckTotals):
+            raise ValueError("Категория создана не в режиме копеек")
+        return CategoryTotals(totals.count, totals.quantity_sum, totals.price_sum._total, totals.value_sum._total)
 
+    @_synchronized
+    def verify_stats(self):
+        """Сверяет накопленную статистику с полным пересчётом."""
+        self.__totals.verify(self.__products)
 
+    @_synchronized
+    def stock_value(self, by_class: bool = False):
+        """Общая стоимость остатков по колонкам категории (см. stock_value)."""
+        return stock_value(self.__products, by_class)
 
+    @_synchronized
+    def stats(self, n: int = 4) -> CategoryStats:
+        """Возвращает общую стоимость, количество, среднюю/мин/макс цену и квантили цен."""
+        return self.__products.aggregate(n)
 
+    @_synchronized
+    def reprice(self, prices, new_prices=None, all_or_nothing: bool = False) -> RepriceReport:
+        """Меняет цены пачкой.
+
+        prices — словарь идентификатор товара -> новая цена либо
+        последовательность идентификаторов, тогда new_prices — последовательность
+        цен той же длины. Все цены проверяются одним проходом по колонке;
+        ошибочные строки не печатаются, а возвращаются в RepriceReport.rejected.
+        Корректные цены применяются за один шаг, накопленная статистика и
+        индексы обновляются один раз на пачку. При all_or_nothing=True
+        наличие хотя бы одной ошибки отменяет всё изменение.
+        """
+        if new_prices is not None:
+            ids = list(prices)
+            new_prices = list(new_prices)
+            if len(ids) != len(new_prices):
+                raise ValueError("Число идентификаторов и цен должно совпадать")
+            prices = dict(zip(ids, new_prices))
+        ids = list(prices)
+        raw = list(prices.values())
+        index = self.__products._rows
+        rows = list(map(index.get, ids))
+        valid = _validate_prices(raw) if None not in rows else None
+        quantities = self.__products._quantities
+        if valid is not None:
+            values = map(operator.mul, valid, map(quantities.__getitem__, rows))
+            if not all(map(math.isfinite, values)):
+                valid = None
+        rejected = []
+        if valid is None:
+            # Медленный путь: выясняем, какие именно строки ошибочны
+            keep_rows = []
+            valid = array('d')
+            for product_id, row, price in zip(ids, rows, raw):
+                try:
+                    if row is None:
+                        raise ValueError("Продукт не найден в категории")
+                    new_price = _validate_price(price)
+                    _checked_value(new_price, quantities[row])
+                    valid.append(new_price)
+                except ValueError as e:
+                    rejected.append((product_id, price, str(e)))
+                else:
+                    keep_rows.append(row)
+            rows = keep_rows
+        if rejected and all_or_nothing:
+            return RepriceReport(0, rejected)
+        if rows:
+            self.__products.set_prices(rows, valid)
+            if self.verify_statistics:
+                self.verify_stats()
+        return RepriceReport(len(rows), rejected)
+
+    def adjust_prices(self, percent: float = 0.0, delta: float = 0.0, all_or_nothing: bool = False,
+                      **conditions) -> RepriceReport:
+        """Меняет цены товаров, отобранных как в query(**conditions), на percent процентов и затем на delta.
+
+        Новые цены проверяются и применяются так же, как в reprice.
+        """
+        with self.locked():
+            if self.__index is None:
+                self.__index = _CategoryIndex(self.__products)
+            table = self.__products
+            rows = self.__index.query(conditions.pop('price_min', None), conditions.pop('price_max', None),
+                                      conditions.pop('quantity_below', None), conditions.pop('kind', None),
+                                      conditions)
+            factor = 1 + percent / 100
+            prices = table._prices
+            return self.reprice({table._uids[row]: prices[row] * factor + delta for row in rows},
+                                all_or_nothing=all_or_nothing)
+
+    @_synchronized
+    def query(self, price_min: float | None = None, price_max: float | None = None,
+              quantity_below: int | None = None, kind: type | None = None, **attributes) -> list:
+        """Ищет товары по индексам категории.
+
+        price_min/price_max — границы цены включительно, quantity_below —
+        количество строго меньше порога, kind — класс товара (с наследниками),
+        остальные именованные аргументы — точные значения полей наследников,
+        например query(kind=Smartphone, memory='256GB') или query(country='Россия').
+        Условия объединяются через «и»; товары возвращаются в порядке добавления.
+        """
+        if self.__index is None:
+            self.__index = _CategoryIndex(self.__products)
+        rows = self.__index.query(price_min, price_max, quantity_below, kind, attributes)
+        return [self.__products.view(row) for row in rows]
+
+    @_synchronized
+    def search(self, text: str, limit: int | None = 20, prefix: bool = False) -> list:
+        """Ищет товары по словам названия и описания.
+
+        Возвращает товары, содержащие все слова text, по убыванию
+        релевантности, не больше limit (None — все). Регистр и различие
+        «ё»/«е» не учитываются; слово с «*» на конце, например «смарт*»,
+        ищется как начало слова, prefix=True включает это для всех слов.
+        Индекс строится при первом поиске и дальше обновляется при
+        добавлении, удалении и изменении товаров.
+        """
+        if limit is not None and limit < 0:
+            raise ValueError("limit не может быть отрицательным")
+        if self.__text_index is None:
+            self.__text_index = _TextIndex(self.__products)
+        rows = self.__text_index.search(text, limit, prefix)
+        return [self.__products.view(row) for row in rows]
+
+    def iter_products(self, offset: int = 0, limit: int | None = None):
+        """Лениво выдаёт строковые представления товаров, начиная с offset, не больше limit.
+
+        Строки кэшируются для каждого товара, поэтому повторный вывод
+        форматирует заново только изменившиеся товары.
+        """
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("offset и limit не могут быть отрицательными")
+        if self._lock is not None:
+            # Под блокировкой строки собираются сразу, чтобы не держать её между итерациями
+            with self._lock:
+                return iter(list(self._render(offset, limit)))
+        return self._render(offset, limit)
+
+    def _render(self, offset, limit):
+        if self.__render_cache is None:
+            self.__render_cache = _RenderCache(self.__products)
+        return self.__render_cache.render(offset, limit)
+
+    def products_page(self, page: int, per_page: int = 50) -> list[str]:
+        """Возвращает строки товаров страницы page (нумерация с нуля)."""
+        if per_page <= 0:
+            raise ValueError("Размер страницы должен быть положительным")
+        return list(self.iter_products(page * per_page, per_page))
 
     @property
     def products(self):
         """Возвращает список продуктов в виде строки."""
-        return "\n".join(str(product) for product in self.__products)
+        return "\n".join(self.iter_products())
 
+    @_synchronized
     def __str__(self):
         """Магический метод для строкового представления категории."""
         return f"Категория: {self.name}\n" \
@@ -188,17 +2358,309 @@ class Category:
                f"Количество товаров: {len(self.__products)}\n" \
                f"Список товаров: {self.products}\n"
 
+    @_synchronized
+    def __contains__(self, product):
+        return product in self.__products
+
+    @_synchronized
+    def get_product(self, product_id: int):
+        """Возвращает товар категории по его идентификатору."""
+        product = self.__products.get(product_id)
+        if product is None:
+            raise ValueError("Продукт не найден в категории")
+        return product
+
+    @_synchronized
     def add_product(self, product):
         if not isinstance(product, Product):
             raise TypeError("В категорию можно добавлять только объекты класса Product или его наследников")
         self.__products.append(product)
-        Category.product_count += 1
+        self._count(products=1)
+        if self.verify_statistics:
+            self.verify_stats()
+
+    @_synchronized
+    def extend(self, products, errors: list | None = None):
+        """Добавляет в категорию таблицу из Product.from_records или набор товаров.
+
+        Набор товаров проверяется целиком и добавляется одной пачкой
+        (ProductTable.append_many), поэтому статистика и индексы обновляются
+        один раз. Если передан список errors, в него попадают пары
+        (номер товара, исключение), а остальные товары добавляются; иначе
+        при первой ошибке категория не меняется.
+        """
+        if isinstance(products, ProductTable):
+            self.__products.extend(products)
+            added = len(products)
+        else:
+            products = products if isinstance(products, list) else list(products)
+            positions = []
+            for position, product in enumerate(products):
+                if isinstance(product, Product):
+                    positions.append(position)
+                    continue
+                error = TypeError("В категорию можно добавлять только объекты класса Product или его наследников")
+                if errors is None:
+                    raise error
+                errors.append((position, error))
+            table_errors = None if errors is None else []
+            added = self.__products.append_many(list(map(products.__getitem__, positions)), table_errors)
+            if table_errors:
+                errors.extend((positions[index], error) for index, error in table_errors)
+                errors.sort(key=operator.itemgetter(0))
+        self._count(products=added)
+        if self.verify_statistics:
+            self.verify_stats()
+
+    def extend_records(self, records, product_class=Product, errors: list | None = None):
+        """Проверяет записи как Product.from_records и добавляет их сразу в хранилище категории.
+
+        Возвращает количество добавленных товаров.
+        """
+        columns = product_class._validated_columns(records, errors)
+        with self.locked():
+            self.__products._extend_rows(product_class, *columns)
+            self._count(products=len(columns[0]))
+        if self.verify_statistics:
+            self.verify_stats()
+        return len(columns[0])
+
+    def reconcile(self, records, product_class=Product, key='name', delete_missing: bool = True,
+                  keep=()) -> ReconcileReport:
+        """Приводит категорию к состоянию полного фида поставщика, меняя только то, что изменилось.
+
+        records — записи-словари как в Product.from_records; product_class —
+        класс товаров всех записей либо список классов по одному на запись.
+        Товары сопоставляются по ключу key — имени поля или кортежу имён.
+        Хэш записи сравнивается с отпечатком, сохранённым для товара при
+        прошлой сверке; совпадение означает, что товар не изменился. Иначе
+        запись сравнивается с колонками: если отличаются класс, название,
+        описание или поля наследников, товар заменяется новым, а изменения
+        цены и количества применяются пачками (цены проверяются как в
+        reprice). Записи с новыми ключами добавляются пачками, как в
+        extend_records, а товары, которых нет в фиде, удаляются, если
+        delete_missing. keep — ключи товаров, которые нельзя удалять, даже
+        если их нет в records.
+
+        Ошибочная запись не прерывает сверку и попадает в
+        ReconcileReport.rejected как (номер записи, сообщение);
+        соответствующий товар остаётся без изменений. Отпечатки хранятся в
+        индексе, который строится при первой сверке и дальше обновляется
+        при любых изменениях категории.
+        """
+        fields = (key,) if isinstance(key, str) else tuple(key)
+        records = records if isinstance(records, list) else list(records)
+        if isinstance(product_class, type):
+            classes = [product_class] * len(records)
+        else:
+            classes = list(product_class)
+            if len(classes) != len(records):
+                raise ValueError("Число классов и записей должно совпадать")
+        with self.locked():
+            table = self.__products
+            index = self.__feed_index
+            if index is None or index.fields != fields:
+                if index is not None:
+                    table._listeners.remove(index)
+                index = self.__feed_index = _FeedIndex(table, fields)
+
+            def column(field):
+                return list(map(dict.get, records, itertools.repeat(field)))
+            # Колонки записей: их хэши и поиск по индексу считаются без цикла на Python
+            if len(fields) == 1:
+                keys = column(fields[0])
+            else:
+                keys = list(zip(*map(column, fields)))
+            names = column('name')
+            descriptions = column('description')
+            raw_prices = column('price')
+            raw_quantities = column('quantity')
+            if any(cls._extra_fields for cls in set(classes)):
+                extras = [tuple(map(record.get, cls._extra_fields)) for cls, record in zip(classes, records)]
+            else:
+                extras = [()] * len(records)
+            hashes = list(map(hash, zip(classes, names, descriptions, raw_prices, raw_quantities, extras)))
+            uids = list(map(index.uids.get, keys))
+            fingerprints = index.fingerprints
+            matched = set(uids)
+            matched.discard(None)
+            # Если ключи найденных товаров не повторяются, разбирать нужно только новые
+            # записи и записи, чей хэш не совпал с отпечатком
+            unique_keys = len(matched) == len(uids) - uids.count(None)
+            if unique_keys:
+                changed = list(itertools.compress(
+                    range(len(records)), map(operator.ne, hashes, map(fingerprints.get, uids))))
+            else:
+                changed = range(len(records))
+                matched = set()
+            unchanged = len(records) - len(changed)
+            rows = table._rows
+            prices = table._prices
+            quantities = table._quantities
+            new_keys = set()
+            # (номер записи, класс, запись, отпечаток) для новых и заменяемых товаров
+            inserts = []
+            # Номер записи -> идентификатор товара, который она заменяет
+            replaced = {}
+            # (идентификатор, отпечаток) для изменённых товаров, записываемые после применения изменений
+            seen = []
+            price_rows, new_prices = [], array('d')
+            quantity_rows, new_quantities = [], array('q')
+            rejected = []
+            for position in changed:
+                cls = classes[position]
+                key_value = keys[position]
+                uid = uids[position]
+                if uid is None:
+                    if key_value in new_keys:
+                        rejected.append((position, f"Повторяющийся ключ товара: {key_value!r}"))
+                        continue
+                    new_keys.add(key_value)
+                    inserts.append((position, cls, records[position], hashes[position]))
+                    continue
+                if not unique_keys:
+                    if uid in matched:
+                        rejected.append((position, f"Повторяющийся ключ товара: {key_value!r}"))
+                        continue
+                    matched.add(uid)
+                    if hashes[position] == fingerprints[uid]:
+                        unchanged += 1
+                        continue
+                row = rows[uid]
+                if (table._kind_list[table._kinds[row]] is not cls
+                        or table._strings[table._names[row]] != names[position]
+                        or table._strings[table._descriptions[row]] != descriptions[position]
+                        or (table._extras[row] or ()) != extras[position]):
+                    replaced[position] = uid
+                    inserts.append((position, cls, records[position], hashes[position]))
+                    continue
+                price = raw_prices[position]
+                quantity = raw_quantities[position]
+                try:
+                    if price != prices[row]:
+                        price = _validate_price(price)
+                    if quantity != quantities[row]:
+                        if not isinstance(quantity, int):
+                            raise ValueError("Количество должно быть целым числом")
+                        # Количество должно поместиться в колонку array('q')
+                        _checked_quantity(quantity)
+                        if quantity < 0:
+                            raise ValueError("Количество не может быть отрицательным")
+                    # Цена и количество применяются отдельными пачками: стоимость проверяется для обоих шагов
+                    _checked_value(price, quantities[row])
+                    _checked_value(price, quantity)
+                except ValueError as e:
+                    rejected.append((position, str(e)))
+                    continue
+                price_differs = price != prices[row]
+                quantity_differs = quantity != quantities[row]
+                if price_differs:
+                    price_rows.append(row)
+                    new_prices.append(price)
+                if quantity_differs:
+                    quantity_rows.append(row)
+                    new_quantities.append(quantity)
+                if not (price_differs or quantity_differs):
+                    unchanged += 1
+                seen.append((uid, hashes[position]))
 
+            missing = []
+            if delete_missing:
+                matched.update(filter(None, map(index.uids.get, keep)))
+                missing = [uid for uid in table._uids if uid and uid not in matched]
+            # Новые записи проверяются заранее: если запись заменяемого товара ошибочна, старый товар остаётся
+            batches = []
+            for cls, group in itertools.groupby(inserts, key=lambda item: item[1]):
+                group = list(group)
+                errors = []
+                columns = cls._validated_columns([record for _, _, record, _ in group], errors)
+                failed = set()
+                for position, message in errors:
+                    failed.add(position)
+                    position = group[position][0]
+                    replaced.pop(position, None)
+                    rejected.append((position, message))
+                accepted = [item[3] for position, item in enumerate(group) if position not in failed]
+                batches.append((cls, columns, accepted))
+            # До удалений номера строк в price_rows и quantity_rows не меняются
+            if price_rows:
+                table.set_prices(price_rows, new_prices)
+            if quantity_rows:
+                table.set_quantities(quantity_rows, new_quantities)
+            # Заменяемые товары удаляются до добавления новых, чтобы ключ в индексе перешёл к новому товару
+            removed = [*replaced.values(), *missing]
+            for uid in removed:
+                table.remove(table.get(uid))
+            added = 0
+            for cls, columns, accepted in batches:
+                start = len(table._uids)
+                table._extend_rows(cls, *columns)
+                added += len(columns[0])
+                seen.extend(zip(table._uids[start:], accepted))
+            fingerprints.update(seen)
+            self._count(products=added - len(removed))
+        if self.verify_statistics:
+            self.verify_stats()
+        rejected.sort()
+        return ReconcileReport(added - len(replaced), len(removed) - len(replaced), len(price_rows),
+                               len(quantity_rows), len(replaced), unchanged, rejected)
+
+    @classmethod
+    def _from_table(cls, name: str, description: str, table: ProductTable, totals: list | None = None):
+        """Создаёт категорию, которая использует готовую таблицу как хранилище.
+
+        totals — сохранённое состояние накопленной статистики; без него
+        статистика пересчитывается по колонкам.
+        """
+        category = cls(name, description, [])
+        category.__products = table
+        category.__index = None
+        category.__text_index = None
+        category.__render_cache = None
+        category.__feed_index = None
+        if totals is not None:
+            totals = _totals_from_state(totals)
+        if totals is None:
+            category.__totals = _new_totals()
+            table.add_listener(category.__totals)
+        else:
+            category.__totals = totals
+            table.add_listener(category.__totals, replay=False)
+        table._kopeck_prices = isinstance(category.__totals, _KopeckTotals)
+        cls._count(products=len(table))
+        return category
+
+    def _storage(self) -> ProductTable:
+        """Колоночное хранилище категории (для src/repository.py)."""
+        return self.__products
+
+    @_synchronized
+    def _snapshot_parts(self) -> list:
+        """Снимок категории в виде списка буферов (см. src/snapshot.py)."""
+        from src.snapshot import encode_snapshot
+        return encode_snapshot(self.name, self.description, self.__products, self.__totals.state())
+
+    @_synchronized
+    def save(self, path):
+        """Сохраняет категорию в бинарный снимок (см. src/snapshot.py)."""
+        from src.snapshot import write_snapshot
+        write_snapshot(path, self.name, self.description, self.__products, self.__totals.state())
+
+    @classmethod
+    def load(cls, path):
+        """Загружает категорию из снимка, отображая его в память."""
+        from src.snapshot import read_snapshot
+        return cls._from_table(*read_snapshot(path))
+
+    @_synchronized
     def remove_product(self, product):
-        if product not in self.__products:
-            raise ValueError("Продукт не найден в категории")
-        self.__products.remove(product)
-        Category.product_count -= 1
+        try:
+            self.__products.remove(product)
+        except ValueError:
+            raise ValueError("Продукт не найден в категории") from None
+        self._count(products=-1)
+        if self.verify_statistics:
+            self.verify_stats()
 
 
 def main():
@@ -0,0 +1,239 @@
+"""Разбор цен и кэши вычисленных значений.
+
+LRUCache — ограниченный потокобезопасный кэш; price_cache хранит
+разобранные строковые цены. set_price_mode переключает представление
+цен между float и целыми копейками (parse_kopecks); режим читают main
+и воркеры importer.
+
+    from src.money import parse_kopecks, set_price_mode
+    parse_kopecks('1.005')  # 101
+    set_price_mode('kopecks')
+"""
+# Как и src.main, модуль импортирует только лёгкие модули стандартной библиотеки;
+# re загружается при первом разборе строки в копейки.
+import _thread
+from collections import namedtuple
+import itertools
+import math
+import operator
+
+# Отметка «значения нет в кэше»
+_NOT_CACHED = object()
+
+
+class CacheStats(namedtuple('CacheStats', 'hits misses evictions size maxsize')):
+    """Статистика кэша значений."""
+
+    __slots__ = ()
+
+
+class LRUCache:
+    """Ограниченный кэш вычисленных значений с вытеснением давно не использованных.
+
+    Порядок вставки хранится в порядке ключей словаря, а использованные
+    после вставки ключи отмечаются во множестве: при переполнении первый
+    ключ удаляется, если отметки нет, иначе отметка снимается и ключ
+    переставляется в конец («второй шанс» — приближение LRU, которое не
+    трогает порядок при попадании). maxsize=0 отключает кэширование.
+
+    Кэш можно использовать из нескольких потоков: попадание только читает
+    словарь и не берёт блокировку, вставка и вытеснение выполняются под
+    ней, compute вызывается вне её.
+    """
+
+    __slots__ = ('maxsize', 'misses', 'evictions', '_hits', '_hit_reads', '_used', '_data', '_lock')
+
+    def __init__(self, maxsize: int):
+        if maxsize < 0:
+            raise ValueError("Размер кэша не может быть отрицательным")
+        self.maxsize = maxsize
+        self._data = {}
+        self._used = set()
+        self._lock = _thread.allocate_lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        # Попадания считает itertools.count: next() атомарен и без блокировки
+        self._hits = itertools.count()
+        self._hit_reads = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, compute):
+        """Возвращает значение для key, вычисляя его через compute(key) при промахе.
+
+        Исключения compute не кэшируются.
+        """
+        value = self._data.get(key, _NOT_CACHED)
+        if value is not _NOT_CACHED:
+            next(self._hits)
+            self._used.add(key)
+            return value
+        with self._lock:
+            self.misses += 1
+        value = compute(key)
+        if self.maxsize:
+            with self._lock:
+                self._data[key] = value
+                self._used.discard(key)
+                self._evict(self.maxsize)
+        return value
+
+    def _evict(self, maxsize):
+        data = self._data
+        used = self._used
+        while len(data) > maxsize:
+            key = next(iter(data))
+            if key in used:
+                used.discard(key)
+                data[key] = data.pop(key)
+            else:
+                del data[key]
+                self.evictions += 1
+
+    @property
+    def hits(self) -> int:
+        with self._lock:
+            return self._read_hits()
+
+    def _read_hits(self):
+        # Чтение тоже продвигает счётчик, поэтому вычитаем число прошлых чтений
+        hits = next(self._hits) - self._hit_reads
+        self._hit_reads += 1
+        return hits
+
+    def resize(self, maxsize: int):
+        """Меняет размер кэша, вытесняя лишние значения."""
+        if maxsize < 0:
+            raise ValueError("Размер кэша не может быть отрицательным")
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict(maxsize)
+
+    def clear(self):
+        """Очищает кэш и статистику."""
+        with self._lock:
+            self._data.clear()
+            self._used.clear()
+            self._reset_stats()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._read_hits(), self.misses, self.evictions, len(self._data), self.maxsize)
+
+
+
+# Разобранные строковые цены: одинаковые строки из фидов разбираются один раз.
+price_cache = LRUCache(4096)
+
+# Режим представления цен (см. set_price_mode) и функция разбора цены для него
+_PRICE_MODES = ('float', 'kopecks')
+_price_mode = 'float'
+_parse_price = float
+_decimal_pattern = None
+_TWO_DECIMALS_LIMIT = (1 << 53) / 100
+
+
+def parse_kopecks(value) -> int:
+    """Переводит цену в целое число копеек точно.
+
+    Строки разбираются по десятичной записи, float — по его кратчайшей записи
+    repr (1.005 -> 101, а не 100 по двоичному значению 1.00499...), Decimal и
+    Fraction — точно. Доли копейки округляются половиной от нуля.
+    """
+    global _decimal_pattern
+    if type(value) is int:
+        return value * 100
+    price = _two_decimal_price(value)
+    if price is not None:
+        return round(price * 100)
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise ValueError("Цена должна быть конечным числом")
+        value = repr(value)
+    elif not isinstance(value, str):
+        if not hasattr(value, 'as_integer_ratio'):
+            raise TypeError(f"Цена должна быть числом или строкой, получен {type(value).__name__}")
+        numerator, denominator = value.as_integer_ratio()
+        kopecks, rest = divmod(abs(numerator) * 100, denominator)
+        kopecks += 2 * rest >= denominator
+        return -kopecks if numerator < 0 else kopecks
+    if _decimal_pattern is None:
+        import re
+        _decimal_pattern = re.compile(r'\s*([+-]?)(?=\.?\d)(\d*)(?:\.(\d*))?(?:[eE]([+-]?\d{1,4}))?\s*')
+    match = _decimal_pattern.fullmatch(value)
+    if match is None:
+        raise ValueError(f"Не удалось преобразовать цену в копейки: '{value}'")
+    sign, whole, fraction, exponent = match.groups()
+    fraction = fraction or ''
+    digits = int(whole + fraction)
+    shift = int(exponent or 0) - len(fraction) + 2
+    if shift >= 0:
+        kopecks = digits * 10 ** shift
+    else:
+        unit = 10 ** -shift
+        kopecks, rest = divmod(digits, unit)
+        kopecks += 2 * rest >= unit
+    return -kopecks if sign == '-' else kopecks
+
+
+def _two_decimal_price(value):
+    """Разбирает строку вида '123.45' через float; для остальных значений возвращает None.
+
+    Ближайший к такой записи float совпадает с ближайшим к копейкам / 100, а
+    round(price * 100) возвращает копейки точно, пока они меньше 2 ** 53.
+    """
+    if type(value) is not str or value[-3:-2] != '.':
+        return None
+    try:
+        price = float(value)
+    except ValueError:
+        return None
+    return price if abs(price) < _TWO_DECIMALS_LIMIT else None
+
+
+def _kopeck_price(value) -> float:
+    """Цена, округлённая до копейки: ближайший float к целому числу копеек / 100.
+
+    Как и float('1e400'), цена, которая не помещается в float (или в копейках
+    price * 100), становится ±inf и отклоняется проверкой конечности цены.
+    """
+    price = _two_decimal_price(value)
+    if price is not None:
+        return price
+    kopecks = parse_kopecks(value)
+    try:
+        price = kopecks / 100
+    except OverflowError:
+        return math.inf if kopecks > 0 else -math.inf
+    return price if math.isfinite(price * 100) else math.copysign(math.inf, price)
+
+
+def _kopecks(prices):
+    """Переводит цены, округлённые до копейки, обратно в целые копейки (без потерь)."""
+    return list(map(round, map(operator.mul, prices, itertools.repeat(100.0))))
+
+
+def set_price_mode(mode: str) -> str:
+    """Переключает представление цен и возвращает прежний режим.
+
+    'float' — цены хранятся как есть. 'kopecks' — при создании товара,
+    изменении цены и пакетной загрузке цена один раз приводится к целому
+    числу копеек (parse_kopecks), а суммы категорий копятся в целых копейках
+    и точно совпадают с расчётом в Decimal. Режим переключают до создания
+    товаров и категорий: категория копит суммы в режиме, в котором создана.
+    """
+    global _price_mode, _parse_price
+    if mode not in _PRICE_MODES:
+        raise ValueError(f"Неизвестный режим цен: '{mode}'; допустимы: {', '.join(_PRICE_MODES)}")
+    previous = _price_mode
+    _price_mode = mode
+    _parse_price = _kopeck_price if mode == 'kopecks' else float
+    # Закэшированные разборы строк сделаны в прежнем режиме
+    price_cache.clear()
+    return previous
+
+
+def get_price_mode() -> str:
+    """Возвращает текущий режим цен (см. set_price_mode)."""
+    return _price_mode
@@ -0,0 +1,403 @@
+"""Хранение категорий в базе SQLite (модуль sqlite3 стандартной библиотеки).
+
+    repository = SQLiteRepository("catalog.db")
+    repository.save(category)                 # первый раз — все товары одной пачкой
+    category.reprice({...})
+    repository.save(category)                 # дальше — только изменённые товары
+    category = repository.load("Смартфоны")   # колонки читаются страницами
+    for page in repository.iter_pages("Смартфоны", page_size=1000):
+        ...
+
+База работает в режиме WAL: читатели не блокируют запись и друг друга.
+Записью занимается одно соединение под блокировкой репозитория, чтение идёт
+через небольшой пул соединений, поэтому репозиторий можно использовать из
+нескольких потоков. Тексты запросов постоянны, так что sqlite3 компилирует
+каждый запрос один раз на соединение и дальше берёт его из своего кэша
+подготовленных выражений; пачки записываются через executemany в одной
+транзакции.
+
+После save или load репозиторий подписывается на изменения хранилища
+категории и при следующем save пишет только добавленные, изменённые и
+удалённые товары. Отслеживается только последний загруженный или
+сохранённый объект категории; прежний объект при следующем save
+записывается целиком.
+"""
+from collections import namedtuple
+import contextlib
+import itertools
+import json
+import queue
+import sqlite3
+import threading
+import weakref
+
+from src.main import Category, ProductTable
+from src.snapshot import _class_path, _resolve_class
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    description TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL,
+    price REAL NOT NULL,
+    quantity INTEGER NOT NULL,
+    extras TEXT
+);
+CREATE INDEX IF NOT EXISTS products_by_category ON products (category_id, id);
+"""
+
+_SELECT_CATEGORY = "SELECT id, description FROM categories WHERE name = ?"
+_INSERT_CATEGORY = "INSERT INTO categories (name, description) VALUES (?, ?)"
+_UPDATE_CATEGORY = "UPDATE categories SET name = ?, description = ? WHERE id = ?"
+_DELETE_CATEGORY = "DELETE FROM categories WHERE id = ?"
+_NEXT_PRODUCT_ID = "SELECT coalesce(max(id), 0) + 1 FROM products"
+_INSERT_PRODUCT = ("INSERT INTO products (id, category_id, kind, name, description, price, quantity, extras) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+_UPDATE_PRODUCT = ("UPDATE products SET kind = ?, name = ?, description = ?, price = ?, quantity = ?, extras = ? "
+                   "WHERE id = ?")
+_DELETE_PRODUCT = "DELETE FROM products WHERE id = ?"
+_DELETE_PRODUCTS = "DELETE FROM products WHERE category_id = ?"
+_COUNT_PRODUCTS = "SELECT count(*) FROM products WHERE category_id = ?"
+# Постраничное чтение по ключу: следующая страница начинается после последнего прочитанного id
+_SELECT_PAGE = ("SELECT id, kind, name, description, price, quantity, extras FROM products "
+                "WHERE category_id = ? AND id > ? ORDER BY id LIMIT ?")
+_SELECT_OFFSET = ("SELECT id, kind, name, description, price, quantity, extras FROM products "
+                  "WHERE category_id = ? ORDER BY id LIMIT ? OFFSET ?")
+
+
+class SaveReport(namedtuple('SaveReport', 'inserted updated deleted')):
+    """Итог сохранения категории: сколько строк товаров добавлено, изменено и удалено."""
+
+    __slots__ = ()
+
+
+class _ChangeTracker:
+    """Подписчик ProductTable, который копит изменения категории с прошлого сохранения.
+
+    Товары таблицы сопоставлены строкам базы через db_ids (идентификатор
+    товара -> id строки в таблице products).
+    """
+
+    def __init__(self, category_id, db_ids):
+        self.category_id = category_id
+        self.db_ids = db_ids
+        # Идентификаторы товаров, добавленных или изменённых после сохранения
+        self.inserted = set()
+        self.updated = set()
+        # id строк базы, чьи товары удалены из категории
+        self.deleted = []
+        # Название или описание категории на момент сохранения
+        self.header = None
+
+    def on_insert(self, table, row):
+        self.inserted.add(table._uids[row])
+
+    def on_extend(self, table, start, stop):
+        self.inserted.update(filter(None, table._uids[start:stop]))
+
+    def on_remove(self, table, row):
+        uid = table._uids[row]
+        if uid in self.inserted:
+            self.inserted.discard(uid)
+            return
+        self.updated.discard(uid)
+        self.deleted.append(self.db_ids.pop(uid))
+
+    def on_update(self, table, row, field, old):
+        uid = table._uids[row]
+        if uid not in self.inserted:
+            self.updated.add(uid)
+
+    def on_update_many(self, table, rows, field, old):
+        for row in rows:
+            self.on_update(table, row, field, None)
+
+    def clear(self):
+        self.inserted.clear()
+        self.updated.clear()
+        self.deleted.clear()
+
+
+class _ConnectionPool:
+    """Не больше size соединений для чтения; свободные соединения переиспользуются."""
+
+    def __init__(self, connect, size, timeout):
+        self._connect = connect
+        self._timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def connection(self):
+        if not self._slots.acquire(timeout=self._timeout):
+            raise TimeoutError("Нет свободного соединения с базой")
+        try:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = self._connect()
+                connection.execute("PRAGMA query_only = ON")
+                with self._lock:
+                    self._all.append(connection)
+            try:
+                yield connection
+            finally:
+                self._idle.put(connection)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            connections, self._all = self._all, []
+        for connection in connections:
+            connection.close()
+
+
+def _extras_json(extras):
+    return None if extras is None else json.dumps(extras, ensure_ascii=False)
+
+
+class SQLiteRepository:
+    """Репозиторий категорий в файле базы SQLite.
+
+    pool_size — сколько потоков могут читать одновременно, timeout — сколько
+    секунд ждать свободного соединения и снятия блокировки базы.
+    """
+
+    def __init__(self, path, pool_size: int = 4, timeout: float = 30.0):
+        if pool_size < 1:
+            raise ValueError("Размер пула соединений должен быть положительным")
+        self.path = path
+        self.timeout = timeout
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode = WAL")
+        # В режиме WAL достаточно синхронизации при контрольных точках
+        self._writer.execute("PRAGMA synchronous = NORMAL")
+        self._writer.execute("PRAGMA foreign_keys = ON")
+        self._writer.executescript(SCHEMA)
+        self._write_lock = threading.RLock()
+        self._readers = _ConnectionPool(self._connect, pool_size, timeout)
+        # Категория -> подписчик, который копит её изменения с прошлого сохранения
+        self._trackers = weakref.WeakKeyDictionary()
+        # Класс товара -> путь для колонки kind и обратно
+        self._kind_paths = {}
+        self._kind_classes = {}
+
+    def _connect(self):
+        # Транзакциями управляем сами (BEGIN/COMMIT), соединения пула переходят между потоками
+        return sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+
+    def close(self):
+        """Закрывает соединения; несохранённые изменения категорий не записываются."""
+        with self._write_lock:
+            self._readers.close()
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._write_lock:
+            connection = self._writer
+            # IMMEDIATE сразу берёт блокировку записи, чтобы id новых товаров не заняли другие процессы
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def _kind_path(self, cls):
+        path = self._kind_paths.get(cls)
+        if path is None:
+            path = self._kind_paths[cls] = _class_path(cls)
+        return path
+
+    def _kind_class(self, path):
+        cls = self._kind_classes.get(path)
+        if cls is None:
+            cls = self._kind_classes[path] = _resolve_class(path)
+        return cls
+
+    def _product_values(self, table, rows, db_ids, category_id=None):
+        """Строки для INSERT (если передан category_id) или UPDATE товаров rows таблицы."""
+        strings = table._strings
+        kinds = [self._kind_path(cls) for cls in table._kind_list]
+        for row, db_id in zip(rows, db_ids):
+            values = (kinds[table._kinds[row]], strings[table._names[row]], strings[table._descriptions[row]],
+                      table._prices[row], table._quantities[row], _extras_json(table._extras[row]))
+            yield (db_id, category_id, *values) if category_id is not None else (*values, db_id)
+
+    def save(self, category: Category) -> SaveReport:
+        """Сохраняет категорию под её названием.
+
+        Первое сохранение категории заменяет в базе все товары категории с
+        тем же названием; следующие сохранения того же объекта пишут только
+        изменения, накопленные с прошлого save или load.
+        """
+        with category.locked(), self._transaction() as connection:
+            table = category._storage()
+            tracker = self._trackers.get(category)
+            if tracker is None:
+                return self._save_all(connection, category, table)
+            header = (category.name, category.description)
+            if header != tracker.header:
+                try:
+                    connection.execute(_UPDATE_CATEGORY, (*header, tracker.category_id))
+                except sqlite3.IntegrityError as e:
+                    raise ValueError(f"Категория '{category.name}' уже есть в базе") from e
+                tracker.header = header
+            rows = table._rows
+            if tracker.deleted:
+                connection.executemany(_DELETE_PRODUCT, ((db_id,) for db_id in tracker.deleted))
+            updated = sorted(rows[uid] for uid in tracker.updated)
+            if updated:
+                db_ids = map(tracker.db_ids.__getitem__, map(table._uids.__getitem__, updated))
+                connection.executemany(_UPDATE_PRODUCT, self._product_values(table, updated, db_ids))
+            inserted = sorted(rows[uid] for uid in tracker.inserted)
+            if inserted:
+                start, = connection.execute(_NEXT_PRODUCT_ID).fetchone()
+                db_ids = range(start, start + len(inserted))
+                connection.executemany(_INSERT_PRODUCT, self._product_values(table, inserted, db_ids, tracker.category_id))
+                tracker.db_ids.update(zip(map(table._uids.__getitem__, inserted), db_ids))
+            report = SaveReport(len(inserted), len(updated), len(tracker.deleted))
+            tracker.clear()
+            return report
+
+    def _save_all(self, connection, category, table):
+        found = connection.execute(_SELECT_CATEGORY, (category.name,)).fetchone()
+        deleted = 0
+        if found is None:
+            category_id = connection.execute(_INSERT_CATEGORY, (category.name, category.description)).lastrowid
+        else:
+            category_id = found[0]
+            connection.execute(_UPDATE_CATEGORY, (category.name, category.description, category_id))
+            deleted = connection.execute(_DELETE_PRODUCTS, (category_id,)).rowcount
+            self._forget(category_id)
+        table.compact()
+        start, = connection.execute(_NEXT_PRODUCT_ID).fetchone()
+        db_ids = range(start, start + len(table))
+        connection.executemany(_INSERT_PRODUCT, self._product_values(table, range(len(table)), db_ids, category_id))
+        self._track(category, table, category_id, zip(table._uids, db_ids))
+        return SaveReport(len(table), 0, deleted)
+
+    def _forget(self, category_id):
+        """Отключает отслеживание категорий, чьи строки в базе перезаписаны или удалены."""
+        for category, tracker in list(self._trackers.items()):
+            if tracker.category_id == category_id:
+                category._storage()._listeners.remove(tracker)
+                del self._trackers[category]
+
+    def _track(self, category, table, category_id, db_ids):
+        tracker = _ChangeTracker(category_id, dict(db_ids))
+        tracker.header = (category.name, category.description)
+        table.add_listener(tracker, replay=False)
+        self._trackers[category] = tracker
+
+    def _category_row(self, connection, name):
+        found = connection.execute(_SELECT_CATEGORY, (name,)).fetchone()
+        if found is None:
+            raise ValueError(f"Категория '{name}' не найдена в базе")
+        return found
+
+    def _append_page(self, table, rows):
+        """Добавляет в таблицу страницу строк базы без повторной проверки; возвращает их id."""
+        for kind, group in itertools.groupby(rows, key=lambda row: row[1]):
+            group = list(group)
+            cls = self._kind_class(kind)
+            _, _, names, descriptions, prices, quantities, extras = zip(*group)
+            if cls._extra_fields:
+                extras = [tuple(json.loads(value)) for value in extras]
+            table._extend_rows(cls, names, descriptions, prices, quantities, extras)
+        return [row[0] for row in rows]
+
+    def load(self, name: str, page_size: int = 10_000) -> Category:
+        """Загружает категорию, читая товары страницами по page_size строк.
+
+        Товары попадают сразу в колоночное хранилище категории, объекты
+        создаются только при обращении к ним.
+        """
+        with self._readers.connection() as connection:
+            connection.execute("BEGIN")
+            try:
+                category_id, description = self._category_row(connection, name)
+                table = ProductTable()
+                db_ids = []
+                last = 0
+                while True:
+                    rows = connection.execute(_SELECT_PAGE, (category_id, last, page_size)).fetchall()
+                    if not rows:
+                        break
+                    db_ids.extend(self._append_page(table, rows))
+                    last = rows[-1][0]
+            finally:
+                connection.execute("COMMIT")
+        category = Category._from_table(name, description, table)
+        with self._write_lock:
+            # Прежние объекты этой категории больше не совпадают с базой: их следующий save пишет всё заново
+            self._forget(category_id)
+            self._track(category, table, category_id, zip(table._uids, db_ids))
+        return category
+
+    def iter_pages(self, name: str, page_size: int = 1000):
+        """Лениво выдаёт товары категории списками по page_size штук, не загружая категорию целиком.
+
+        Следующая страница читается из базы, только когда её запросили.
+        Изменения этих товаров не отслеживаются и сами в базу не пишутся.
+        """
+        last = 0
+        while True:
+            with self._readers.connection() as connection:
+                category_id, _ = self._category_row(connection, name)
+                rows = connection.execute(_SELECT_PAGE, (category_id, last, page_size)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            table = ProductTable()
+            self._append_page(table, rows)
+            yield list(table)
+
+    def products_page(self, name: str, page: int, per_page: int = 50) -> list:
+        """Возвращает товары одной страницы категории (нумерация с нуля, как в Category.products_page)."""
+        if page < 0:
+            raise ValueError("Номер страницы не может быть отрицательным")
+        if per_page < 1:
+            raise ValueError("Размер страницы должен быть положительным")
+        with self._readers.connection() as connection:
+            category_id, _ = self._category_row(connection, name)
+            rows = connection.execute(_SELECT_OFFSET, (category_id, per_page, page * per_page)).fetchall()
+        table = ProductTable()
+        self._append_page(table, rows)
+        return list(table)
+
+    def count(self, name: str) -> int:
+        """Число товаров категории в базе."""
+        with self._readers.connection() as connection:
+            category_id, _ = self._category_row(connection, name)
+            return connection.execute(_COUNT_PRODUCTS, (category_id,)).fetchone()[0]
+
+    def categories(self) -> list[str]:
+        """Названия сохранённых категорий."""
+        with self._readers.connection() as connection:
+            return [name for name, in connection.execute("SELECT name FROM categories ORDER BY id")]
+
+    def delete(self, name: str):
+        """Удаляет категорию и её товары из базы."""
+        with self._transaction() as connection:
+            category_id, _ = self._category_row(connection, name)
+            connection.execute(_DELETE_CATEGORY, (category_id,))
+            self._forget(category_id)
@@ -0,0 +1,359 @@
+"""Инвертированный индекс слов названий и описаний товаров для Category.search.
+
+Списки идентификаторов частых слов хранятся битовыми картами (_Bitmap),
+редких — отсортированными массивами. Индекс строится и обновляется по
+колонкам ProductTable, к которой подключён слушателем.
+"""
+from array import array
+import bisect
+import itertools
+import math
+import operator
+
+_text_patterns = None
+
+
+def _patterns():
+    """Регулярные выражения поиска: слова запроса и ненулевые байты битовой карты.
+
+    Модуль re загружается при первом поиске.
+    """
+    global _text_patterns
+    if _text_patterns is None:
+        import re
+        _text_patterns = re.compile(r'(\w+)(\*?)'), re.compile(rb'[^\x00]')
+    return _text_patterns
+
+
+def _normalize(text):
+    """Приводит текст к виду для поиска: без учёта регистра и различия «ё» и «е»."""
+    return text.casefold().replace('ё', 'е')
+
+
+def _tokenize(text):
+    """Возвращает множество слов текста (буквы любого алфавита и цифры)."""
+    return {word for word, _ in _patterns()[0].findall(_normalize(text))}
+
+
+def _set_bits(data):
+    """Номера единичных битов little-endian битовой карты по возрастанию."""
+    for match in _patterns()[1].finditer(data):
+        byte = match.start()
+        value = data[byte]
+        base = byte << 3
+        while value:
+            low = value & -value
+            yield base + low.bit_length() - 1
+            value ^= low
+
+
+def _bits_of(uids):
+    """Битовая карта (int) для набора идентификаторов."""
+    if len(uids) <= 16:
+        return sum(1 << uid for uid in uids)
+    data = bytearray((max(uids) >> 3) + 1)
+    for uid in uids:
+        data[uid >> 3] |= 1 << (uid & 7)
+    return int.from_bytes(data, 'little')
+
+
+def _uids_of(bits):
+    """Идентификаторы из битовой карты (int) по возрастанию."""
+    return _set_bits(bits.to_bytes((bits.bit_length() + 7) >> 3, 'little'))
+
+
+class _Bitmap:
+    """Плотный список идентификаторов частого слова: бит на каждый идентификатор.
+
+    Изменяется в bytearray за O(1), а для пересечений со списками других
+    слов лениво преобразуется в int, с которым & и | выполняются целиком в C.
+    """
+
+    __slots__ = ('data', 'count', '_bits')
+
+    def __init__(self, uids):
+        data = self.data = bytearray((max(uids) >> 3) + 1)
+        for uid in uids:
+            data[uid >> 3] |= 1 << (uid & 7)
+        self.count = len(uids)
+        self._bits = None
+
+    def __contains__(self, uid):
+        byte = uid >> 3
+        return byte < len(self.data) and self.data[byte] >> (uid & 7) & 1
+
+    def __iter__(self):
+        return _set_bits(self.data)
+
+    def add(self, uid):
+        byte = uid >> 3
+        if byte >= len(self.data):
+            self.data.extend(bytes(byte + 1 - len(self.data)))
+        mask = 1 << (uid & 7)
+        if not self.data[byte] & mask:
+            self.data[byte] |= mask
+            self.count += 1
+            self._bits = None
+
+    def discard(self, uid):
+        if uid in self:
+            self.data[uid >> 3] &= ~(1 << (uid & 7))
+            self.count -= 1
+            self._bits = None
+
+    @property
+    def bits(self):
+        if self._bits is None:
+            self._bits = int.from_bytes(self.data, 'little')
+        return self._bits
+
+
+# Список идентификаторов слова хранится одним из трёх способов:
+# int — единственный товар, array('Q') — отсортированные идентификаторы,
+# _Bitmap — для слов, которые встречаются так часто, что битовая карта не больше массива.
+
+def _posting_items(posting):
+    return (posting,) if type(posting) is int else posting
+
+
+def _posting_len(posting):
+    if type(posting) is int:
+        return 1
+    return posting.count if type(posting) is _Bitmap else len(posting)
+
+
+def _posting_contains(posting, uid):
+    if type(posting) is int:
+        return posting == uid
+    if type(posting) is _Bitmap:
+        return uid in posting
+    position = bisect.bisect_left(posting, uid)
+    return position < len(posting) and posting[position] == uid
+
+
+def _posting_bits(posting):
+    return posting.bits if type(posting) is _Bitmap else _bits_of(_posting_items(posting))
+
+
+class _TextIndex:
+    """Инвертированный индекс слов названий и описаний для Category.search.
+
+    Для каждого слова отдельно по названиям и описаниям хранится список
+    идентификаторов товаров (см. выше). Слова каждой различной строки
+    выделяются один раз на пачку, поэтому повторяющиеся описания почти
+    не замедляют построение. Для поиска по префиксу поддерживается
+    отсортированный словарь слов.
+
+    Запрос с редким словом проверяет его немногих кандидатов по спискам
+    остальных слов; запрос из одних частых слов пересекает битовые карты.
+    """
+
+    _BULK_INSERT = 16
+    # Сколько кандидатов проверять по одному, прежде чем перейти к битовым картам
+    _SPARSE_CANDIDATES = 1024
+    # Сколько самых редких слов запроса различать при ранжировании битовыми картами
+    _RANKED_TERMS = 8
+
+    def __init__(self, table):
+        self._table = table
+        # Слово -> идентификаторы товаров: для названий и для описаний
+        self._postings = ({}, {})
+        # Отсортированный список слов для поиска по префиксу; None — нужно пересобрать
+        self._vocabulary = []
+        table.add_listener(self)
+
+    def _columns(self):
+        return self._table._names, self._table._descriptions
+
+    def on_insert(self, table, row):
+        self.on_extend(table, row, row + 1)
+
+    def on_extend(self, table, start, stop):
+        strings = table._strings
+        uids = table._uids[start:stop]
+        bulk = stop - start >= self._BULK_INSERT
+        for postings, column in zip(self._postings, self._columns()):
+            # Товары группируются по строке, чтобы выделить слова каждой строки один раз
+            string_ids = column[start:stop]
+            order = sorted(range(len(uids)), key=string_ids.__getitem__)
+            added = {}
+            for string_id, group in itertools.groupby(order, string_ids.__getitem__):
+                string_uids = list(filter(None, map(uids.__getitem__, group)))
+                if not string_uids:
+                    continue
+                for word in _tokenize(strings[string_id]):
+                    added.setdefault(word, []).extend(string_uids)
+            for word, new in added.items():
+                self._add(postings, word, new, bulk)
+        if bulk:
+            self._vocabulary = None
+
+    def _add(self, postings, word, new, bulk):
+        posting = postings.get(word)
+        if posting is None:
+            vocabulary = self._vocabulary
+            if not bulk and vocabulary is not None:
+                position = bisect.bisect_left(vocabulary, word)
+                if position == len(vocabulary) or vocabulary[position] != word:
+                    vocabulary.insert(position, word)
+            if len(new) == 1:
+                postings[word] = new[0]
+                return
+            posting = _Bitmap(new) if len(new) * 32 > max(new) else array('Q', sorted(new))
+        elif type(posting) is _Bitmap:
+            for uid in new:
+                posting.add(uid)
+            return
+        elif type(posting) is int or min(new) <= posting[-1]:
+            posting = array('Q', sorted(set(_posting_items(posting)).union(new)))
+        else:
+            posting.extend(sorted(new))
+        # Битовая карта занимает max(uid) / 8 байт и ещё столько же в виде int
+        if type(posting) is array and len(posting) * 32 > posting[-1]:
+            posting = _Bitmap(posting)
+        postings[word] = posting
+
+    def _discard(self, postings, word, uid):
+        posting = postings.get(word)
+        if posting is None:
+            return
+        if type(posting) is int:
+            if posting == uid:
+                # Слово остаётся в словаре до пересборки: поиск по префиксу пропускает пустые
+                del postings[word]
+            return
+        if type(posting) is _Bitmap:
+            posting.discard(uid)
+            if not posting.count:
+                del postings[word]
+            return
+        position = bisect.bisect_left(posting, uid)
+        if position < len(posting) and posting[position] == uid:
+            del posting[position]
+            if len(posting) == 1:
+                postings[word] = posting[0]
+
+    def on_remove(self, table, row):
+        uid = table._uids[row]
+        for postings, column in zip(self._postings, self._columns()):
+            for word in _tokenize(table._strings[column[row]]):
+                self._discard(postings, word, uid)
+
+    def on_update(self, table, row, field, old):
+        if field == 'name':
+            postings, column = self._postings[0], table._names
+        elif field == 'description':
+            postings, column = self._postings[1], table._descriptions
+        else:
+            return
+        uid = table._uids[row]
+        for word in _tokenize(old):
+            self._discard(postings, word, uid)
+        for word in _tokenize(table._strings[column[row]]):
+            self._add(postings, word, [uid], False)
+
+    def on_update_many(self, table, rows, field, old):
+        if field in ('name', 'description'):
+            for row, value in zip(rows, old):
+                self.on_update(table, row, field, value)
+
+    def _expand(self, prefix):
+        """Возвращает слова словаря, начинающиеся с prefix."""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings[0].keys() | self._postings[1].keys())
+        vocabulary = self._vocabulary
+        position = bisect.bisect_left(vocabulary, prefix)
+        words = []
+        while position < len(vocabulary) and vocabulary[position].startswith(prefix):
+            words.append(vocabulary[position])
+            position += 1
+        return words
+
+    def search(self, text, limit=None, prefix=False):
+        """Возвращает номера строк товаров, содержащих все слова text, по убыванию релевантности.
+
+        Слово с «*» на конце (или любое слово при prefix=True) ищется как
+        начало слова. Все найденные товары содержат каждое слово, поэтому
+        выше оказываются товары, у которых в названии есть более редкие
+        слова запроса (сумма их idf); при равенстве товары идут в порядке
+        создания.
+        """
+        names, descriptions = self._postings
+        # Для каждого слова запроса: (число товаров, idf, списки по названиям, списки по описаниям)
+        terms = []
+        for word, star in _patterns()[0].findall(_normalize(text)):
+            words = self._expand(word) if prefix or star else (word,)
+            in_names = [names[match] for match in words if match in names]
+            in_descriptions = [descriptions[match] for match in words if match in descriptions]
+            if not in_names and not in_descriptions:
+                return []
+            terms.append([sum(map(_posting_len, in_names + in_descriptions)), 0.0, in_names, in_descriptions])
+        if not terms:
+            return []
+        terms.sort(key=operator.itemgetter(0))
+        live = len(self._table)
+        for term in terms:
+            term[1] = math.log(1 + live / term[0])
+        if terms[0][0] <= self._SPARSE_CANDIDATES:
+            ranked = self._search_sparse(terms)
+        else:
+            ranked = self._search_dense(terms, limit)
+        rows = self._table._rows
+        if limit is None:
+            return [rows[uid] for uid in ranked]
+        return [rows[uid] for uid in itertools.islice(ranked, limit)]
+
+    def _search_sparse(self, terms):
+        """Проверяет кандидатов самого редкого слова по спискам остальных слов."""
+        # Все найденные товары содержат каждое слово, поэтому оценка — только надбавка за названия
+        _, idf, in_names, in_descriptions = terms[0]
+        scores = dict.fromkeys(itertools.chain.from_iterable(map(_posting_items, in_descriptions)), 0.0)
+        scores.update(dict.fromkeys(itertools.chain.from_iterable(map(_posting_items, in_names)), 0.0 + idf))
+        for position, (_, idf, in_names, in_descriptions) in enumerate(terms[1:], 1):
+            bonus = idf if position < self._RANKED_TERMS else 0.0
+            matched = {}
+            for uid, score in scores.items():
+                if any(_posting_contains(posting, uid) for posting in in_names):
+                    matched[uid] = score + bonus
+                elif any(_posting_contains(posting, uid) for posting in in_descriptions):
+                    matched[uid] = score
+            scores = matched
+        return sorted(scores, key=lambda uid: (-scores[uid], uid))
+
+    def _search_dense(self, terms, limit):
+        """Пересекает битовые карты слов и выдаёт товары группами по словам, найденным в названии."""
+        found = -1
+        name_bits = []
+        for _, _, in_names, in_descriptions in terms:
+            in_name = 0
+            for posting in in_names:
+                in_name |= _posting_bits(posting)
+            anywhere = in_name
+            for posting in in_descriptions:
+                anywhere |= _posting_bits(posting)
+            found &= anywhere
+            if not found:
+                return
+            name_bits.append(in_name)
+        # Группа — множество слов, найденных в названии; группы с равной суммой idf
+        # этих слов объединяются и идут по её убыванию
+        ranked_terms = min(len(terms), self._RANKED_TERMS)
+        groups = sorted((-sum(terms[i][1] for i in range(ranked_terms) if mask >> i & 1), mask)
+                        for mask in range(1 << ranked_terms))
+        produced = 0
+        for _, tied in itertools.groupby(groups, operator.itemgetter(0)):
+            union = 0
+            for _, mask in tied:
+                bits = found
+                for i in range(ranked_terms):
+                    bits = bits & name_bits[i] if mask >> i & 1 else bits & ~name_bits[i]
+                    if not bits:
+                        break
+                union |= bits
+            if not union:
+                continue
+            for uid in _uids_of(union):
+                yield uid
+                produced += 1
+                if produced == limit:
+                    return
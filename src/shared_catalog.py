@@ -0,0 +1,179 @@
+"""Категория в разделяемой памяти для нескольких процессов-обработчиков.
+
+Процесс-загрузчик публикует снимок категории (формат src/snapshot.py) в
+сегмент multiprocessing.shared_memory, а процессы-читатели подключают его
+как Category без копирования числовых колонок и таблицы строк: в памяти
+читателя остаются только смещения строк и дополнительные поля наследников.
+
+    # загрузчик
+    publisher = CatalogPublisher("catalog")
+    publisher.publish(category)           # поколение 1
+    publisher.publish(updated_category)   # поколение 2 заменяет 1
+
+    # обработчик
+    reader = CatalogReader("catalog")
+    reader.refresh()                      # перед запросом: подключить новое поколение, если есть
+    reader.category.query(...)
+
+Каждое поколение пишется в отдельный сегмент «<имя>_<поколение>», и только
+после этого его номер записывается в управляющий сегмент «<имя>» под
+счётчиком последовательности (seqlock): читатель, застав запись на середине,
+перечитывает номер. Старый сегмент удаляется из системы сразу после
+переключения, но уже подключённые к нему читатели продолжают работать, пока
+не обновятся. Изменения категории в читателе остаются в его процессе
+(колонки копируются при первом изменении, как у Category.load).
+"""
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+
+from src.main import Category
+from src.snapshot import SnapshotError, decode_snapshot
+
+MAGIC = b'OOPSHARE'
+# Управляющий сегмент: MAGIC, счётчик последовательности (нечётный — идёт запись), номер поколения
+_COUNTER = struct.Struct('<Q')
+_SEQUENCE_OFFSET = len(MAGIC)
+_GENERATION_OFFSET = _SEQUENCE_OFFSET + _COUNTER.size
+_CONTROL_SIZE = _GENERATION_OFFSET + _COUNTER.size
+
+
+class _Segment(shared_memory.SharedMemory):
+    """Сегмент, который можно закрыть, пока на него ссылаются колонки подключённой категории."""
+
+    def close(self):
+        try:
+            super().close()
+        except BufferError:
+            # Отображение освободится вместе с последней колонкой, которая на него ссылается,
+            # а дескриптор больше не нужен
+            if getattr(self, '_fd', -1) >= 0:
+                os.close(self._fd)
+                self._fd = -1
+
+
+def _attach(name):
+    """Подключает существующий сегмент, не передавая его трекеру ресурсов этого процесса.
+
+    Иначе трекер удалил бы сегмент при завершении первого же читателя.
+    """
+    try:
+        return _Segment(name, track=False)
+    except TypeError:
+        pass
+    # До Python 3.13 параметра track нет: регистрация на время подключения отключается
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return _Segment(name)
+    finally:
+        resource_tracker.register = register
+
+
+def _segment_name(name, generation):
+    return f"{name}_{generation}"
+
+
+class CatalogPublisher:
+    """Публикует поколения категории в разделяемую память.
+
+    Имя должно быть коротким (на macOS длина имён сегментов ограничена
+    31 символом вместе с номером поколения).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.generation = 0
+        self._control = _Segment(name, create=True, size=_CONTROL_SIZE)
+        self._control.buf[:_CONTROL_SIZE] = MAGIC + bytes(_CONTROL_SIZE - len(MAGIC))
+        self._current = None
+
+    def publish(self, category: Category) -> int:
+        """Публикует снимок category новым поколением и возвращает его номер."""
+        parts = category._snapshot_parts()
+        size = sum(memoryview(part).nbytes for part in parts)
+        generation = self.generation + 1
+        segment = _Segment(_segment_name(self.name, generation), create=True, size=size)
+        offset = 0
+        for part in parts:
+            part = memoryview(part).cast('B')
+            segment.buf[offset:offset + len(part)] = part
+            offset += len(part)
+        # Читатель, увидевший нечётный или изменившийся счётчик, перечитывает номер поколения
+        buf = self._control.buf
+        sequence, = _COUNTER.unpack_from(buf, _SEQUENCE_OFFSET)
+        _COUNTER.pack_into(buf, _SEQUENCE_OFFSET, sequence + 1)
+        _COUNTER.pack_into(buf, _GENERATION_OFFSET, generation)
+        _COUNTER.pack_into(buf, _SEQUENCE_OFFSET, sequence + 2)
+        previous, self._current, self.generation = self._current, segment, generation
+        if previous is not None:
+            previous.close()
+            previous.unlink()
+        return generation
+
+    def close(self):
+        """Удаляет управляющий сегмент и текущее поколение; подключённые читатели продолжают работать."""
+        for segment in (self._current, self._control):
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+        self._current = self._control = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CatalogReader:
+    """Подключает опубликованную категорию только для чтения."""
+
+    def __init__(self, name: str, timeout: float = 5.0):
+        self.name = name
+        # Сколько ждать первой публикации и согласованного номера поколения
+        self.timeout = timeout
+        self._control = _attach(name)
+        if bytes(self._control.buf[:len(MAGIC)]) != MAGIC:
+            raise SnapshotError(f"Сегмент {name} не является каталогом в разделяемой памяти")
+        self.generation = 0
+        self.category = None
+        self.refresh()
+
+    def _published_generation(self):
+        """Читает номер поколения, повторяя чтение, пока запись не завершена."""
+        buf = self._control.buf
+        deadline = time.monotonic() + self.timeout
+        while True:
+            before, = _COUNTER.unpack_from(buf, _SEQUENCE_OFFSET)
+            generation, = _COUNTER.unpack_from(buf, _GENERATION_OFFSET)
+            after, = _COUNTER.unpack_from(buf, _SEQUENCE_OFFSET)
+            if before == after and not before % 2 and generation:
+                return generation
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Каталог {self.name} не опубликован за {self.timeout} с")
+            time.sleep(0.001 if generation else 0.01)
+
+    def refresh(self) -> bool:
+        """Подключает последнее поколение, если оно новее текущего; возвращает True при замене."""
+        while True:
+            generation = self._published_generation()
+            if generation == self.generation:
+                return False
+            try:
+                segment = _attach(_segment_name(self.name, generation))
+            except FileNotFoundError:
+                # Поколение успели заменить между чтением номера и подключением
+                continue
+            name, description, table, totals = decode_snapshot(segment.buf, lazy_strings=True)
+            # Сегмент живёт, пока жива таблица, колонки которой на него ссылаются
+            table._segment = segment
+            self.category = Category._from_table(name, description, table, totals)
+            self.generation = generation
+            return True
+
+    def close(self):
+        """Отключается от управляющего сегмента; текущая категория остаётся доступной."""
+        self._control.close()
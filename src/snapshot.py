@@ -0,0 +1,203 @@
+"""Бинарный снимок категории.
+
+Формат файла (все числа little-endian):
+
+    заголовок   MAGIC, версия, CRC32 тела, число строк, длина метаданных
+    метаданные  JSON: название и описание категории, классы товаров,
+                дополнительные поля наследников (только для непустых строк),
+                накопленная статистика, смещения колонок
+    колонки     prices (d), quantities (q), names (q), descriptions (q), kinds (B),
+                таблица строк (UTF-8, разделитель — символ NUL); каждая колонка
+                выровнена по 8 байтам
+
+При загрузке файл отображается в память, а числовые колонки используются
+напрямую как memoryview без копирования. Если CRC32 совпадает, строки не
+проверяются повторно и статистика берётся из файла; иначе данные проходят
+обычную проверку from_records.
+
+encode_snapshot и decode_snapshot работают с тем же форматом в любом
+буфере, например в разделяемой памяти (см. src/shared_catalog.py).
+"""
+from array import array
+import importlib
+import itertools
+import json
+import mmap
+import re
+import struct
+import sys
+import zlib
+
+from src.main import Product, ProductTable
+
+MAGIC = b'OOPSNAP\0'
+VERSION = 1
+_HEADER = struct.Struct('<8sIIQQ')
+_ALIGN = 8
+
+
+class SnapshotError(ValueError):
+    """Файл не является снимком категории поддерживаемой версии."""
+
+
+def _class_path(cls):
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def _resolve_class(path):
+    module_name, _, qualname = path.partition(':')
+    cls = importlib.import_module(module_name)
+    for part in qualname.split('.'):
+        cls = getattr(cls, part)
+    if not (isinstance(cls, type) and issubclass(cls, Product)):
+        raise SnapshotError(f"Класс {path} не является товаром")
+    return cls
+
+
+def _check_byteorder():
+    # Колонки пишутся и читаются как есть, без перестановки байтов
+    if sys.byteorder != 'little':
+        raise SnapshotError("Снимки поддерживаются только на little-endian платформах")
+
+
+class _StringTable:
+    """Таблица строк снимка, которая декодирует строку из буфера при каждом обращении.
+
+    В памяти процесса хранятся только смещения строк (8 байт на строку).
+    """
+
+    __slots__ = ('_data', '_starts')
+
+    def __init__(self, data):
+        self._data = data
+        # Начало каждой строки и, последним, начало несуществующей строки за концом буфера
+        self._starts = array('q', [0])
+        if len(data):
+            self._starts.extend(match.end() for match in re.finditer(b'\0', data))
+            self._starts.append(len(data) + 1)
+
+    def __len__(self):
+        return len(self._starts) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        index = range(len(self))[index]
+        return str(self._data[self._starts[index]:self._starts[index + 1] - 1], 'utf-8')
+
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self)))
+
+
+def encode_snapshot(name: str, description: str, table: ProductTable, totals: list) -> list:
+    """Возвращает снимок в виде списка буферов, которые нужно записать подряд."""
+    _check_byteorder()
+    table.compact()
+    if any('\0' in text for text in table._strings):
+        raise SnapshotError("Строки товаров не должны содержать символ \\0")
+    columns = [getattr(table, attr) for attr, _ in ProductTable._NUMERIC_COLUMNS]
+    columns.append('\0'.join(table._strings).encode('utf-8'))
+    layout = []
+    offset = 0
+    for column in columns:
+        size = memoryview(column).nbytes
+        layout.append((offset, size))
+        offset += size + (-size % _ALIGN)
+    meta = json.dumps({
+        'name': name,
+        'description': description,
+        'kinds': [_class_path(cls) for cls in table._kind_list],
+        'extras': [[row, extra] for row, extra in enumerate(table._extras) if extra is not None],
+        'totals': totals,
+        'columns': layout,
+    }, ensure_ascii=False).encode('utf-8')
+    meta += b' ' * (-(_HEADER.size + len(meta)) % _ALIGN)
+    checksum = zlib.crc32(meta)
+    parts = [meta]
+    for column in columns:
+        pad = b'\0' * (-memoryview(column).nbytes % _ALIGN)
+        checksum = zlib.crc32(pad, zlib.crc32(column, checksum))
+        parts += [column, pad]
+    return [_HEADER.pack(MAGIC, VERSION, checksum, len(table), len(meta))] + parts
+
+
+def write_snapshot(path, name: str, description: str, table: ProductTable, totals: list):
+    """Записывает таблицу товаров категории и её накопленную статистику в файл снимка."""
+    parts = encode_snapshot(name, description, table, totals)
+    with open(path, 'wb') as file:
+        for part in parts:
+            file.write(part)
+
+
+def read_snapshot(path):
+    """Загружает снимок и возвращает (название, описание, ProductTable, статистика).
+
+    Статистика равна None, если контрольная сумма не совпала и строки
+    прошли повторную проверку.
+    """
+    _check_byteorder()
+    with open(path, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return decode_snapshot(buffer)
+
+
+def decode_snapshot(buffer, lazy_strings: bool = False):
+    """Разбирает снимок из буфера, используя числовые колонки без копирования.
+
+    Буфер может быть длиннее снимка. При lazy_strings=True строки тоже не
+    копируются, а декодируются из буфера при обращении. Возвращает то же,
+    что read_snapshot.
+    """
+    _check_byteorder()
+    view = memoryview(buffer)
+    if len(view) < _HEADER.size:
+        raise SnapshotError("Файл слишком короткий для снимка")
+    magic, version, checksum, rows, meta_length = _HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise SnapshotError("Файл не является снимком категории")
+    if version != VERSION:
+        raise SnapshotError(f"Неподдерживаемая версия снимка: {version}")
+    body = view[_HEADER.size:]
+    try:
+        meta = json.loads(bytes(body[:meta_length]))
+        data = body[meta_length:]
+        sections = [data[offset:offset + size] for offset, size in meta['columns']]
+        columns = [section.cast(typecode)
+                   for section, (_, typecode) in zip(sections, ProductTable._NUMERIC_COLUMNS)]
+        if lazy_strings:
+            strings = _StringTable(sections[-1])
+        else:
+            strings = str(sections[-1], 'utf-8').split('\0') if sections[-1] else []
+        offset, size = meta['columns'][-1]
+        body = body[:meta_length + offset + size + (-size % _ALIGN)]
+        kinds = [_resolve_class(path) for path in meta['kinds']]
+        extras = [None] * rows
+        for row, extra in meta['extras']:
+            extras[row] = tuple(extra)
+        if any(len(column) != rows for column in columns):
+            raise SnapshotError("Размеры колонок не совпадают с числом строк")
+    except (ValueError, KeyError, TypeError, IndexError) as e:
+        if isinstance(e, SnapshotError):
+            raise
+        raise SnapshotError(f"Повреждённые метаданные снимка: {e}") from e
+    if zlib.crc32(body) == checksum:
+        return (meta['name'], meta['description'],
+                ProductTable.from_buffers(*columns, extras, strings, kinds), meta['totals'])
+    return meta['name'], meta['description'], _revalidate(columns, extras, strings, kinds), None
+
+
+def _revalidate(columns, extras, strings, kinds):
+    """Собирает таблицу через обычную проверку строк, когда контрольная сумма не сошлась.
+
+    Некорректные строки приводят к BulkValidationError, как при обычной загрузке.
+    """
+    prices, quantities, names, descriptions, kind_ids = columns
+    table = ProductTable()
+    try:
+        for kind, rows in itertools.groupby(range(len(prices)), kind_ids.__getitem__):
+            records = [(strings[names[row]], strings[descriptions[row]], prices[row], quantities[row],
+                        *(extras[row] or ())) for row in rows]
+            table.extend(kinds[kind].from_records(records))
+    except IndexError as e:
+        raise SnapshotError(f"Снимок повреждён: {e}") from e
+    return table